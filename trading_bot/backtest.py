@@ -0,0 +1,55 @@
+"""
+Backtest MyStrategy on the candles saved by the live bot (data/candles)
+python backtest.py APT CAKE [--timeframe 5m] [--start 2024-01-01] [--end 2024-07-01] [--cash 1000]
+"""
+import argparse
+
+import pandas as pd
+
+from main import MyStrategy
+from lib.backtest import Backtest
+from lib.market.indicators import RSI
+from lib.market.store import CandleStore
+
+
+def timestamp(date: str):
+    return None if date is None else int(pd.Timestamp(date, tz='UTC').timestamp())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('tokens', nargs='+')
+    parser.add_argument('--currency', default='USDT')
+    parser.add_argument('--timeframe', default='5m')
+    parser.add_argument('--store', default='data/candles')
+    parser.add_argument('--start', help='first bar, like 2024-01-01')
+    parser.add_argument('--end', help='end of the replay, like 2024-07-01')
+    parser.add_argument('--cash', type=float, default=1000)
+    parser.add_argument('--call-budget', type=float, default=0.1)
+    parser.add_argument('--liquidity', type=float, default=1_000_000, help='currency side of the simulated pools')
+    parser.add_argument('--order-fee', type=float, default=0.0, help='fee of every order in currency (gas)')
+    parser.add_argument('--verbose', action='store_true', help='show the prints of the bot')
+    args = parser.parse_args()
+
+    strat = MyStrategy(interval=args.timeframe, db_engine=None)
+    bt = Backtest(
+        strat,
+        CandleStore(args.store, readonly=True),
+        args.tokens,
+        currency=args.currency,
+        timeframe=args.timeframe,
+        cash=args.cash,
+        # the columns MyStrategy.get_data adds to the candles
+        indicators={f'rsi{strat.rsi_period}': RSI(strat.rsi_period)},
+        window=strat.window,
+        start=timestamp(args.start),
+        end=timestamp(args.end),
+        liquidity=args.liquidity,
+        order_fee=args.order_fee,
+        call_budget=args.call_budget,
+        quiet=not args.verbose,
+    )
+    print(bt.feed)
+    for key, value in bt.run().items():
+        print(f"{key:>18}: {value}")
+    print(bt.trades().tail(20).to_string())
@@ -0,0 +1,57 @@
+"""
+Replay speed of the backtester: synthetic 5m candles of a few tokens replayed through TradingBot.run
+with the SimBroker and an RSI strategy like MyStrategy (without its prints)
+run from trading_bot/: python benchmarks/backtest.py [--days 90] [--symbols 3]
+"""
+import argparse, os, shutil, sys, tempfile, time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.backtest import Backtest
+from lib.market.indicators import RSI
+from lib.market.store import CandleStore
+from lib.trading import Strategy
+
+
+class RsiStrategy(Strategy):
+    """MyStrategy rules without prints, shared by the benchmarks, thresholds by kwargs like RsiStrategy(buy=20, sell=80)"""
+    period, buy, sell = 14, 25, 70
+
+    def get_data(self, tokens, currency, interval=None):
+        # candles come from the replay (ReplayStrategy) or the benchmark frame
+        raise NotImplementedError
+
+    def run(self, pair, data, budget, bot):
+        rsi = data[f'rsi{self.period}'].values
+        price = float(data['close'].iloc[-1])
+        if rsi[-1] < self.buy:
+            bot.buy(pair=pair, price=price, qty=budget, estimated_amount=budget)
+        elif rsi[-1] > self.sell:
+            bot.sell(pair=pair, price=price)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=float, default=90)
+    parser.add_argument('--symbols', type=int, default=3)
+    args = parser.parse_args()
+    n = int(args.days * 288)
+    root = tempfile.mkdtemp(prefix='backtest_')
+    try:
+        store = CandleStore(root)
+        rng = np.random.default_rng(0)
+        tokens = [f"T{s}" for s in range(args.symbols)]
+        for token in tokens:
+            close = 10 * np.exp(np.cumsum(rng.normal(0, 0.003, n)))
+            open_ = np.append(10, close[:-1])
+            store.append(token, '5m', np.column_stack([np.arange(n) * 300, open_, np.maximum(open_, close), np.minimum(open_, close), close, np.ones(n)]))
+
+        t = time.perf_counter()
+        bt = Backtest(RsiStrategy(), CandleStore(root, readonly=True), tokens, indicators={'rsi14': RSI(14)})
+        setup = time.perf_counter() - t
+        stats = bt.run()
+        print(f"{args.symbols} symbols x {n} 5m candles: setup {setup:.2f} s, replay {stats['seconds']:.2f} s, "
+              f"{stats['steps'] / stats['seconds']:.0f} steps/s ({stats['seconds'] / stats['steps'] * 1e3:.3f} ms/step)")
+        print(stats)
+    finally:
+        shutil.rmtree(root)
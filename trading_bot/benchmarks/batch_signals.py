@@ -0,0 +1,70 @@
+"""
+Signal evaluation cost of one bot cycle with many tokens: strategy.run per pair (frame filtered per token
+like before, then grouped once) vs one vectorized run_batch over the aligned symbols x time arrays
+run from trading_bot/: python benchmarks/batch_signals.py [--tokens 200] [--window 30]
+"""
+import argparse, contextlib, os, sys, time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.broker.sim import SimBroker
+from lib.trading import TradingBot
+from benchmarks.backtest import RsiStrategy
+
+
+# thresholds out of range so no order is sent, only the signal evaluation is timed
+NO_ORDER = {'buy': -1, 'sell': 101}
+
+
+class BatchRsiStrategy(RsiStrategy):
+    batch = True
+
+    def run_batch(self, batch, budgets, bot):
+        rsi = batch.last(f'rsi{self.period}')
+        return {'signal': np.where(rsi < self.buy, 1, np.where(rsi > self.sell, -1, 0))}
+
+
+def filtered(bot, data):
+    # run_strategy before: one boolean scan of the whole frame per token
+    for t in bot.tokens:
+        df = data[data['symbol'] == t + bot.currency]
+        bot.strategy.run([bot.currency, t], df, budget=bot.budget(t), bot=bot)
+
+
+def timed(fn, repeat=20) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tokens', type=int, default=200)
+    parser.add_argument('--window', type=int, default=30)
+    args = parser.parse_args()
+    tokens = [f"T{i}" for i in range(args.tokens)]
+    rng = np.random.default_rng(0)
+    n = args.window
+    data = pd.concat([pd.DataFrame({
+        'timestamp': pd.to_datetime(np.arange(n) * 300, unit='s'),
+        'open': 1.0, 'high': 1.0, 'low': 1.0, 'close': rng.random(n) + 1, 'volume': 1.0,
+        'rsi14': rng.random(n) * 100,
+        'symbol': t + 'USDT',
+    }) for t in tokens], ignore_index=True)
+
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        broker = SimBroker(tokens, {'USDT': 1000})
+        bot = TradingBot(id='bench', wallet_key='', tokens=list(tokens), broker=broker, strategy=RsiStrategy(**NO_ORDER), notif_on=False)
+        batch_bot = TradingBot(id='bench', wallet_key='', tokens=list(tokens), broker=broker, strategy=BatchRsiStrategy(**NO_ORDER), notif_on=False)
+        results = {
+            'run per pair, filter per token': timed(lambda: filtered(bot, data)),
+            'run per pair, grouped once': timed(lambda: bot.run_strategy(data)),
+            'run_batch': timed(lambda: batch_bot.run_strategy(data)),
+        }
+    print(f"{args.tokens} tokens x {n} candles ({len(data)} rows)")
+    for name, seconds in results.items():
+        print(f"{name:>32}: {seconds * 1e3:8.2f} ms per cycle")
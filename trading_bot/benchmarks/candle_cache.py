@@ -0,0 +1,54 @@
+"""
+Per cycle cost of the 5m candles of one pool: full window download + DataFrame rebuild vs the incremental CandleCache
+(response json is generated locally, network time is left out, payload size is what would be downloaded)
+run from trading_bot/: python benchmarks/candle_cache.py
+"""
+import json, os, sys, timeit
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.market.candles import CandleCache
+
+STEP = 300
+NOW = 1_750_000_000 // STEP * STEP
+
+
+def payload(limit: int, before: int) -> str:
+    # GeckoTerminal ohlcv answer, newest candle first
+    end = before // STEP * STEP
+    rows = [[end - STEP * i, 9.1, 9.2, 9.0, 9.15, 12345.678] for i in range(limit)]
+    return json.dumps({"data": {"attributes": {"ohlcv_list": rows}}})
+
+
+def full_window(limit: int = 30):
+    candles = json.loads(payload(limit, NOW))["data"]["attributes"]["ohlcv_list"]
+    df = pd.DataFrame(candles, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
+    df[['open', 'high', 'low', 'close', 'volume']] = df[['open', 'high', 'low', 'close', 'volume']].astype(float)
+    return df
+
+
+if __name__ == '__main__':
+    sizes = []
+
+    def fetch(key, limit, before):
+        body = payload(limit, before)
+        sizes.append(len(body))
+        return json.loads(body)["data"]["attributes"]["ohlcv_list"]
+
+    cache = CandleCache(fetch, capacity=300, step=STEP)
+    cache.refresh('APT', now=NOW - STEP)  # warm up, done once per process
+
+    cycle = [NOW]
+
+    def incremental():
+        cycle[0] += STEP
+        return cache.refresh('APT', now=cycle[0]).frame(30)
+
+    n = 200
+    full = min(timeit.repeat(full_window, number=n, repeat=3)) / n
+    sizes.clear()
+    inc = min(timeit.repeat(incremental, number=n, repeat=3)) / n
+    print(f"full window of 30 : {full * 1e3:6.3f} ms/cycle, payload {len(payload(30, NOW))} bytes")
+    print(f"incremental cache : {inc * 1e3:6.3f} ms/cycle, payload {sum(sizes) / len(sizes):.0f} bytes "
+          f"({1 - sum(sizes) / len(sizes) / len(payload(30, NOW)):.0%} less)")
@@ -0,0 +1,51 @@
+"""
+CandleStore: bulk append of years of 1m candles, live appends and range reads through the memory maps
+run from trading_bot/: python benchmarks/candle_store.py [--years 2] [--symbols 5]
+"""
+import argparse, os, shutil, sys, tempfile, time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.market.store import CandleStore
+
+
+def candles(start: int, n: int, step: int = 60) -> np.ndarray:
+    close = 10 + np.cumsum(np.random.default_rng(start).normal(0, 0.01, n))
+    return np.column_stack([(start + np.arange(n)) * step, close, close + 0.01, close - 0.01, close, np.ones(n)])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--years', type=float, default=2)
+    parser.add_argument('--symbols', type=int, default=5)
+    args = parser.parse_args()
+    n = int(args.years * 525_600)
+    root = tempfile.mkdtemp(prefix='candles_')
+    try:
+        store = CandleStore(root)
+        start = time.perf_counter()
+        for s in range(args.symbols):
+            store.append(f"T{s}", '1m', candles(0, n))
+        bulk = time.perf_counter() - start
+        print(f"bulk append {args.symbols} x {n} 1m candles: {bulk:.2f} s, "
+              f"{sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(root) for f in fs) / 2**20:.0f} MiB")
+
+        live = []
+        for i in range(500):
+            row = candles(n + i, 1)
+            t = time.perf_counter()
+            store.append('T0', '1m', row)
+            live.append(time.perf_counter() - t)
+        print(f"live append of one candle: p50 {np.median(live) * 1e3:.3f} ms")
+
+        reader = CandleStore(root, readonly=True)
+        for days in (1, 30, 365):
+            t = time.perf_counter()
+            cols = reader.read('T1', '1m', start=n * 60 - days * 86400)
+            opened = time.perf_counter() - t
+            mean = cols['close'].mean()
+            total = time.perf_counter() - t
+            print(f"read last {days:3d} days ({len(cols['close']):6d} rows): slice {opened * 1e3:.3f} ms, "
+                  f"slice + mean of close {total * 1e3:.3f} ms ({mean:.3f})")
+    finally:
+        shutil.rmtree(root)
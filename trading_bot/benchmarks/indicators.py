@@ -0,0 +1,67 @@
+"""
+Per cycle cost of RSI(14) for many symbols: full recompute over the candle window vs the incremental IndicatorSet
+(talib.RSI is used for the full recompute if installed, else the same Wilder algorithm in python)
+run from trading_bot/: python benchmarks/indicators.py
+"""
+import os, sys, timeit
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.market.candles import CandleBuffer
+from lib.market.indicators import RSI, IndicatorSet
+
+try:
+    import talib
+    full_rsi = lambda close: talib.RSI(close, timeperiod=14)
+except ImportError:
+    talib = None
+
+    def full_rsi(close, period=14):
+        out = np.full(len(close), np.nan)
+        change = np.diff(close)
+        gain, loss = np.maximum(change, 0), np.maximum(-change, 0)
+        avg_gain, avg_loss = gain[:period].mean(), loss[:period].mean()
+        out[period] = 100 * avg_gain / (avg_gain + avg_loss)
+        for i in range(period + 1, len(close)):
+            avg_gain = (avg_gain * (period - 1) + gain[i - 1]) / period
+            avg_loss = (avg_loss * (period - 1) + loss[i - 1]) / period
+            out[i] = 100 * avg_gain / (avg_gain + avg_loss)
+        return out
+
+
+if __name__ == '__main__':
+    symbols, window, step = 100, 300, 300
+    rng = np.random.default_rng(0)
+    n = window + 1000
+    buffers, sets = [], []
+    for _ in range(symbols):
+        close = 100 + np.cumsum(rng.normal(0, 1, n))
+        rows = np.column_stack([np.arange(n) * step, close, close + 1, close - 1, close, np.ones(n)])
+        buffer = CandleBuffer(window, step)
+        buffer.update(rows[:window])
+        indicators = IndicatorSet({'rsi14': RSI(14)}, step=step)
+        indicators.sync(buffer.view())
+        buffers.append((buffer, rows))
+        sets.append(indicators)
+
+    cycle = [window]
+
+    def incremental():
+        i = cycle[0]
+        for (buffer, rows), indicators in zip(buffers, sets):
+            buffer.update(rows[i:i + 1])
+            indicators.sync(buffer.view())
+        cycle[0] += 1
+
+    def full():
+        for buffer, _ in buffers:
+            full_rsi(buffer.column('close'))
+
+    runs = 200
+    inc = min(timeit.repeat(incremental, number=runs, repeat=3)) / runs
+    rec = min(timeit.repeat(full, number=runs, repeat=3)) / runs
+    print(f"{symbols} symbols, window {window}: full {'talib' if talib else 'python'} recompute {rec * 1e3:7.3f} ms/cycle, "
+          f"incremental {inc * 1e3:7.3f} ms/cycle")
+    last = buffers[0][0].column('close')
+    print(f"last RSI incremental {sets[0].indicators['rsi14'].peek(buffers[0][0].view()[-1]):.6f}, "
+          f"full recompute over the window {full_rsi(last)[-1]:.6f} (window seeding differs, converges)")
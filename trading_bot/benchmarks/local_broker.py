@@ -0,0 +1,83 @@
+"""
+Broker throughput / latency against the in-process LocalNode, no network or funds needed:
+quotes (cold: the pair index is loaded on first use, vs warm cache) and a burst of pipelined swaps of one account resolved by the watcher.
+run from trading_bot/: python benchmarks/local_broker.py [--swaps 20] [--latency 0.05] [--jitter 0.02] [--block-time 0.5]
+"""
+import argparse, asyncio, os, sys, time
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aptos_sdk.account import Account
+from lib.broker.dex.aptos_pancake import PancakeBroker, run_async
+from lib.broker.dex.localnode import LocalNode
+
+PRICES = {'USDT': 1, 'APT': 9, 'CAKE': 2.5, 'WETH': 2500, 'THL': 0.3, 'ceBNB': 600, 'aBTC': 60000, 'GUI': 0.001}
+
+
+def percentiles(samples: list) -> str:
+    p50, p90, p99 = np.percentile(np.array(samples) * 1e3, [50, 90, 99])
+    return f"p50 {p50:7.1f} ms  p90 {p90:7.1f} ms  p99 {p99:7.1f} ms  (n={len(samples)})"
+
+
+async def timed(coro):
+    start = time.perf_counter()
+    result = await coro
+    return result, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--swaps', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--jitter', type=float, default=0.02)
+    parser.add_argument('--block-time', type=float, default=0.5)
+    args = parser.parse_args()
+
+    with open('configs/aptos_chain.yaml.example', 'r') as file:
+        contracts = yaml.safe_load(file)['mainnet']['contracts']
+    tokens = contracts['tokens']
+
+    account = Account.generate()
+    # every coin store exists up front, swaps do not wait for register transactions
+    coins = {info[0]: 0 for info in tokens.values()}
+    coins[tokens['USDT'][0]] = 1_000_000 * 10**6
+    coins[tokens['APT'][0]] = 10_000 * 10**8
+    node = LocalNode.for_tokens(contracts['router'][0], tokens, PRICES, balances={str(account.address()): coins},
+                                latency=args.latency, jitter=args.jitter, block_time=args.block_time)
+
+    with node:
+        start = time.perf_counter()
+        broker = PancakeBroker([node.url], contract_info=contracts)
+        print(f"broker init: {(time.perf_counter() - start) * 1e3:.1f} ms, latency {args.latency * 1e3:.0f}"
+              f"+{args.jitter * 1e3:.0f} ms, block time {args.block_time * 1e3:.0f} ms")
+
+        amount = broker.to_wei('USDT', 100)
+        for label in ('direct', 'routed'):
+            pair = ['USDT', 'APT'] if label == 'direct' else ['APT', 'WETH']
+            samples = []
+            for _ in range(10):
+                _, elapsed = run_async(timed(broker.estimate_amounts(pair, amount, function='getAmountsOut')))
+                samples.append(elapsed)
+            print(f"estimate {label:6s} cold {samples[0] * 1e3:7.1f} ms, warm {percentiles(samples[1:])}")
+
+        async def burst(n):
+            results = await asyncio.gather(*[timed(broker.swap_in(account, ['USDT', 'APT'], amount, 0)) for _ in range(n)])
+            hashes = [h for h, _ in results]
+            _, wait = await timed(broker.watcher.resolve(account.address(), hashes, timeout=30))
+            return hashes, [t for _, t in results], wait
+
+        start = time.perf_counter()
+        hashes, submit_times, wait = run_async(burst(args.swaps), timeout=120)
+        total = time.perf_counter() - start
+        found = run_async(broker.watcher.resolve(account.address(), hashes))
+        ok = sum(1 for tx in found.values() if tx.get('success'))
+
+        print(f"submit swap_in  {percentiles(submit_times)}")
+        print(f"{args.swaps} pipelined swaps: {ok}/{len(hashes)} succeeded, committed in {total:.2f} s "
+              f"(watcher wait {wait:.2f} s), {args.swaps / total:.1f} swaps/s")
+        print(f"APT balance {broker.from_wei('APT', node.balance(account.address(), tokens['APT'][0])):.4f}, "
+              f"pool {node.reserves(tokens['APT'][0], tokens['USDT'][0])}")
+        print(broker.watcher)
+        for route, count in sorted(node.requests.items()):
+            print(f"  {count:5d}  {route}")
@@ -0,0 +1,49 @@
+"""
+Scaling of the parameter sweep with the number of processes: the same RSI grid on synthetic 5m candles
+shared with the workers through one shared memory block
+run from trading_bot/: python benchmarks/sweep.py [--days 30] [--symbols 3] [--runs 16]
+"""
+import argparse, os, sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.market.indicators import RSI
+from lib.sweep import SharedCandles, Sweep, random_search
+from benchmarks.backtest import RsiStrategy
+
+
+def make_strategy(params):
+    return RsiStrategy(period=params['period'], buy=params['buy'], sell=params['sell'])
+
+
+def make_indicators(params):
+    return {f"rsi{params['period']}": RSI(params['period'])}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=float, default=30)
+    parser.add_argument('--symbols', type=int, default=3)
+    parser.add_argument('--runs', type=int, default=16)
+    args = parser.parse_args()
+    n = int(args.days * 288)
+    rng = np.random.default_rng(0)
+    series = {}
+    for s in range(args.symbols):
+        close = 10 * np.exp(np.cumsum(rng.normal(0, 0.003, n)))
+        open_ = np.append(10, close[:-1])
+        series[(f"T{s}", '5m')] = np.column_stack([np.arange(n) * 300, open_, np.maximum(open_, close), np.minimum(open_, close), close, np.ones(n)])
+    params = random_search({'period': (7, 21), 'buy': (15, 35), 'sell': (65, 85)}, args.runs, seed=1)
+
+    cores = os.cpu_count() or 1
+    with SharedCandles(series) as candles:
+        print(f"{args.runs} backtests of {args.symbols} symbols x {n} candles, {candles}, {cores} cores")
+        base = None
+        for processes in sorted({1, 2, 4, cores}):
+            if processes > cores:
+                continue
+            sweep = Sweep(make_strategy, candles, [f"T{s}" for s in range(args.symbols)], indicators=make_indicators, processes=processes)
+            table = sweep.run(params)
+            base = base or sweep.elapsed
+            print(f"processes {processes:2d}: {sweep.elapsed:7.2f} s, x{base / sweep.elapsed:.2f} vs 1 process, "
+                  f"best return {table['return_pct'].iloc[0]:.2f}%")
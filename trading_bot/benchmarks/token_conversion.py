@@ -0,0 +1,42 @@
+"""
+Micro-benchmark of to_wei / from_wei: CoinInfo json parsed on every call vs TokenRegistry
+run from trading_bot/: python benchmarks/token_conversion.py
+"""
+import json, os, sys, timeit
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.broker.dex.tokens import TokenRegistry
+
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'configs', 'aptos_chain.yaml.example')
+
+
+def json_to_wei(tokens, symbol, amount):
+    decimal = int(json.loads(tokens[symbol][1])['data']['decimals'])
+    return int(amount * 10**decimal)
+
+
+def json_from_wei(tokens, symbol, amount):
+    decimal = int(json.loads(tokens[symbol][1])['data']['decimals'])
+    return amount / 10**decimal
+
+
+if __name__ == '__main__':
+    with open(CONFIG, 'r') as file:
+        tokens = yaml.safe_load(file)['mainnet']['contracts']['tokens']
+    registry = TokenRegistry(tokens)
+    symbols = list(tokens.keys())
+    n = 20_000
+
+    cases = {
+        'to_wei   json    ': lambda: [json_to_wei(tokens, s, 1.2345) for s in symbols],
+        'to_wei   registry': lambda: [registry.to_wei(s, 1.2345) for s in symbols],
+        'from_wei json    ': lambda: [json_from_wei(tokens, s, 123456789) for s in symbols],
+        'from_wei registry': lambda: [registry.from_wei(s, 123456789) for s in symbols],
+    }
+    for name, fn in cases.items():
+        t = min(timeit.repeat(fn, number=n // len(symbols), repeat=5))
+        print(f"{name}: {t / n * 1e6:8.3f} us/call")
+
+    # float math is not exact, the registry is
+    print("1.005 USDT ->", json_to_wei(tokens, 'USDT', 1.005), "(json)", registry.to_wei('USDT', 1.005), "(registry)")
@@ -0,0 +1,227 @@
+"""
+Event driven backtest of a Strategy on the candles of a CandleStore: the history is replayed bar by bar through
+TradingBot.run with a SimBroker, the strategy run() is the live code, only get_data is served from the replay.
+Indicators and the per token frames are computed once before the replay, a step is a slice of them.
+"""
+import contextlib, copy, math, os, time
+
+import numpy as np
+import pandas as pd
+
+from lib.trading import MarketBatch, Strategy, TradingBot
+from lib.broker.sim import SimBroker
+from lib.market.candles import CLOSE, COLUMNS, OPEN, TIMESTAMP, timeframe_seconds
+from lib.market.resample import resample
+from lib.market.store import CandleStore
+
+
+class ReplayFeed():
+    def __init__(self, store: CandleStore, tokens: list, currency: str, timeframe: str = '5m', indicators: dict = None,
+                 window: int = 30, start: int = None, end: int = None) -> None:
+        """
+        Candles of the tokens in the get_data layout (timestamp, ohlcv, indicator columns, symbol), one step per bar
+        - indicators: {column name: Indicator} computed on every token, like {'rsi14': RSI(14)}
+        - window: candles of each token given to the strategy
+        - start, end: open timestamps (seconds) of the first / after the last bar replayed, indicators warm up before start
+        A timeframe missing in the store is resampled from the 1m candles
+        """
+        self.tokens = list(tokens)
+        self.currency = currency
+        self.step = timeframe_seconds(timeframe)
+        self.window = window
+        self.frames, self.closes, self.timestamps = {}, {}, {}
+        for token in self.tokens:
+            rows = self.candles(store, token, timeframe, end)
+            if len(rows) == 0:
+                print(f"No {timeframe} candles of {token} in {store.root}")
+                continue
+            df = pd.DataFrame(rows[:, OPEN:], columns=COLUMNS[OPEN:])
+            df.insert(0, 'timestamp', pd.to_datetime(rows[:, TIMESTAMP].astype(np.int64), unit='s'))
+            for name, indicator in (indicators or {}).items():
+                indicator = copy.deepcopy(indicator)
+                indicator.reset()
+                df[name] = [indicator.update(candle) for candle in rows]
+            df['symbol'] = token + currency
+            self.frames[token] = df
+            self.closes[token] = rows[:, CLOSE]
+            self.timestamps[token] = rows[:, TIMESTAMP].astype(np.int64)
+        # one frame of all tokens, the data of a step is one take of the window rows of each token
+        self.frame = pd.concat(list(self.frames.values()), ignore_index=True) if self.frames else None
+        self.offsets = dict(zip(self.frames, np.cumsum([0] + [len(f) for f in self.frames.values()])))
+        clock = np.unique(np.concatenate(list(self.timestamps.values()))) if self.timestamps else np.zeros(0, dtype=np.int64)
+        self.clock = clock[clock >= start] if start is not None else clock
+        # row of every token at every step, its last candle opened at or before the step (-1 before its first one)
+        self.rows = {t: np.searchsorted(ts, self.clock, side='right') - 1 for t, ts in self.timestamps.items()}
+        self.position = 0
+
+    def __len__(self):
+        return len(self.clock)
+
+    def __repr__(self):
+        return f"ReplayFeed({list(self.frames)}, steps={len(self.clock)}, step={self.step}s)"
+
+    def candles(self, store: CandleStore, token: str, timeframe: str, end: int = None) -> np.ndarray:
+        if (token, timeframe) in store:
+            cols = store.read(token, timeframe, end=end)
+            return np.column_stack([cols[name] for name in COLUMNS]).astype(np.float64)
+        if (token, '1m') in store:
+            cols = store.read(token, '1m', end=end)
+            rows = resample(np.column_stack([cols[name] for name in COLUMNS]), self.step)
+            # the last candle is complete only if its last minute is there
+            if len(rows) and cols['timestamp'][-1] + 60 < rows[-1, TIMESTAMP] + self.step:
+                rows = rows[:-1]
+            return rows
+        return np.zeros((0, len(COLUMNS)), dtype=np.float64)
+
+    def close_time(self, i: int = None) -> int:
+        """Close time of the bar of step i (the current one by default)"""
+        return int(self.clock[self.position if i is None else i]) + self.step
+
+    def prices(self, i: int = None) -> dict:
+        """{token: last close} at step i"""
+        i = self.position if i is None else i
+        return {t: float(self.closes[t][rows[i]]) for t, rows in self.rows.items() if rows[i] >= 0}
+
+    def data(self, tokens: list, currency: str = None) -> pd.DataFrame:
+        """get_data of the current step, the last window candles of each token"""
+        index = []
+        for token in tokens:
+            if token not in self.rows:
+                continue
+            row = self.rows[token][self.position]
+            if row < 0:
+                continue
+            offset = self.offsets[token]
+            index.append(np.arange(offset + max(0, row - self.window + 1), offset + row + 1))
+        if not index:
+            return pd.DataFrame(columns=list(self.frame.columns) if self.frame is not None else COLUMNS + ['symbol'])
+        return self.frame.take(np.concatenate(index)).reset_index(drop=True)
+
+
+class ReplayStrategy(Strategy):
+    def __init__(self, strategy: Strategy, feed: ReplayFeed) -> None:
+        """A live strategy whose market data comes from the replay"""
+        super().__init__(strategy=strategy, feed=feed)
+
+    def __repr__(self):
+        return f"ReplayStrategy({self.strategy.__class__.__name__}, {self.feed})"
+
+    def get_data(self, tokens: list, currency: str, interval: str = None) -> pd.DataFrame:
+        return self.feed.data(tokens, currency)
+
+    def run(self, pair: list, data: pd.DataFrame, budget: float, bot: TradingBot):
+        return self.strategy.run(pair, data, budget, bot)
+
+    def run_batch(self, batch: MarketBatch, budgets: np.ndarray, bot: TradingBot) -> dict:
+        return self.strategy.run_batch(batch, budgets, bot)
+
+    def has_batch(self) -> bool:
+        return self.strategy.has_batch()
+
+
+class BacktestBot(TradingBot):
+    """TradingBot of a backtest, orders and trades stay in memory (no database)"""
+    def write_order(self, order) -> None:
+        pass
+
+    def write_trade(self, trade) -> None:
+        pass
+
+
+class Backtest():
+    def __init__(self, strategy: Strategy, store: CandleStore, tokens: list, currency: str = 'USDT', timeframe: str = '5m',
+                 cash: float = 1000.0, indicators: dict = None, window: int = 30, start: int = None, end: int = None,
+                 liquidity=1_000_000.0, fee_bps: int = None, order_fee: float = 0.0, call_budget: float = 0.1,
+                 invest_amount: float = None, quiet: bool = True, **bot_kwargs) -> None:
+        """
+        Replay the stored candles of the tokens through TradingBot.run of a strategy, orders filled by a SimBroker
+        - strategy: live strategy, only its run() is called
+        - indicators: columns added to the candles, like {'rsi14': RSI(14)} (what the strategy get_data adds)
+        - cash: currency held at start, invest_amount: bot budget (cash by default)
+        - liquidity, fee_bps, order_fee: SimBroker pools and fees
+        - quiet: hide the prints of the bot and the strategy during the replay
+        """
+        self.feed = ReplayFeed(store, tokens, currency, timeframe, indicators, window, start, end)
+        broker_kwargs = {} if fee_bps is None else {'fee_bps': fee_bps}
+        self.broker = SimBroker(tokens, {currency: cash}, currency, liquidity, order_fee=order_fee, **broker_kwargs)
+        self.strategy = ReplayStrategy(strategy, self.feed)
+        self.quiet = quiet
+        with self._output():
+            self.bot = BacktestBot(
+                id='backtest',
+                wallet_key='0xbacktest',
+                tokens=list(tokens),
+                currency=currency,
+                call_budget=call_budget,
+                invest_amount=invest_amount or cash,
+                broker=self.broker,
+                strategy=self.strategy,
+                notif_on=False,
+                **bot_kwargs,
+            )
+        self.cash = cash
+        self.equity = np.full(len(self.feed), np.nan)  # portfolio value at the close of every step
+        self.elapsed = 0.0
+
+    def __repr__(self):
+        return f"Backtest({self.feed}, {self.stats()})"
+
+    def _output(self):
+        return contextlib.redirect_stdout(open(os.devnull, 'w')) if self.quiet else contextlib.nullcontext()
+
+    def step(self, i: int) -> list:
+        """Run the bot on the bar of step i, return the processed trades"""
+        self.feed.position = i
+        self.broker.set_market(self.feed.close_time(i), self.feed.prices(i))
+        trades = self.bot.run()
+        self.bot.checking_orders()
+        self.equity[i] = self.broker.portfolio(self.bot).total
+        return trades
+
+    def run(self) -> dict:
+        """Replay every step, return stats()"""
+        start = time.perf_counter()
+        with self._output() as out:
+            try:
+                for i in range(len(self.feed)):
+                    self.step(i)
+            finally:
+                if self.quiet:
+                    out.close()
+        self.elapsed = time.perf_counter() - start
+        return self.stats()
+
+    def trades(self) -> pd.DataFrame:
+        """Closed trades of the bot"""
+        return pd.DataFrame([{
+            'symbol': t.open_order.symbol,
+            'entry_time': pd.to_datetime(t.entry_time, unit='s'),
+            'exit_time': pd.to_datetime(t.exit_time, unit='s'),
+            'entry_price': t.entry_price,
+            'exit_price': t.exit_price,
+            'invested': t.invested_amount,
+            'profit': t.profit,
+        } for t in self.bot.history_trades], columns=['symbol', 'entry_time', 'exit_time', 'entry_price', 'exit_price', 'invested', 'profit'])
+
+    def equity_curve(self) -> pd.Series:
+        return pd.Series(self.equity, index=pd.to_datetime(self.feed.clock + self.feed.step, unit='s'), name='equity')
+
+    def stats(self) -> dict:
+        done = self.equity[~np.isnan(self.equity)]
+        if len(done) == 0:
+            return {'steps': 0}
+        peak = np.maximum.accumulate(done)
+        profits = [t.profit for t in self.bot.history_trades]
+        return {
+            'start': str(pd.to_datetime(self.feed.close_time(0), unit='s')),
+            'end': str(pd.to_datetime(self.feed.close_time(len(done) - 1), unit='s')),
+            'steps': len(done),
+            'equity': round(float(done[-1]), 4),
+            'return_pct': round(float(done[-1] / self.cash - 1) * 100, 4),
+            'max_drawdown_pct': round(float(((done - peak) / peak).min()) * 100, 4),
+            'trades': len(profits),
+            'win_rate': round(sum(p > 0 for p in profits) / len(profits), 4) if profits else math.nan,
+            'open_trades': sum(len(v) for v in self.bot.open_trades.values()),
+            'fees': round(self.broker.fees, 4),
+            'seconds': round(self.elapsed, 3),
+        }
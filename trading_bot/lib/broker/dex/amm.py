@@ -0,0 +1,187 @@
+"""
+Constant product quotes of the PancakeSwap router, exact to the on-chain integer math (u128, floor division),
+for one amount or for whole numpy arrays of amounts and reserves (broadcast like any numpy op).
+
+    amount_out = amount_in * 9975 * reserve_out // (reserve_in * 10000 + amount_in * 9975)
+    amount_in  = reserve_in * amount_out * 10000 // ((reserve_out - amount_out) * 9975) + 1
+
+Arrays are computed in int64, the u128 products are handled by a float estimate corrected with the exact
+remainder modulo 2**64. Values too large for that fall back to python ints (object dtype), results are always exact.
+"""
+import numpy as np
+
+FEE_BPS = 25
+BPS = 10000
+
+# amounts_in of an output the pool can not give (amount_out >= reserve_out), the router would abort
+INSUFFICIENT_LIQUIDITY = -1
+
+_INT64_MAX = np.iinfo(np.int64).max
+
+
+def get_amount_out(amount_in: int, reserve_in: int, reserve_out: int, fee_bps: int = FEE_BPS) -> int:
+    amount_in_with_fee = int(amount_in) * (BPS - fee_bps)
+    numerator = amount_in_with_fee * int(reserve_out)
+    denominator = int(reserve_in) * BPS + amount_in_with_fee
+    if denominator == 0:
+        return 0
+    return numerator // denominator
+
+
+def get_amount_in(amount_out: int, reserve_in: int, reserve_out: int, fee_bps: int = FEE_BPS) -> int:
+    amount_out = int(amount_out)
+    if amount_out < 0 or amount_out >= reserve_out:
+        return INSUFFICIENT_LIQUIDITY
+    numerator = int(reserve_in) * amount_out * BPS
+    denominator = (int(reserve_out) - amount_out) * (BPS - fee_bps)
+    return numerator // denominator + 1
+
+
+def _ints(x) -> np.ndarray:
+    """int64 array if the values fit, else object array of python ints"""
+    if not isinstance(x, (np.ndarray, np.generic)):
+        try:
+            return np.asarray(x, dtype=np.int64)
+        except (OverflowError, TypeError, ValueError):
+            # python ints over int64, numpy would silently make them floats
+            return np.asarray(np.frompyfunc(int, 1, 1)(np.asarray(x, dtype=object)), dtype=object)
+    arr = np.asarray(x)
+    if arr.dtype.kind == 'i' or (arr.dtype.kind == 'u' and arr.dtype.itemsize < 8):
+        return arr.astype(np.int64, copy=False)
+    if arr.dtype.kind == 'f' and arr.size and np.abs(arr).max() < 2**53:
+        return arr.astype(np.int64)
+    if arr.dtype.kind in 'uf' and arr.size and arr.max() <= _INT64_MAX and arr.min() >= 0:
+        return arr.astype(np.int64)
+    return np.asarray(np.frompyfunc(int, 1, 1)(arr), dtype=object)
+
+
+def _bound(arr: np.ndarray) -> int:
+    return max(abs(int(arr.max())), abs(int(arr.min()))) if arr.size else 0
+
+
+def _fits(*products) -> bool:
+    return all(p <= _INT64_MAX for p in products)
+
+
+def _common(*arrays) -> list:
+    """Cast every array to object dtype if one of them is, numpy mixes int64 and object badly"""
+    if any(a.dtype == object for a in arrays):
+        return [a.astype(object) for a in arrays]
+    return list(arrays)
+
+
+def _where(cond, x, y, dtype) -> np.ndarray:
+    # 0-d object arithmetic gives back python ints, keep everything an array of dtype
+    return np.asarray(np.where(cond, np.asarray(x, dtype=dtype), np.asarray(y, dtype=dtype)), dtype=dtype)
+
+
+def _muldiv(x: np.ndarray, y: np.ndarray, d: np.ndarray):
+    """
+    floor(x * y / d) of non negative int64 arrays (d > 0), exact even when x * y does not fit in 64 bits:
+    float64 estimate, then corrected by the remainder computed modulo 2**64.
+    None when the remainder can not be trusted (results too large), fall back to python ints then
+    """
+    q_f = np.floor(x.astype(np.float64) * y / d)
+    q_max = float(q_f.max()) if q_f.size else 0.0
+    err = q_max * 2.0**-50 + 2  # bound of the float estimate error
+    if not q_max < 2.0**62 or (err + 1) * float(d.max()) >= 2.0**63:
+        return None
+    q = q_f.astype(np.int64)
+    with np.errstate(over='ignore'):
+        r = (x.astype(np.uint64) * y.astype(np.uint64) - q.astype(np.uint64) * d.astype(np.uint64)).astype(np.int64)
+    return q + r // d
+
+
+def amounts_out(amount_in, reserve_in, reserve_out, fee_bps: int = FEE_BPS) -> np.ndarray:
+    """
+    Vectorized get_amount_out
+    - amount_in, reserve_in, reserve_out: ints or arrays broadcastable together, like a size ladder
+      of shape (n,) against reserves of shape (m, 1) for m pairs
+    """
+    a, r_in, r_out = _common(_ints(amount_in), _ints(reserve_in), _ints(reserve_out))
+    fee = BPS - fee_bps
+    if a.dtype != object and _fits(_bound(a) * fee + _bound(r_in) * BPS):
+        amount_in_with_fee = a * fee
+        denominator = r_in * BPS + amount_in_with_fee
+        empty = denominator == 0
+        out = _muldiv(amount_in_with_fee, r_out, np.where(empty, 1, denominator))
+        if out is not None:
+            return _where(empty, 0, out, np.int64)
+    a, r_in, r_out = a.astype(object), r_in.astype(object), r_out.astype(object)
+
+    amount_in_with_fee = a * fee
+    numerator = amount_in_with_fee * r_out
+    denominator = r_in * BPS + amount_in_with_fee
+    empty = denominator == 0
+    out = numerator // _where(empty, 1, denominator, object)
+    return _where(empty, 0, out, object)
+
+
+def amounts_in(amount_out, reserve_in, reserve_out, fee_bps: int = FEE_BPS) -> np.ndarray:
+    """
+    Vectorized get_amount_in, INSUFFICIENT_LIQUIDITY where amount_out >= reserve_out
+    """
+    a, r_in, r_out = _common(_ints(amount_out), _ints(reserve_in), _ints(reserve_out))
+    fee = BPS - fee_bps
+    infeasible = (a < 0) | (a >= r_out)
+    if a.dtype != object and _fits(_bound(a) * BPS, _bound(r_out) * fee):
+        denominator = np.where(infeasible, 1, (r_out - a) * fee)
+        res = _muldiv(r_in, np.where(infeasible, 0, a) * BPS, denominator)
+        if res is not None:
+            return _where(infeasible, INSUFFICIENT_LIQUIDITY, res + 1, np.int64)
+    a, r_in, r_out = a.astype(object), r_in.astype(object), r_out.astype(object)
+
+    numerator = r_in * a * BPS
+    denominator = _where(infeasible, 1, (r_out - a) * fee, object)
+    res = numerator // denominator + 1
+    return _where(infeasible, INSUFFICIENT_LIQUIDITY, res, object)
+
+
+def amounts_out_path(amount_in, reserves: list, fee_bps: int = FEE_BPS) -> list:
+    """
+    getAmountsOut over a path, [amount_in, amount_out_hop_1, ..., amount_out]
+    - reserves: [(reserve_in, reserve_out)] of each hop, scalars or arrays
+    """
+    amounts = [_ints(amount_in)]
+    for reserve_in, reserve_out in reserves:
+        amounts.append(amounts_out(amounts[-1], reserve_in, reserve_out, fee_bps))
+    return amounts
+
+
+def amounts_in_path(amount_out, reserves: list, fee_bps: int = FEE_BPS) -> list:
+    """
+    getAmountsIn over a path, [amount_in, ..., amount_out], INSUFFICIENT_LIQUIDITY propagates to the first hops
+    - reserves: [(reserve_in, reserve_out)] of each hop in path order
+    """
+    amounts = [_ints(amount_out)]
+    for reserve_in, reserve_out in reversed(reserves):
+        prev = amounts[0]
+        res = amounts_in(prev, reserve_in, reserve_out, fee_bps)
+        amounts.insert(0, _where(prev < 0, INSUFFICIENT_LIQUIDITY, res, res.dtype))
+    return amounts
+
+
+def price_impact(amount_in, amount_out, reserve_in, reserve_out) -> np.ndarray:
+    """Execution price vs spot price (fee included) as a fraction, 0.01 is 1% worse than spot"""
+    amount_in = np.asarray(amount_in, dtype=np.float64)
+    amount_out = np.asarray(amount_out, dtype=np.float64)
+    spot = np.asarray(reserve_out, dtype=np.float64) / np.asarray(reserve_in, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 1.0 - amount_out / (amount_in * spot)
+
+
+def slippage_curve(sizes, reserve_in, reserve_out, fee_bps: int = FEE_BPS) -> tuple:
+    """Return (amounts_out, price_impact) of a ladder of input sizes"""
+    out = amounts_out(sizes, reserve_in, reserve_out, fee_bps)
+    return out, price_impact(sizes, out, reserve_in, reserve_out)
+
+
+def max_amount_in(reserve_in, max_impact: float, fee_bps: int = FEE_BPS) -> np.ndarray:
+    """
+    Largest input whose price impact (fee included) stays under max_impact, before integer rounding.
+    0 where max_impact is below the fee
+    """
+    fee = (BPS - fee_bps) / BPS
+    r_in = np.asarray(reserve_in, dtype=np.float64)
+    size = r_in * (fee / (1.0 - np.asarray(max_impact, dtype=np.float64)) - 1.0) / fee
+    return np.floor(np.maximum(size, 0.0)).astype(np.int64)
@@ -3,12 +3,21 @@ import json, time, ulid, yaml
 
 from typing import Tuple
 from aptos_sdk.account import Account
-from aptos_sdk.async_client import RestClient
+from aptos_sdk.async_client import ApiError
 from aptos_sdk.bcs import Serializer
 from aptos_sdk.transactions import EntryFunction, TransactionPayload, TransactionArgument
 from aptos_sdk.type_tag import StructTag, TypeTag
 
-from lib.trading import BaseBroker, Order, OrderPlan, TradingBot
+from lib.trading import BaseBroker, Order, OrderPlan, PortfolioSnapshot, TradingBot
+from lib.broker.dex.pairs import PairIndex
+from lib.broker.dex.receipts import ReceiptResolver
+from lib.broker.dex.rpc_pool import RpcPool
+from lib.broker.dex.sequence import SequenceManager, is_sequence_error
+from lib.broker.dex.tokens import TokenRegistry
+from lib.broker.dex.watcher import AccountWatcher, swap_events, transaction_hash
+from lib.broker.dex.amm import FEE_BPS, amounts_in_path, amounts_out, amounts_out_path, get_amount_in, get_amount_out
+from lib.broker.dex.reserves import ReserveCache, ReserveSnapshot
+from lib.broker.dex.routing import MAX_HOPS, RouteFinder, swap_function
 
 def start_loop(loop: asyncio.AbstractEventLoop):
     asyncio.set_event_loop(loop)
@@ -19,10 +28,10 @@ bg_loop = asyncio.new_event_loop()
 bg_thread = threading.Thread(target=start_loop, args=(bg_loop,), daemon=True)
 bg_thread.start()
 
-def run_async(coro: asyncio.coroutines):
+def run_async(coro: asyncio.coroutines, timeout: float = 30):
     try:
         future = asyncio.run_coroutine_threadsafe(coro, bg_loop)
-        return future.result(timeout=30)  # Add timeout to prevent hanging
+        return future.result(timeout=timeout)  # Add timeout to prevent hanging
     except Exception as e:
         print(f"Error running async function: {e}")
         raise e
@@ -39,26 +48,120 @@ async def get_token_info(token_types, rest_client) -> dict:
 
 
 class PancakeBroker(BaseBroker):
-    def __init__(self, rpcs, ecosystem_token='APT', contract_info:dict=None):
+    def __init__(self, rpcs, ecosystem_token='APT', contract_info:dict=None, reserve_max_age:float=5.0, reserve_cache_size:int=256,
+                 rpc_pool:dict=None, max_hops:int=MAX_HOPS):
         self.rpc_urls = rpcs
-        self.gateway = RestClient(rpcs[0])
+        # all rpcs, reads go to the fastest healthy node and are hedged when slow (rpc_pool: RpcPool options)
+        self.gateway = RpcPool(rpcs, **(rpc_pool or {}))
         self.ecosystem_token = ecosystem_token or 'APT'
         self.contract_info = contract_info
         self.tokens = contract_info['tokens']
+        # decimals / scale of every token parsed once, conversions never re-parse the CoinInfo json
+        self.registry = TokenRegistry(self.tokens)
         self.type2symbol = {info[0] : t for t, info in self.tokens.items()}
         self.router_address = contract_info['router'][0]
+        # reserves are cached by pair and ledger version, during a bot cycle all quotes
+        # are read at the same pinned ledger version (see begin_cycle)
+        self.reserve_cache = ReserveCache(max_age=reserve_max_age, max_size=reserve_cache_size)
+        self._pinned_version = None  # (ledger_version, pinned_at)
+        self.cycle_snapshot = None   # ReserveSnapshot of the bot pairs in the current cycle
+        self._held = False           # cycle held by hold_cycle, the bots begin_cycle / end_cycle keep it
+        # orientation of every pair, so a reserve lookup is exactly one request
+        self.pair_index = PairIndex(self.router_address)
+        self._index_lock = asyncio.Lock()
+        # swaps are routed over the best path of up to max_hops pairs, through the configured tokens
+        self.routes = RouteFinder(self.pair_index, max_hops, hubs=[info[0] for info in self.tokens.values()])
+        self.sequences = SequenceManager(self.gateway)
+        self.receipts = ReceiptResolver(self.gateway)
+        # fills of the bot accounts are found by tailing their transactions, not by hash
+        self.watcher = AccountWatcher(self.gateway)
+        # coin types with a CoinStore per account, filled from one resource fetch
+        self._registered = {}
+        self._registration_lock = asyncio.Lock()
+
+    async def load_pair_index(self):
+        """
+        (Re)build the pair orientation index from the router resources
+        their reserves are not cached: they have no ledger version and would push the pinned cycle reserves out
+        """
+        self.pair_index.attempted_at = time.time()
+        resources = await self.gateway.account_resources(self.router_address)
+        self.pair_index.load(resources)
+        return self.pair_index
+
+    async def ensure_pair_index(self):
+        """Load the pair index on first use, a failed load is retried at most once per refresh interval"""
+        if self.pair_index.loaded or not self.pair_index.can_refresh():
+            return
+        async with self._index_lock:
+            if not self.pair_index.loaded and self.pair_index.can_refresh():
+                try:
+                    await self.load_pair_index()
+                except Exception as e:
+                    print(f"Error loading pair index, fallback to probing pair orientation: {e}")
+
+    def rpc_stats(self) -> dict:
+        """Latency / error stats of every rpc and hedged request counters"""
+        return self.gateway.stats()
+
+    def reserve_stats(self) -> dict:
+        """Hit/miss counters of the pair index and the reserve cache"""
+        return {
+            'pair_index': self.pair_index.stats(),
+            'reserve_cache': {'size': len(self.reserve_cache), 'hits': self.reserve_cache.hits, 'misses': self.reserve_cache.misses},
+        }
+
+    async def pin_cycle(self, pairs:list=None):
+        """
+        Pin the current ledger version, quotes until end_cycle read one consistent snapshot
+        - pairs: if set, prefetch reserves of the pairs into cycle_snapshot
+        """
+        info = await self.gateway.info()
+        self._pinned_version = (int(info['ledger_version']), time.time())
+        if pairs:
+            self.cycle_snapshot = await self.get_reserves_many(pairs)
+        return self._pinned_version[0]
+
+    def begin_cycle(self, pairs:list=None):
+        if self._held:
+            return self._pinned_version and self._pinned_version[0]
+        return run_async(self.pin_cycle(pairs))
+
+    def end_cycle(self):
+        if self._held:
+            return
+        self._pinned_version = None
+        self.cycle_snapshot = None
+
+    def hold_cycle(self, pairs:list=None):
+        """Pin one snapshot of the pairs of many bots, kept until release_cycle"""
+        self._held = False
+        try:
+            return run_async(self.pin_cycle(pairs))
+        finally:
+            self._held = True
+
+    def release_cycle(self):
+        self._held = False
+        PancakeBroker.end_cycle(self)
+
+    async def get_ledger_version(self):
+        """
+        Pinned ledger version of the current cycle, kept until end_cycle / release_cycle so every read of the
+        cycle matches cycle_snapshot (None outside a cycle: latest state)
+        """
+        if self._pinned_version is None:
+            return None
+        return self._pinned_version[0]
 
     def get_decimal(self, symbol: str):
-        decimal = json.loads(self.tokens[symbol][1])['data']['decimals']
-        return int(decimal)
+        return self.registry[symbol].decimals
 
     def to_wei(self, symbol: str, amount: float):
-        decimal = self.get_decimal(symbol)
-        return int(amount * 10**decimal)
+        return self.registry.to_wei(symbol, amount)
 
     def from_wei(self, symbol: str, amount: int):
-        decimal = self.get_decimal(symbol)
-        return amount / 10**decimal
+        return self.registry.from_wei(symbol, amount)
 
     def load_account(self, wallet_key: str):
         """Load account from wallet key"""
@@ -78,9 +181,27 @@ class PancakeBroker(BaseBroker):
          - balance
          - pending_amount
         """
-        resources = run_async(self.gateway.account_resources(bot.account.address()))
+        return run_async(self.fetch_balance(bot))
 
-        pending_amount = 0.0 # total amount equal to value of non-currency tokens in open orders
+    async def fetch_balance(self, bot: 'TradingBot') -> Tuple[float, float]:
+        """Coroutine of check_balance, also set bot.portfolio"""
+        portfolio = await self.fetch_portfolio(bot)
+        bot.portfolio = portfolio
+        bot._token_balance = portfolio.token_balance()
+
+        balance = portfolio.cash
+        pending_amount = portfolio.invested # total amount equal to value of non-currency tokens in open orders
+        return balance, pending_amount
+
+    async def fetch_portfolio(self, bot: 'TradingBot') -> PortfolioSnapshot:
+        """
+        Balances of the bot tokens valued in bot.currency: one resources request, one batch of reserves
+        and the local AMM math for every held token
+        """
+        resources = await self.gateway.account_resources(bot.account.address())
+        self.cache_registrations(bot.account.address(), resources)
+
+        holdings = {bot.currency: {'qty': 0, 'value': 0.0}}
         for res in resources:
             if res["type"].startswith("0x1::coin::CoinStore<"):
                 # tách coin_type từ resource type
@@ -88,32 +209,53 @@ class PancakeBroker(BaseBroker):
                 symbol = self.type2symbol.get(coin_type, None)
                 if symbol is None or symbol not in bot.tokens + [bot.currency]:
                     continue
-                elif symbol not in bot._token_balance.keys():
-                    bot._token_balance[symbol] = {'qty': 0, 'value': 0.0}
-
-                bot._token_balance[symbol]['qty'] = int(res["data"]["coin"]["value"])
-                
-                if symbol != bot.currency and bot._token_balance[symbol]['qty'] > 0:
-                    path, amounts_outs = self.estimate([symbol, bot.currency], bot._token_balance[symbol]['qty'], function='getAmountsOut')
-                    v = amounts_outs[-1]
-                    value = self.from_wei(symbol, v) if v > 0 else 0.0
-                    bot._token_balance[symbol]['value'] = value
-                    pending_amount += value
-
-        value = self.from_wei(bot.currency, bot._token_balance[bot.currency]['qty'])
-        bot._token_balance[bot.currency]['value'] = value
-
-        balance = bot._token_balance[bot.currency]['value']
-        
-        return balance, pending_amount
+                holdings[symbol] = {'qty': int(res["data"]["coin"]["value"]), 'value': 0.0}
+        holdings[bot.currency]['value'] = self.from_wei(bot.currency, holdings[bot.currency]['qty'])
+
+        held = [symbol for symbol, h in holdings.items() if symbol != bot.currency and h['qty'] > 0]
+        if not held:
+            return PortfolioSnapshot(bot.currency, holdings)
+
+        # value all held tokens from one batch of reserves, in one vectorized quote
+        snapshot = await self.get_reserves_many([[symbol, bot.currency] for symbol in held])
+        priced = [symbol for symbol in held if (symbol, bot.currency) in snapshot]
+        if priced:
+            reserves = [snapshot.get(symbol, bot.currency) for symbol in priced]
+            values = amounts_out([holdings[symbol]['qty'] for symbol in priced], [r[0] for r in reserves], [r[1] for r in reserves])
+            for symbol, v in zip(priced, values):
+                holdings[symbol]['value'] = self.from_wei(bot.currency, int(v))
+        for symbol in held:
+            if symbol not in priced:
+                # no direct pool with the currency, value it over the best route
+                path, amounts_outs = await self.estimate_amounts([symbol, bot.currency], holdings[symbol]['qty'], function='getAmountsOut')
+                v = amounts_outs[-1]
+                holdings[symbol]['value'] = self.from_wei(bot.currency, v) if v > 0 else 0.0
+        return PortfolioSnapshot(bot.currency, holdings, ledger_version=snapshot.ledger_version)
+
+    def cache_registrations(self, address, resources: list) -> set:
+        """Remember which coin types have a CoinStore in the account resources"""
+        registered = set()
+        for res in resources:
+            if res["type"].startswith("0x1::coin::CoinStore<"):
+                registered.add(res["type"].split("<", 1)[1][:-1])
+        self._registered[str(address)] = registered
+        return registered
+
+    def invalidate_registrations(self, address=None) -> None:
+        if address is None:
+            self._registered.clear()
+        else:
+            self._registered.pop(str(address), None)
 
     async def token_registered(self, account: Account, token: str):
         addr = account.address()
-
-        resources = await self.gateway.account_resources(addr)
         token_type = self.tokens.get(token, [None, None])[0]
-        typ_pattern = f"0x1::coin::CoinStore<{token_type}>"
-        is_registered = any(res["type"] == typ_pattern for res in resources)
+
+        async with self._registration_lock:
+            if str(addr) not in self._registered:
+                resources = await self.gateway.account_resources(addr)
+                self.cache_registrations(addr, resources)
+        is_registered = token_type in self._registered.get(str(addr), set())
 
         if is_registered:
             return None
@@ -126,74 +268,231 @@ class PancakeBroker(BaseBroker):
             [],
         )
         tx_hash = await self.send_tx(account, payload)
-        return await self.gateway.wait_for_transaction(tx_hash)
-
-    async def send_tx(self, account: Account, payload):
-        signed_tx = await self.gateway.create_bcs_signed_transaction(
-            sender=account,
-            payload=TransactionPayload(payload)
-        )
+        try:
+            result = await self.gateway.wait_for_transaction(tx_hash)
+        except Exception as e:
+            self.invalidate_registrations(addr)
+            raise e
+        self._registered.setdefault(str(addr), set()).add(token_type)
+        return result
 
-        submit_res = await self.gateway.submit_bcs_transaction(signed_tx)
+    async def send_tx(self, account: Account, payload, retry:bool=True):
+        # sequence number is reserved locally, swaps of one account can be pipelined
+        addr = account.address()
+        seq = await self.sequences.reserve(addr)
+        tx_hash = None
+        try:
+            signed_tx = await self.gateway.create_bcs_signed_transaction(
+                sender=account,
+                payload=TransactionPayload(payload),
+                sequence_number=seq
+            )
+            # announced before the submit: a tx the node accepted while the client failed (timeout, lost hedge)
+            # is still the bot's own swap, not an external fill
+            tx_hash = transaction_hash(signed_tx)
+            self.watcher.expect(addr, tx_hash, seq)
+            submit_res = await self.gateway.submit_bcs_transaction(signed_tx)
+        except Exception as e:
+            self.invalidate_registrations(addr)
+            if tx_hash is not None and isinstance(e, ApiError):
+                # rejected by the node, never committed
+                self.watcher.forget(tx_hash)
+            if not is_sequence_error(e):
+                # the counter is kept, pipelined transactions of the account may still be in the mempool
+                raise e
+            # local sequence is out of sync (tx sent outside the bot, expired tx...)
+            await self.sequences.resync(addr)
+            if retry:
+                print(f"Sequence number {seq} rejected, resync and retry: {e}")
+                return await self.send_tx(account, payload, retry=False)
+            raise e
         return submit_res
     
     async def get_reserves(self, token_in, token_out):
+        return await self.get_pair_reserves(self.tokens[token_in][0], self.tokens[token_out][0])
+
+    async def get_pair_reserves(self, type_in, type_out):
+        """(reserve_in, reserve_out) of a pair by coin types"""
+        version = await self.get_ledger_version()
+        await self.ensure_pair_index()
+
+        orientation = self.pair_index.lookup(type_in, type_out)
+        if orientation is None:
+            # new pair listed since the index was built, concurrent misses share one reload
+            async with self._index_lock:
+                if self.pair_index.can_refresh():
+                    try:
+                        await self.load_pair_index()
+                    except Exception as e:
+                        print(f"Error refreshing pair index: {e}")
+            orientation = self.pair_index.lookup(type_in, type_out)
+        if orientation is None:
+            # index not loaded, or the pair is past the first page of router resources the index is read from
+            return await self._probe_reserves(type_in, type_out, version)
+
+        type_x, type_y = orientation
+        reserves = self.reserve_cache.get(orientation, version)
+        if reserves is None:
+            res = await self.gateway.account_resource(
+                self.router_address,
+                f"{self.router_address}::swap::TokenPairReserve<{type_x}, {type_y}>",
+                ledger_version=version
+            )
+            reserves = (int(res['data']['reserve_x']), int(res['data']['reserve_y']))
+            self.reserve_cache.put(orientation, reserves, version)
+        return reserves if type_x == type_in else (reserves[1], reserves[0])
+
+    async def _probe_reserves(self, type_in, type_out, version):
+        """Find the pair orientation by trial, for pairs the index does not have (learned by the index)"""
         reserve_in = reserve_out = 0
         try: 
             res = await self.gateway.account_resource(
                 self.router_address,
-                f"{self.router_address}::swap::TokenPairReserve<{self.tokens[token_in][0]}, {self.tokens[token_out][0]}>"
+                f"{self.router_address}::swap::TokenPairReserve<{type_in}, {type_out}>",
+                ledger_version=version
             )
 
             reserve_in = int(res['data']['reserve_x'])
             reserve_out = int(res['data']['reserve_y'])
+            self.reserve_cache.put((type_in, type_out), (reserve_in, reserve_out), version)
+            self.pair_index.add(type_in, type_out)
         except Exception as e:
             res = await self.gateway.account_resource(
                 self.router_address,
-                f"{self.router_address}::swap::TokenPairReserve<{self.tokens[token_out][0]}, {self.tokens[token_in][0]}>"
+                f"{self.router_address}::swap::TokenPairReserve<{type_out}, {type_in}>",
+                ledger_version=version
             )
             reserve_out = int(res['data']['reserve_x'])
             reserve_in = int(res['data']['reserve_y'])
+            self.reserve_cache.put((type_out, type_in), (reserve_out, reserve_in), version)
+            self.pair_index.add(type_out, type_in)
         return reserve_in, reserve_out
 
-    def get_amount_out(self, amount_in, token_in, token_out, fee=0.9975):
-        reserve_in, reserve_out = run_async(self.get_reserves(token_in, token_out))
-        amount_in_with_fee = amount_in * fee
-        numerator = amount_in_with_fee * reserve_out
-        denominator = reserve_in + amount_in_with_fee
-        return numerator // denominator
+    async def get_reserves_many(self, pairs: list) -> ReserveSnapshot:
+        """Fetch reserves of all pairs concurrently, a failed pair is recorded in snapshot.errors"""
+        version = await self.get_ledger_version()
+        pairs = [tuple(p) for p in pairs]
+        results = await asyncio.gather(*[self.get_reserves(t_in, t_out) for t_in, t_out in pairs], return_exceptions=True)
+
+        reserves, errors = {}, {}
+        for pair, res in zip(pairs, results):
+            if isinstance(res, Exception):
+                errors[pair] = res
+            else:
+                reserves[pair] = res
+        return ReserveSnapshot(reserves, ledger_version=version, errors=errors)
 
-    def get_amount_in(self, amount_out, token_in, token_out, fee=0.9975):
+    def snapshot(self, pairs: list) -> ReserveSnapshot:
+        """
+        Reserves of many pairs in one round of concurrent requests
+        - pairs: list of [token_in, token_out] symbols
+        """
+        return run_async(self.get_reserves_many(pairs))
+
+    def get_amount_out(self, amount_in, token_in, token_out, fee_bps=FEE_BPS):
         reserve_in, reserve_out = run_async(self.get_reserves(token_in, token_out))
-        numerator = reserve_in * amount_out
-        denominator = (reserve_out - amount_out) * fee
-        # Round up to ensure enough input to cover output
-        return int(numerator / denominator + 1)
+        return get_amount_out(amount_in, reserve_in, reserve_out, fee_bps)
 
+    def get_amount_in(self, amount_out, token_in, token_out, fee_bps=FEE_BPS):
+        reserve_in, reserve_out = run_async(self.get_reserves(token_in, token_out))
+        return get_amount_in(amount_out, reserve_in, reserve_out, fee_bps)
 
-    def estimate(self, t_path, amount_in_wei:int, function ='getAmountsIn'):
+    def estimate(self, t_path, amount_in_wei:int, function ='getAmountsIn', snapshot:ReserveSnapshot=None):
         # or cash_to_qty estimate token in and out
+        # t_path: [token_in, token_out] is routed over the best path, a longer path is quoted as is
+        # snapshot: quote from given reserves instead of the chain, default to the cycle snapshot
+        return run_async(self.estimate_amounts(t_path, amount_in_wei, function, snapshot))
+
+    async def estimate_amounts(self, t_path, amount_in_wei:int, function ='getAmountsIn', snapshot:ReserveSnapshot=None):
+        """Coroutine of estimate"""
         if amount_in_wei < 1:
             raise ValueError(f"Invalid amount_in_wei: {amount_in_wei}, should be greater or equal to 1")
             return [], [0]
         else:
             amount_in_wei = int(amount_in_wei)
         
-        (token_in, token_out) = t_path
-        valid_path = [self.tokens[token_in][0], self.tokens[token_out][0]]
-        amounts = [0,0]
+        token_in, token_out = t_path[0], t_path[-1]
+        snapshot = snapshot or self.cycle_snapshot
         try:
+            await self.ensure_pair_index()
+            if len(t_path) == 2 and self.routes.max_hops > 1 and self.pair_index.loaded:
+                valid_path, amounts = await self.find_route(token_in, token_out, amount_in_wei, function, snapshot)
+                if valid_path is not None:
+                    return list(valid_path), amounts
+                if self.routes.routes(self.tokens[token_in][0], self.tokens[token_out][0]):
+                    raise ValueError(f"No route can fill {amount_in_wei}")
+                # pair unknown to the index, quoted directly (its orientation is probed)
+
+            valid_path = [self.tokens[t][0] for t in t_path]
+            hops = await asyncio.gather(*[
+                self.snapshot_reserves(a, b, snapshot) for a, b in zip(t_path, t_path[1:])
+            ])
             if function == 'getAmountsIn':
-                amounts = [self.get_amount_in(amount_in_wei, token_in, token_out), amount_in_wei]
+                amounts = [int(a) for a in amounts_in_path(amount_in_wei, hops)]
+                if amounts[0] < 0:
+                    raise ValueError(f"Insufficient liquidity for {amount_in_wei} {token_out}")
             else:
-                amounts = [amount_in_wei, self.get_amount_out(amount_in_wei, token_in, token_out)]
+                amounts = [int(a) for a in amounts_out_path(amount_in_wei, hops)]
         except Exception as e:
             print(f"Error estimating amounts for {token_in} to {token_out}: {e}")
             return [], [0,0]
         return valid_path, amounts
 
+    async def snapshot_reserves(self, token_in, token_out, snapshot:ReserveSnapshot=None):
+        """Reserves of a pair from the snapshot if it has the pair, else from cache / chain"""
+        if snapshot is not None and (token_in, token_out) in snapshot:
+            return snapshot.get(token_in, token_out)
+        return await self.get_reserves(token_in, token_out)
+
+    async def find_route(self, token_in, token_out, amount_wei:int, function='getAmountsOut', snapshot:ReserveSnapshot=None):
+        """
+        Best path of up to max_hops pairs from token_in to token_out, return (path of coin types, amounts)
+        every candidate path is quoted at once from the (cached) reserves of all their pairs
+        """
+        routes = self.routes.routes(self.tokens[token_in][0], self.tokens[token_out][0])
+        # one request per distinct pool, both orientations of a pool share it
+        pools = list(dict.fromkeys(self.pair_index.lookup(a, b) for a, b in self.routes.hop_pairs(routes)))
+
+        reserves, fetch = {}, []
+        for type_x, type_y in pools:
+            symbol_x, symbol_y = self.type2symbol.get(type_x), self.type2symbol.get(type_y)
+            if snapshot is not None and (symbol_x, symbol_y) in snapshot:
+                res = snapshot.get(symbol_x, symbol_y)
+                reserves[(type_x, type_y)] = res
+                reserves[(type_y, type_x)] = (res[1], res[0])
+            else:
+                fetch.append((type_x, type_y))
+        # only the pools the snapshot does not have are read
+        results = await asyncio.gather(*[self.get_pair_reserves(x, y) for x, y in fetch], return_exceptions=True)
+        for (type_x, type_y), res in zip(fetch, results):
+            if isinstance(res, Exception):
+                continue
+            reserves[(type_x, type_y)] = res
+            reserves[(type_y, type_x)] = (res[1], res[0])
+        return self.routes.quote(routes, amount_wei, reserves, function)
+
+    def swap_payload(self, function:str, add_path:list, amount_a:int, amount_b:int):
+        """
+        Router swap entry function, swap_exact_input(amount_in, amount_out_min) or swap_exact_output(amount_out, amount_in_max)
+        the multi hop variant (_doublehop / _triplehop) is selected by the length of add_path
+        """
+        function = swap_function(function, add_path)
+        router_module = self.router_address + "::router"
+        return EntryFunction.natural(
+            router_module,
+            function,
+            [TypeTag(StructTag.from_str(t)) for t in add_path],
+            [
+                TransactionArgument(amount_a, Serializer.u64),
+                TransactionArgument(amount_b, Serializer.u64)
+            ]
+        )
+
     # todo: 
     def swap_exact_out(self, account:Account, path:list=['APT','USDT'], amount_out:int=1000000, amount_in_max:int=None):
+        return run_async(self.swap_out(account, path, amount_out, amount_in_max), timeout=60)
+
+    async def swap_out(self, account:Account, path:list=['APT','USDT'], amount_out:int=1000000, amount_in_max:int=None):
         # remember estimate is not combined with gas fee, so it not accurate for price calculation
         if amount_out < 0:
             raise Exception('Invalid amount_out')
@@ -201,66 +500,41 @@ class PancakeBroker(BaseBroker):
         sell_token, buy_token = path
 
         # Get valid path
-        add_path, est_amounts_outs = self.estimate(path, amount_out, function='getAmountsIn')
+        add_path, est_amounts_outs = await self.estimate_amounts(path, amount_out, function='getAmountsIn')
 
         if amount_in_max is None:
             amount_in_max = int(est_amounts_outs[0] * 1.1)
 
         # Check register
-        run_async(self.token_registered(account, sell_token))
-        run_async(self.token_registered(account, buy_token))
+        await self.token_registered(account, sell_token)
+        await self.token_registered(account, buy_token)
 
         # Init transaction parameters
-        router_module = self.router_address + "::router"
-        payload = EntryFunction.natural(
-            router_module,
-            "swap_exact_output",
-            [
-                TypeTag(StructTag.from_str(add_path[0])),
-                TypeTag(StructTag.from_str(add_path[1])),
-            ],
-            [
-                TransactionArgument(amount_out, Serializer.u64),
-                TransactionArgument(amount_in_max, Serializer.u64)
-            ]
-        )
-
-        txn_hash = run_async(self.send_tx(account, payload))
-        return txn_hash
+        payload = self.swap_payload("swap_exact_output", add_path, amount_out, amount_in_max)
+        return await self.send_tx(account, payload)
 
     def swap_exact_in(self, account:Account, path:list=['APT','USDT'], amount_in:int=1000000, amount_out_min:int=0):
+        return run_async(self.swap_in(account, path, amount_in, amount_out_min), timeout=60)
+
+    async def swap_in(self, account:Account, path:list=['APT','USDT'], amount_in:int=1000000, amount_out_min:int=0):
         # remember estimate is not combined with gas fee, so it not accurate for price calculation
         if amount_in < 0:
             raise Exception('Invalid amount_in')
         sell_token, buy_token = path
 
         # Get valid path
-        add_path, est_amounts_outs = self.estimate(path, amount_in, function='getAmountsOut')
+        add_path, est_amounts_outs = await self.estimate_amounts(path, amount_in, function='getAmountsOut')
 
         if amount_out_min is None:
             amount_out_min = int(est_amounts_outs[-1] * 0.9)
 
         # Check register
-        run_async(self.token_registered(account, sell_token))
-        run_async(self.token_registered(account, buy_token))
+        await self.token_registered(account, sell_token)
+        await self.token_registered(account, buy_token)
 
         # Init transaction parameters
-        router_module = self.router_address + "::router"
-        payload = EntryFunction.natural(
-            router_module,
-            "swap_exact_input",
-            [
-                TypeTag(StructTag.from_str(add_path[0])),
-                TypeTag(StructTag.from_str(add_path[1])),
-            ],
-            [
-                TransactionArgument(amount_in, Serializer.u64),
-                TransactionArgument(amount_out_min, Serializer.u64)
-            ]
-        )
-
-        txn_hash = run_async(self.send_tx(account, payload))
-        return txn_hash
+        payload = self.swap_payload("swap_exact_input", add_path, amount_in, amount_out_min)
+        return await self.send_tx(account, payload)
 
     async def get_receipt(self, txn_hash:str, wait:bool):
         if wait:
@@ -276,13 +550,53 @@ class PancakeBroker(BaseBroker):
     def update_order(self, order:Order, wait_update:bool=False):
         """Get order info by orderId"""
         print(f"Updating order: {order.id}, tx: {order.tx}")
-        receipt = run_async(self.get_receipt(order.tx, wait_update))
+        receipt = self.watcher.seen(order.tx) or run_async(self.get_receipt(order.tx, wait_update))
+        return self.parse_receipt(order, receipt)
+
+    def update_orders(self, orders:list, timeout:float=0) -> list:
+        """Update all orders from one concurrent receipt lookup, waiting up to timeout seconds for pending ones"""
+        return run_async(self.resolve_orders(orders, timeout), timeout=timeout + 30)
+
+    async def resolve_orders(self, orders:list, timeout:float=0) -> list:
+        """Coroutine of update_orders, return the orders whose receipt was found"""
+        orders = [o for o in orders if getattr(o, 'tx', None)]
+        if len(orders) == 0:
+            return []
+        # orders of watched accounts: one incremental poll of each account transactions for all of them,
+        # other orders are looked up by hash
+        by_sender, by_hash = {}, []
+        for o in orders:
+            sender = getattr(o, 'sender', None)
+            if sender is not None and self.watcher.watching(sender):
+                by_sender.setdefault(sender, []).append(o.tx)
+            else:
+                by_hash.append(o.tx)
+        results = await asyncio.gather(
+            self.receipts.resolve(by_hash, timeout=timeout),
+            *[self.watcher.resolve(sender, hashes, timeout=timeout) for sender, hashes in by_sender.items()]
+        )
+        receipts = {}
+        for res in results:
+            receipts.update(res)
+        resolved = []
+        for order in orders:
+            if order.tx in receipts:
+                self.parse_receipt(order, receipts[order.tx])
+                resolved.append(order)
+        print(f"Resolved {len(resolved)}/{len(orders)} orders")
+        return resolved
+
+    def parse_receipt(self, order:Order, receipt:dict):
+        """Fill the order from its transaction receipt, None if the receipt is not ready"""
         gas_used = events = None
 
         if receipt is None: 
             print(f"receipt not ready {order.tx}")
             return None
-        elif getattr(receipt, "success", False) is False:
+        elif receipt.get('type') == 'pending_transaction':
+            print(f"transaction pending {order.tx}")
+            return None
+        elif receipt.get("success", False) is False:
             print(f"Transaction failed for tx: {order.tx}")
             order.status = 'Failed'
             return order
@@ -295,18 +609,10 @@ class PancakeBroker(BaseBroker):
                 return None
 
         try:
-            amount_in = 0
-            amount_out = 0
-            for e in events:
-                if "swap::SwapEvent" in e.get('type', ""):
-                    amount_x_in = int(e['data']['amount_x_in'])
-                    amount_x_out = int(e['data']['amount_x_out'])
-                    amount_y_in = int(e['data']['amount_y_in'])
-                    amount_y_out = int(e['data']['amount_y_out'])
-
-                    amount_in = amount_x_in + amount_y_in
-                    amount_out = amount_x_out + amount_y_out
-                    break
+            # one SwapEvent per hop, input of the first one and output of the last one
+            swaps = swap_events(receipt)
+            amount_in = int(swaps[0]['amount_x_in']) + int(swaps[0]['amount_y_in'])
+            amount_out = int(swaps[-1]['amount_x_out']) + int(swaps[-1]['amount_y_out'])
 
             amount_in_readable = self.from_wei(order.token_in, amount_in)
             amount_out_readable = self.from_wei(order.token_out, amount_out)
@@ -332,6 +638,50 @@ class PancakeBroker(BaseBroker):
             print("receipt: ", receipt)
             return None
 
+    def external_fills(self, bot: TradingBot) -> list:
+        """Orders of the swaps of the bot account made outside the bot since the last check"""
+        return run_async(self.fetch_external_fills(bot))
+
+    async def fetch_external_fills(self, bot: TradingBot) -> list:
+        """Coroutine of external_fills"""
+        address = bot.account.address()
+        await self.watcher.poll(address)
+        orders = []
+        for tx in self.watcher.take_external(address):
+            # the account sequence number moved outside the bot
+            self.sequences.observe(address, int(tx['sequence_number']))
+            order = self.external_order(tx, bot)
+            if order is not None:
+                orders.append(order)
+        if orders:
+            self.invalidate_registrations(address)
+        return orders
+
+    def external_order(self, tx: dict, bot: TradingBot):
+        """Filled Order of a swap transaction, None if a token of the path is not configured"""
+        path = tx.get('payload', {}).get('type_arguments', [])
+        symbols = [self.type2symbol.get(t) for t in path]
+        if len(symbols) < 2 or None in (symbols[0], symbols[-1]):
+            return None
+        if symbols[-1] == bot.currency:
+            side, pair = 'sell', [symbols[-1], symbols[0]]
+        else:
+            side, pair = 'buy', [symbols[0], symbols[-1]]
+        order = Order(
+            id=str(ulid.new()),
+            category=bot.category,
+            pair=pair,
+            side=side,
+            broker=self,
+            tx=tx['hash'],
+            sender=tx.get('sender'),
+            external=True,
+        )
+        # Order init of sync brokers already parsed it from the watcher cache
+        if not order.is_final():
+            self.parse_receipt(order, tx)
+        return order
+
     def place_order(self, order_plan: OrderPlan, bot: TradingBot) -> Order:
         """
         todo: use swapETHForExactTokens and swapExactTokensForETH for bester perform
@@ -359,32 +709,7 @@ class PancakeBroker(BaseBroker):
         # todo:fee = amountin + chain fee
         # print("Placing order: ", order_plan)
         try:
-            tx = None
-            if order_plan.side == 'buy':
-                amount = self.to_wei(order_plan.pair[0], order_plan.qty)
-                path = order_plan.pair
-                # tx = self.swap_exact_out(
-                #     account=bot.account,
-                #     path=path,
-                #     amount_out=amount,
-                #     amount_in_max=None  # order_plan.estimated_amount
-                # )
-                tx = self.swap_exact_in(
-                    account=bot.account,
-                    path=path,
-                    amount_in=amount,
-                    amount_out_min=0  # order_plan.estimated_amount
-                )
-            elif order_plan.side == 'sell':
-                amount = self.to_wei(order_plan.pair[-1], order_plan.qty)
-                path = order_plan.pair[::-1]
-                tx = self.swap_exact_in(
-                    account=bot.account,
-                    path=path,
-                    amount_in=amount,
-                    amount_out_min=0  # order_plan.estimated_amount
-                )
-
+            tx = run_async(self.send_order(order_plan, bot), timeout=60)
             order = Order(
                 id=str(ulid.new()), 
                 category=bot.category,
@@ -392,6 +717,7 @@ class PancakeBroker(BaseBroker):
                 side=order_plan.side,
                 broker=self,
                 tx=tx,
+                sender=str(bot.account.address()),
                 estimated_amount=getattr(order_plan,'estimated_amount', None)
             )
             print(f"Order id: {order.id}, tx: {tx}")
@@ -401,7 +727,92 @@ class PancakeBroker(BaseBroker):
             print("Order failed: ", e)
             # raise ValueError("Order failed")
 
-      
+    async def send_order(self, order_plan: OrderPlan, bot: TradingBot) -> str:
+        """Submit the swap of an order plan, return the tx hash"""
+        tx = None
+        if order_plan.side == 'buy':
+            amount = self.to_wei(order_plan.pair[0], order_plan.qty)
+            path = order_plan.pair
+            # tx = await self.swap_out(
+            #     account=bot.account,
+            #     path=path,
+            #     amount_out=amount,
+            #     amount_in_max=None  # order_plan.estimated_amount
+            # )
+            tx = await self.swap_in(
+                account=bot.account,
+                path=path,
+                amount_in=amount,
+                amount_out_min=0  # order_plan.estimated_amount
+            )
+        elif order_plan.side == 'sell':
+            amount = self.to_wei(order_plan.pair[-1], order_plan.qty)
+            path = order_plan.pair[::-1]
+            tx = await self.swap_in(
+                account=bot.account,
+                path=path,
+                amount_in=amount,
+                amount_out_min=0  # order_plan.estimated_amount
+            )
+        return tx
+
+
+
+
+class AsyncPancakeBroker(PancakeBroker):
+    """
+    Async-first PancakeBroker, place_order, estimate, check_balance and update_order are coroutines
+    so orders of many tokens can be placed and confirmed at the same time.
+    Coroutines run on the broker background loop, use with AsyncTradingBot:
+        run_async(bot.run(), timeout=...)
+    """
+    async def begin_cycle(self, pairs:list=None):
+        if self._held:
+            return self._pinned_version and self._pinned_version[0]
+        return await self.pin_cycle(pairs)
+
+    async def end_cycle(self):
+        PancakeBroker.end_cycle(self)
+
+    async def check_balance(self, bot: 'TradingBot', re_check=True) -> Tuple[float, float]:
+        return await self.fetch_balance(bot)
+
+    async def estimate(self, t_path, amount_in_wei:int, function ='getAmountsIn', snapshot:ReserveSnapshot=None):
+        return await self.estimate_amounts(t_path, amount_in_wei, function, snapshot)
+
+    async def update_order(self, order:Order, wait_update:bool=False):
+        """Get order info by orderId"""
+        print(f"Updating order: {order.id}, tx: {order.tx}")
+        receipt = self.watcher.seen(order.tx) or await self.get_receipt(order.tx, wait_update)
+        return self.parse_receipt(order, receipt)
+
+    async def update_orders(self, orders:list, timeout:float=0) -> list:
+        return await self.resolve_orders(orders, timeout)
+
+    async def external_fills(self, bot: TradingBot) -> list:
+        return await self.fetch_external_fills(bot)
+
+    async def place_order(self, order_plan: OrderPlan, bot: TradingBot) -> Order:
+        """Coroutine of PancakeBroker.place_order"""
+        try:
+            tx = await self.send_order(order_plan, bot)
+            order = Order(
+                id=str(ulid.new()), 
+                category=bot.category,
+                pair=order_plan.pair,
+                side=order_plan.side,
+                broker=self,
+                tx=tx,
+                sender=str(bot.account.address()),
+                estimated_amount=getattr(order_plan,'estimated_amount', None)
+            )
+            print(f"Order id: {order.id}, tx: {tx}")
+            return order
+
+        except Exception as e:
+            print("Order failed: ", e)
+
+
 if __name__ == "__main__":
 
     with open('configs/aptos_chain.yaml', 'r') as file:
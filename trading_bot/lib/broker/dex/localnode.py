@@ -0,0 +1,429 @@
+"""
+In-process stand-in of the Aptos fullnode REST api used by PancakeBroker, backed by PancakeSwap like
+constant product pools, to run and benchmark the broker offline:
+
+    node = LocalNode(router, pools={(type_x, type_y): (reserve_x, reserve_y)}, balances={address: {type: amount}},
+                     latency=0.05, jitter=0.02, block_time=0.5)
+    with node:
+        broker = PancakeBroker([node.url], contract_info=contracts)
+
+Served endpoints: ledger info, accounts/{address}, resources, resource, account transactions, swap events of the
+pairs (PairEventHolder.swap), transaction submit / simulate and transactions/by_hash (so wait_for_transaction too).
+It is a test double, not a chain: signatures are not verified, gas is a flat gas_used charged in APT,
+reads at a ledger_version return the latest state and submitted transactions commit in order after block_time.
+"""
+import asyncio, copy, hashlib, random, threading, time
+from collections import Counter
+
+from aiohttp import web
+from aptos_sdk.account_address import AccountAddress
+from aptos_sdk.bcs import Deserializer
+from aptos_sdk.transactions import SignedTransaction
+from aptos_sdk.type_tag import StructTag
+
+from lib.broker.dex.amm import FEE_BPS, INSUFFICIENT_LIQUIDITY, get_amount_in, get_amount_out
+from lib.broker.dex.pairs import split_type_args
+from lib.broker.dex.tokens import TokenRegistry
+from lib.broker.dex.watcher import transaction_hash
+
+APT = "0x1::aptos_coin::AptosCoin"
+
+
+def canonical_type(type_tag: str) -> str:
+    """Same string for the same move type, whatever the address format (0x1 / 0x0..01)"""
+    return str(StructTag.from_str(type_tag))
+
+
+def canonical_address(address) -> str:
+    return str(AccountAddress.from_str_relaxed(str(address)))
+
+
+class VmAbort(Exception):
+    pass
+
+
+class LocalNode():
+    def __init__(self, router_address: str, pools: dict, balances: dict = None, latency: float = 0.0,
+                 jitter: float = 0.0, block_time: float = 0.0, gas_used: int = 500, fee_bps: int = FEE_BPS,
+                 mempool_window: int = 100, chain_id: int = 1, seed: int = 0, host: str = '127.0.0.1',
+                 port: int = 0) -> None:
+        """
+        - pools: {(type_x, type_y): (reserve_x, reserve_y)} pairs of the router, in on-chain orientation
+        - balances: {address: {coin_type: amount}} coin stores of the accounts, in the smallest unit
+        - latency, jitter: every request is answered after latency + uniform(0, jitter) seconds
+        - block_time: seconds a submitted transaction stays pending
+        - mempool_window: a transaction can be submitted up to mempool_window sequence numbers ahead,
+          it waits for the previous ones like in the real mempool
+        """
+        self.router_address = router_address
+        self.router = canonical_address(router_address)
+        self.latency = latency
+        self.jitter = jitter
+        self.block_time = block_time
+        self.gas_used = gas_used
+        self.fee_bps = fee_bps
+        self.mempool_window = mempool_window
+        self.chain_id = chain_id
+        self.host = host
+        self.port = port
+        self._rng = random.Random(seed)
+
+        self._types = {}  # canonical type -> type string as configured, answers use the configured one
+        self.pools = {}
+        for (type_x, type_y), (reserve_x, reserve_y) in pools.items():
+            self.pools[(self._type(type_x), self._type(type_y))] = [int(reserve_x), int(reserve_y)]
+        self.balances = {}
+        for address, coins in (balances or {}).items():
+            self.balances[canonical_address(address)] = {self._type(t): int(v) for t, v in coins.items()}
+
+        self.version = 1000
+        self.committed = {}      # address -> committed transactions, by sequence number
+        self.transactions = {}   # hash -> committed or pending transaction
+        self.mempool = {}        # address -> {sequence number: (ready_at, hash, signed transaction)}
+        self.swap_events = {}    # (type_x, type_y) -> committed swap events of the pair
+        self.requests = Counter()
+
+        self._loop = None
+        self._thread = None
+        self._runner = None
+
+    def __repr__(self):
+        return f"LocalNode({self.url if self._thread else 'stopped'}, pools={len(self.pools)}, version={self.version})"
+
+    @classmethod
+    def for_tokens(cls, router_address: str, tokens: dict, prices: dict, quote: str = 'USDT',
+                   depth: float = 1_000_000, **kwargs) -> 'LocalNode':
+        """
+        One pool per token against quote, worth depth (in quote) on each side
+        - tokens: contracts.tokens of aptos_chain.yaml
+        - prices: {symbol: price in quote}, tokens without a price get no pool
+        """
+        registry = TokenRegistry(tokens)
+        pools = {}
+        for symbol, price in prices.items():
+            if symbol == quote or symbol not in registry:
+                continue
+            pools[(registry[symbol].type_tag, registry[quote].type_tag)] = (
+                registry.to_wei(symbol, depth / price), registry.to_wei(quote, depth)
+            )
+        return cls(router_address, pools, **kwargs)
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    def _type(self, type_tag: str) -> str:
+        key = canonical_type(type_tag)
+        return self._types.setdefault(key, type_tag)
+
+    def reserves(self, type_x: str, type_y: str):
+        return tuple(self.pools[(self._type(type_x), self._type(type_y))])
+
+    def balance(self, address, coin_type: str) -> int:
+        return self.balances.get(canonical_address(address), {}).get(self._type(coin_type), 0)
+
+    # ---- server ----
+
+    def start(self) -> 'LocalNode':
+        """Serve on a background thread, return when the port is open"""
+        ready = threading.Event()
+
+        def serve():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self._start_server())
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=serve, daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop(self) -> None:
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop = self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    async def _start_server(self):
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_get('/v1', self.handle_info)
+        app.router.add_get('/v1/accounts/{address}', self.handle_account)
+        app.router.add_get('/v1/accounts/{address}/resources', self.handle_resources)
+        app.router.add_get('/v1/accounts/{address}/resource/{type:.+}', self.handle_resource)
+        app.router.add_get('/v1/accounts/{address}/transactions', self.handle_account_transactions)
+        app.router.add_get('/v1/accounts/{address}/events/{handle:.+}/{field}', self.handle_events)
+        app.router.add_post('/v1/transactions', self.handle_submit)
+        app.router.add_post('/v1/transactions/simulate', self.handle_simulate)
+        app.router.add_get('/v1/transactions/by_hash/{hash}', self.handle_by_hash)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        route = request.match_info.route.resource.canonical if request.match_info.route.resource else request.path
+        self.requests[f"{request.method} {route}"] += 1
+        delay = self.latency + self._rng.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._commit_ready()
+        return await handler(request)
+
+    @staticmethod
+    def _error(status: int, error_code: str, message: str):
+        return web.json_response({'message': message, 'error_code': error_code, 'vm_error_code': None}, status=status)
+
+    # ---- reads ----
+
+    async def handle_info(self, request):
+        return web.json_response({
+            'chain_id': self.chain_id,
+            'epoch': '1',
+            'ledger_version': str(self.version),
+            'oldest_ledger_version': '0',
+            'ledger_timestamp': str(int(time.time() * 1e6)),
+            'node_role': 'full_node',
+            'block_height': str(self.version // 2),
+        })
+
+    def _known(self, address: str) -> bool:
+        return address in self.balances or address in self.committed or address == self.router
+
+    async def handle_account(self, request):
+        address = canonical_address(request.match_info['address'])
+        if not self._known(address):
+            return self._error(404, 'account_not_found', f"Account not found: {address}")
+        return web.json_response({'sequence_number': str(len(self.committed.get(address, []))), 'authentication_key': address})
+
+    def _resources(self, address: str) -> list:
+        resources = []
+        if address == self.router:
+            for (type_x, type_y), (reserve_x, reserve_y) in self.pools.items():
+                resources.append({
+                    'type': f"{self.router_address}::swap::TokenPairReserve<{type_x}, {type_y}>",
+                    'data': {'reserve_x': str(reserve_x), 'reserve_y': str(reserve_y), 'block_timestamp_last': '0'},
+                })
+                resources.append({
+                    'type': f"{self.router_address}::swap::PairEventHolder<{type_x}, {type_y}>",
+                    'data': {'swap': {'counter': str(len(self.swap_events.get((type_x, type_y), []))),
+                                      'guid': {'id': {'addr': self.router, 'creation_num': '0'}}}},
+                })
+        if self._known(address):
+            resources.append({
+                'type': '0x1::account::Account',
+                'data': {'sequence_number': str(len(self.committed.get(address, []))), 'authentication_key': address},
+            })
+        for coin_type, value in self.balances.get(address, {}).items():
+            resources.append({
+                'type': f"0x1::coin::CoinStore<{coin_type}>",
+                'data': {'coin': {'value': str(value)}, 'frozen': False},
+            })
+        return resources
+
+    async def handle_resources(self, request):
+        address = canonical_address(request.match_info['address'])
+        if not self._known(address):
+            return self._error(404, 'account_not_found', f"Account not found: {address}")
+        return web.json_response(self._resources(address))
+
+    async def handle_resource(self, request):
+        address = canonical_address(request.match_info['address'])
+        wanted = canonical_type(request.match_info['type'])
+        for res in self._resources(address):
+            if canonical_type(res['type']) == wanted:
+                return web.json_response(res)
+        return self._error(404, 'resource_not_found', f"Resource not found: {request.match_info['type']}")
+
+    async def handle_account_transactions(self, request):
+        address = canonical_address(request.match_info['address'])
+        start = int(request.query.get('start', 0))
+        limit = int(request.query.get('limit', 25))
+        txs = self.committed.get(address, [])[start:start + limit]
+        return web.json_response([self.transactions[h] for h in txs])
+
+    async def handle_events(self, request):
+        address = canonical_address(request.match_info['address'])
+        handle = request.match_info['handle']
+        args = split_type_args(handle)
+        if address != self.router or request.match_info['field'] != 'swap' or 'PairEventHolder' not in handle \
+                or len(args) != 2 or (self._type(args[0]), self._type(args[1])) not in self.pools:
+            return self._error(404, 'resource_not_found', f"Resource not found: {handle}")
+        events = self.swap_events.get((self._type(args[0]), self._type(args[1])), [])
+        start = int(request.query.get('start', max(0, len(events) - 25)))
+        limit = int(request.query.get('limit', 25))
+        return web.json_response(events[start:start + limit])
+
+    async def handle_by_hash(self, request):
+        tx = self.transactions.get(request.match_info['hash'])
+        if tx is None:
+            return self._error(404, 'transaction_not_found', f"Transaction not found: {request.match_info['hash']}")
+        return web.json_response(tx)
+
+    # ---- transactions ----
+
+    async def handle_submit(self, request):
+        body = await request.read()
+        try:
+            signed = SignedTransaction.deserialize(Deserializer(body))
+        except Exception as e:
+            return self._error(400, 'invalid_input', f"Invalid transaction: {e}")
+        raw = signed.transaction
+        sender = canonical_address(raw.sender)
+        committed = len(self.committed.get(sender, []))
+        pool = self.mempool.setdefault(sender, {})
+        if raw.sequence_number < committed or raw.sequence_number in pool:
+            return self._error(400, 'vm_error', "Invalid transaction: Type: Validation Code: SEQUENCE_NUMBER_TOO_OLD")
+        if raw.sequence_number >= committed + self.mempool_window:
+            return self._error(400, 'vm_error', "Invalid transaction: Type: Validation Code: SEQUENCE_NUMBER_TOO_NEW")
+        if raw.chain_id != self.chain_id:
+            return self._error(400, 'vm_error', "Invalid transaction: Type: Validation Code: BAD_CHAIN_ID")
+
+        tx_hash = transaction_hash(signed)
+        pending = self._describe(raw, tx_hash)
+        pending['type'] = 'pending_transaction'
+        self.transactions[tx_hash] = pending
+        pool[raw.sequence_number] = (time.time() + self.block_time, tx_hash, signed)
+        return web.json_response(pending, status=202)
+
+    async def handle_simulate(self, request):
+        body = await request.read()
+        signed = SignedTransaction.deserialize(Deserializer(body))
+        state = copy.deepcopy((self.pools, self.balances, self.version))
+        try:
+            tx = self._execute(signed.transaction, "0x" + hashlib.sha3_256(body).hexdigest())
+        finally:
+            self.pools, self.balances, self.version = state
+        return web.json_response([tx])
+
+    def _commit_ready(self) -> None:
+        # transactions of an account commit in sequence number order, a gap holds the next ones
+        now = time.time()
+        for sender, pool in self.mempool.items():
+            committed = self.committed.setdefault(sender, [])
+            while len(committed) in pool and pool[len(committed)][0] <= now:
+                _, tx_hash, signed = pool.pop(len(committed))
+                tx = self._execute(signed.transaction, tx_hash)
+                self.transactions[tx_hash] = tx
+                committed.append(tx_hash)
+                for event in tx['events']:
+                    type_x, type_y = split_type_args(event['type'])
+                    events = self.swap_events.setdefault((type_x, type_y), [])
+                    events.append({'version': tx['version'], 'guid': {'creation_number': '0', 'account_address': self.router},
+                                   'sequence_number': str(len(events)), 'type': event['type'], 'data': event['data']})
+
+    def _describe(self, raw, tx_hash: str) -> dict:
+        payload = raw.payload.value
+        return {
+            'hash': tx_hash,
+            'sender': canonical_address(raw.sender),
+            'sequence_number': str(raw.sequence_number),
+            'max_gas_amount': str(raw.max_gas_amount),
+            'gas_unit_price': str(raw.gas_unit_price),
+            'expiration_timestamp_secs': str(raw.expiration_timestamps_secs),
+            'payload': {
+                'type': 'entry_function_payload',
+                'function': f"{payload.module}::{payload.function}",
+                'type_arguments': [self._type(str(t)) for t in payload.ty_args],
+                'arguments': [str(Deserializer(a).u64()) if len(a) == 8 else a.hex() for a in payload.args],
+            },
+        }
+
+    def _execute(self, raw, tx_hash: str) -> dict:
+        """Run the entry function of a transaction, state is only changed if it succeeds (but gas)"""
+        tx = self._describe(raw, tx_hash)
+        sender = tx['sender']
+        payload = raw.payload.value
+        self.version += 1
+        tx.update({'type': 'user_transaction', 'version': str(self.version), 'timestamp': str(int(time.time() * 1e6)),
+                   'gas_used': str(self.gas_used), 'events': [], 'changes': []})
+        state = copy.deepcopy((self.pools, self.balances))
+        try:
+            module = f"{canonical_address(payload.module.address)}::{payload.module.name}"
+            types = tx['payload']['type_arguments']
+            if payload.function == 'register' and module in ('0x1::managed_coin', '0x1::coin'):
+                self.balances.setdefault(sender, {}).setdefault(types[0], 0)
+            elif module == f"{self.router}::router" and payload.function.startswith('swap_exact_'):
+                args = [Deserializer(a).u64() for a in payload.args]
+                tx['events'] = self._swap(sender, payload.function, types, args[0], args[1])
+            else:
+                raise VmAbort(f"FUNCTION_RESOLUTION_FAILURE {module}::{payload.function}")
+            tx.update({'success': True, 'vm_status': 'Executed successfully'})
+        except VmAbort as e:
+            self.pools, self.balances = state
+            tx.update({'success': False, 'vm_status': f"Move abort: {e}", 'events': []})
+
+        # gas is charged whatever the result
+        coins = self.balances.setdefault(sender, {})
+        apt = self._type(APT)
+        if apt in coins:
+            coins[apt] = max(0, coins[apt] - self.gas_used * raw.gas_unit_price)
+        return tx
+
+    def _pool(self, type_a: str, type_b: str):
+        """(reserves list, a is x) of the pool of a and b"""
+        if (type_a, type_b) in self.pools:
+            return self.pools[(type_a, type_b)], True
+        if (type_b, type_a) in self.pools:
+            return self.pools[(type_b, type_a)], False
+        raise VmAbort(f"PAIR_NOT_CREATED {type_a} {type_b}")
+
+    def _swap(self, sender: str, function: str, path: list, amount_a: int, amount_b: int) -> list:
+        hops = [self._pool(a, b) for a, b in zip(path, path[1:])]
+        oriented = [(r[0], r[1]) if a_is_x else (r[1], r[0]) for r, a_is_x in hops]
+        if function.startswith('swap_exact_input'):
+            amounts = [amount_a]
+            for reserve_in, reserve_out in oriented:
+                amounts.append(get_amount_out(amounts[-1], reserve_in, reserve_out, self.fee_bps))
+            if amounts[-1] < amount_b:
+                raise VmAbort("E_OUTPUT_LESS_THAN_MIN")
+        else:
+            amounts = [amount_a]
+            for reserve_in, reserve_out in reversed(oriented):
+                amount_in = get_amount_in(amounts[0], reserve_in, reserve_out, self.fee_bps)
+                if amount_in == INSUFFICIENT_LIQUIDITY:
+                    raise VmAbort("E_INSUFFICIENT_LIQUIDITY")
+                amounts.insert(0, amount_in)
+            if amounts[0] > amount_b:
+                raise VmAbort("E_INPUT_MORE_THAN_MAX")
+        if 0 in amounts:
+            raise VmAbort("E_INSUFFICIENT_AMOUNT")
+
+        coins = self.balances.setdefault(sender, {})
+        if coins.get(path[0], 0) < amounts[0]:
+            raise VmAbort("EINSUFFICIENT_BALANCE")
+        coins[path[0]] -= amounts[0]
+        # the router registers the output coin store
+        coins[path[-1]] = coins.get(path[-1], 0) + amounts[-1]
+
+        events = []
+        for (a, b), (reserves, a_is_x), amount_in, amount_out in zip(zip(path, path[1:]), hops, amounts, amounts[1:]):
+            type_x, type_y = (a, b) if a_is_x else (b, a)
+            if a_is_x:
+                reserves[0] += amount_in
+                reserves[1] -= amount_out
+            else:
+                reserves[1] += amount_in
+                reserves[0] -= amount_out
+            events.append({
+                'type': f"{self.router_address}::swap::SwapEvent<{type_x}, {type_y}>",
+                'data': {
+                    'user': sender,
+                    'amount_x_in': str(amount_in if a_is_x else 0),
+                    'amount_y_in': str(0 if a_is_x else amount_in),
+                    'amount_x_out': str(0 if a_is_x else amount_out),
+                    'amount_y_out': str(amount_out if a_is_x else 0),
+                },
+            })
+        return events
@@ -0,0 +1,106 @@
+import time
+from typing import Optional, Tuple
+
+
+def split_type_args(type_str: str) -> list:
+    """
+    Split generic arguments of a move type at top level
+    ex: '0x1::a::B<0x1::c::D, 0x1::e::F<0x1::g::H>>' -> ['0x1::c::D', '0x1::e::F<0x1::g::H>']
+    """
+    if '<' not in type_str:
+        return []
+    inner = type_str[type_str.index('<') + 1:type_str.rindex('>')]
+    args, depth, start = [], 0, 0
+    for i, c in enumerate(inner):
+        if c == '<':
+            depth += 1
+        elif c == '>':
+            depth -= 1
+        elif c == ',' and depth == 0:
+            args.append(inner[start:i].strip())
+            start = i + 1
+    args.append(inner[start:].strip())
+    return args
+
+
+class PairIndex():
+    def __init__(self, router_address: str, min_refresh_interval: float = 60.0) -> None:
+        """
+        Canonical orientation of every PancakeSwap pair, built from the router pair resources
+        - min_refresh_interval: a lookup miss reloads the index at most once per interval (seconds)
+        """
+        self.router_address = router_address
+        self.resource_prefix = f"{router_address}::swap::TokenPairReserve<"
+        self.min_refresh_interval = min_refresh_interval
+        self._pairs = {}  # (type_a, type_b) -> (type_x, type_y) as stored on chain, both orientations
+        self._neighbors = {}  # type -> set of types it has a pair with
+        self._probed = set()  # (type_x, type_y) added by probing, kept over reloads
+        self.loaded_at = None
+        self.attempted_at = None  # last (re)load attempt, successful or not
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._pairs) // 2
+
+    def __repr__(self):
+        return f"PairIndex(pairs={len(self)}, hits={self.hits}, misses={self.misses})"
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    def can_refresh(self) -> bool:
+        return self.attempted_at is None or time.time() - self.attempted_at >= self.min_refresh_interval
+
+    def load(self, resources: list) -> None:
+        """Build the index from the router account resources, pairs added by probing are kept"""
+        self.attempted_at = time.time()
+        pairs, neighbors = {}, {}
+        for res in resources:
+            if not res.get('type', '').startswith(self.resource_prefix):
+                continue
+            args = split_type_args(res['type'])
+            if len(args) != 2:
+                continue
+            type_x, type_y = args
+            pairs[(type_x, type_y)] = (type_x, type_y)
+            pairs[(type_y, type_x)] = (type_x, type_y)
+            neighbors.setdefault(type_x, set()).add(type_y)
+            neighbors.setdefault(type_y, set()).add(type_x)
+        self._pairs = pairs
+        self._neighbors = neighbors
+        for type_x, type_y in self._probed:
+            self._record(type_x, type_y)
+        self.loaded_at = self.attempted_at
+
+    def add(self, type_x: str, type_y: str) -> None:
+        """Record a pair found outside the loaded resources (probed), (type_x, type_y) as stored on chain"""
+        self._probed.add((type_x, type_y))
+        self._record(type_x, type_y)
+
+    def _record(self, type_x: str, type_y: str) -> None:
+        self._pairs[(type_x, type_y)] = (type_x, type_y)
+        self._pairs[(type_y, type_x)] = (type_x, type_y)
+        self._neighbors.setdefault(type_x, set()).add(type_y)
+        self._neighbors.setdefault(type_y, set()).add(type_x)
+
+    def lookup(self, type_a: str, type_b: str) -> Optional[Tuple[str, str]]:
+        """Return (type_x, type_y) as stored on chain, None if the pair is unknown"""
+        orientation = self._pairs.get((type_a, type_b))
+        if orientation is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return orientation
+
+    def neighbors(self, type_tag: str) -> set:
+        """Types that have a pair with type_tag"""
+        return self._neighbors.get(type_tag, set())
+
+    def pairs(self) -> list:
+        """Canonical (type_x, type_y) of every indexed pair"""
+        return list(set(self._pairs.values()))
+
+    def stats(self) -> dict:
+        return {'pairs': len(self), 'hits': self.hits, 'misses': self.misses, 'loaded_at': self.loaded_at}
@@ -0,0 +1,54 @@
+import asyncio, time
+
+
+class ReceiptResolver():
+    def __init__(self, gateway, initial_delay: float = 0.25, max_delay: float = 2.0, backoff: float = 1.5) -> None:
+        """
+        Fetch the receipts of many transactions together, polling with adaptive backoff:
+        the delay grows while nothing is committed and goes back to initial_delay on progress
+        - gateway: RestClient like client
+        """
+        self.gateway = gateway
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.requests = 0
+        self.rounds = 0
+
+    def __repr__(self):
+        return f"ReceiptResolver(requests={self.requests}, rounds={self.rounds})"
+
+    async def fetch(self, tx_hash: str):
+        """Committed receipt of a transaction, None while it is pending or unknown"""
+        self.requests += 1
+        try:
+            receipt = await self.gateway.transaction_by_hash(tx_hash)
+        except Exception:
+            # 404 until the node sees the transaction
+            return None
+        if receipt is None or receipt.get('type') == 'pending_transaction':
+            return None
+        return receipt
+
+    async def resolve(self, tx_hashes: list, timeout: float = 0) -> dict:
+        """
+        Return {tx_hash: receipt} of the committed transactions
+        - timeout: keep polling the pending ones up to timeout seconds, 0 for a single pass
+        """
+        pending = list(dict.fromkeys(h for h in tx_hashes if h))
+        receipts = {}
+        deadline = time.time() + timeout
+        delay = self.initial_delay
+        while pending:
+            self.rounds += 1
+            results = await asyncio.gather(*[self.fetch(h) for h in pending])
+            committed = {h: r for h, r in zip(pending, results) if r is not None}
+            receipts.update(committed)
+            pending = [h for h in pending if h not in committed]
+
+            remaining = deadline - time.time()
+            if not pending or remaining <= 0:
+                break
+            delay = self.initial_delay if committed else min(delay * self.backoff, self.max_delay)
+            await asyncio.sleep(min(delay, remaining))
+        return receipts
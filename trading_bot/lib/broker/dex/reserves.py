@@ -0,0 +1,114 @@
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from lib.broker.dex.amm import FEE_BPS, amounts_in, amounts_out, get_amount_in, get_amount_out, slippage_curve
+
+
+class ReserveCache():
+    def __init__(self, max_age: float = 5.0, max_size: int = 256) -> None:
+        """
+        LRU cache of pair reserves keyed by pair resource and ledger version.
+        - max_age: max staleness in seconds of an entry read outside a pinned cycle
+        - max_size: max number of pairs kept, least recently used pairs are evicted first
+        """
+        self.max_age = max_age
+        self.max_size = max_size
+        self._entries = OrderedDict()  # key -> (reserves, ledger_version, fetched_at)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return f"ReserveCache(size={len(self._entries)}/{self.max_size}, hits={self.hits}, misses={self.misses})"
+
+    def get(self, key: tuple, ledger_version: Optional[int] = None) -> Optional[Tuple[int, int]]:
+        """
+        Get reserves of a pair
+        - ledger_version: if set only an entry read at that version is valid,
+          otherwise any entry younger than max_age is valid
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            reserves, version, fetched_at = entry
+            if ledger_version is not None:
+                valid = version == ledger_version
+            else:
+                valid = time.time() - fetched_at <= self.max_age
+            if valid:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return reserves
+        self.misses += 1
+        return None
+
+    def put(self, key: tuple, reserves: Tuple[int, int], ledger_version: Optional[int] = None) -> None:
+        self._entries[key] = (reserves, ledger_version, time.time())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: tuple = None) -> None:
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+
+class ReserveSnapshot():
+    def __init__(self, reserves: dict, ledger_version: Optional[int] = None, errors: dict = None) -> None:
+        """
+        Reserves of many pairs read at one ledger version
+        - reserves: {(token_in, token_out): (reserve_in, reserve_out)} by token symbol
+        - errors: {(token_in, token_out): exception} for pairs that could not be fetched
+        """
+        self.ledger_version = ledger_version
+        self.created_at = time.time()
+        self.errors = errors or {}
+        self._reserves = {}
+        for (token_in, token_out), (reserve_in, reserve_out) in reserves.items():
+            self._reserves[(token_in, token_out)] = (reserve_in, reserve_out)
+            self._reserves[(token_out, token_in)] = (reserve_out, reserve_in)
+
+    def __contains__(self, pair) -> bool:
+        return tuple(pair) in self._reserves
+
+    def __repr__(self):
+        return f"ReserveSnapshot(version={self.ledger_version}, pairs={len(self._reserves) // 2}, errors={len(self.errors)})"
+
+    def pairs(self) -> list:
+        return list(self._reserves.keys())
+
+    def get(self, token_in: str, token_out: str) -> Tuple[int, int]:
+        """Return (reserve_in, reserve_out), raise KeyError if pair is not in snapshot"""
+        return self._reserves[(token_in, token_out)]
+
+    def amount_out(self, amount_in: int, token_in: str, token_out: str, fee_bps: int = FEE_BPS) -> int:
+        reserve_in, reserve_out = self.get(token_in, token_out)
+        return get_amount_out(amount_in, reserve_in, reserve_out, fee_bps)
+
+    def amount_in(self, amount_out: int, token_in: str, token_out: str, fee_bps: int = FEE_BPS) -> int:
+        reserve_in, reserve_out = self.get(token_in, token_out)
+        return get_amount_in(amount_out, reserve_in, reserve_out, fee_bps)
+
+    def amounts_out(self, sizes, token_in: str, token_out: str, fee_bps: int = FEE_BPS):
+        """Exact amounts out of a whole ladder of input sizes (numpy array)"""
+        reserve_in, reserve_out = self.get(token_in, token_out)
+        return amounts_out(sizes, reserve_in, reserve_out, fee_bps)
+
+    def amounts_in(self, sizes, token_in: str, token_out: str, fee_bps: int = FEE_BPS):
+        """Exact amounts in of a whole ladder of output sizes, INSUFFICIENT_LIQUIDITY past the reserve"""
+        reserve_in, reserve_out = self.get(token_in, token_out)
+        return amounts_in(sizes, reserve_in, reserve_out, fee_bps)
+
+    def slippage(self, sizes, token_in: str, token_out: str, fee_bps: int = FEE_BPS) -> tuple:
+        """(amounts_out, price_impact) of a ladder of input sizes"""
+        reserve_in, reserve_out = self.get(token_in, token_out)
+        return slippage_curve(sizes, reserve_in, reserve_out, fee_bps)
+
+    def price(self, token_in: str, token_out: str) -> float:
+        """Spot price of token_out in wei of token_in, without fee and price impact"""
+        reserve_in, reserve_out = self.get(token_in, token_out)
+        return reserve_in / reserve_out if reserve_out else 0.0
@@ -0,0 +1,120 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+from lib.broker.dex.amm import FEE_BPS, INSUFFICIENT_LIQUIDITY, amounts_in, amounts_out
+from lib.broker.dex.pairs import PairIndex
+
+# router entry functions by number of tokens in the path
+SWAP_FUNCTIONS = {
+    'swap_exact_input': {2: 'swap_exact_input', 3: 'swap_exact_input_doublehop', 4: 'swap_exact_input_triplehop'},
+    'swap_exact_output': {2: 'swap_exact_output', 3: 'swap_exact_output_doublehop', 4: 'swap_exact_output_triplehop'},
+}
+MAX_HOPS = 3
+
+
+def swap_function(function: str, path: list) -> str:
+    """Router entry function of a swap over path, ex: swap_exact_input over 3 tokens -> swap_exact_input_doublehop"""
+    try:
+        return SWAP_FUNCTIONS[function][len(path)]
+    except KeyError:
+        raise ValueError(f"No router function {function} for a path of {len(path)} tokens, max {MAX_HOPS} hops")
+
+
+class RouteFinder():
+    def __init__(self, pair_index: PairIndex, max_hops: int = MAX_HOPS, hubs: list = None) -> None:
+        """
+        Candidate swap paths over the router pair graph, quoted together from reserves
+        - max_hops: max number of pairs in a path, the router supports up to 3
+        - hubs: type tags allowed as intermediate tokens, None for any token of the graph
+        """
+        if not 1 <= max_hops <= MAX_HOPS:
+            raise ValueError(f"max_hops should be between 1 and {MAX_HOPS}")
+        self.pair_index = pair_index
+        self.max_hops = max_hops
+        self.hubs = set(hubs) if hubs is not None else None
+        self._routes = {}  # (type_in, type_out, max_hops) -> [path], valid for one index load
+        self._index_version = None
+
+    def __repr__(self):
+        return f"RouteFinder(max_hops={self.max_hops}, cached={len(self._routes)})"
+
+    def routes(self, type_in: str, type_out: str, max_hops: int = None) -> list:
+        """All simple paths [type_in, ..., type_out] of up to max_hops pairs, shortest first"""
+        max_hops = min(max_hops or self.max_hops, self.max_hops)
+        if self._index_version != self.pair_index.loaded_at:
+            # index reloaded, new pairs may give new paths
+            self._routes = {}
+            self._index_version = self.pair_index.loaded_at
+        key = (type_in, type_out, max_hops)
+        if key not in self._routes:
+            self._routes[key] = self._search(type_in, type_out, max_hops)
+        return self._routes[key]
+
+    def _search(self, type_in: str, type_out: str, max_hops: int) -> list:
+        found = []
+        stack = [(type_in,)]
+        while stack:
+            path = stack.pop()
+            for nxt in self.pair_index.neighbors(path[-1]):
+                if nxt == type_out:
+                    found.append(path + (nxt,))
+                elif len(path) < max_hops and nxt not in path and (self.hubs is None or nxt in self.hubs):
+                    stack.append(path + (nxt,))
+        return sorted(found, key=len)
+
+    @staticmethod
+    def hop_pairs(routes: list) -> list:
+        """Distinct (type_a, type_b) hops of the routes, to fetch their reserves"""
+        return list(dict.fromkeys((a, b) for path in routes for a, b in zip(path, path[1:])))
+
+    def quote(self, routes: list, amount: int, reserves: dict, function: str = 'getAmountsOut',
+              fee_bps: int = FEE_BPS) -> Tuple[Optional[tuple], list]:
+        """
+        Best route for amount, all routes are quoted together with the vectorized AMM math, one call per hop
+        - reserves: {(type_a, type_b): (reserve_a, reserve_b)}, routes with a missing hop are skipped
+        - function: getAmountsOut (amount in, max output) or getAmountsIn (amount out, min input)
+        return (path, amounts of every token of the path), (None, []) if no route can fill amount
+        """
+        candidates = []
+        for path in routes:
+            hops = [reserves.get(hop) for hop in zip(path, path[1:])]
+            if all(r is not None for r in hops):
+                candidates.append((path, hops))
+        if not candidates:
+            return None, []
+
+        n, depth = len(candidates), max(len(hops) for _, hops in candidates)
+        backward = function == 'getAmountsIn'
+        # routes aligned on their first hop (getAmountsOut) or last hop (getAmountsIn), absent hops are masked
+        columns = []
+        for h in range(depth):
+            r_in, r_out, active = [], [], []
+            for _, hops in candidates:
+                i = h - (depth - len(hops)) if backward else h
+                ok = 0 <= i < len(hops)
+                r = hops[i] if ok else (1, 1)
+                r_in.append(r[0])
+                r_out.append(r[1])
+                active.append(ok)
+            columns.append((r_in, r_out, np.array(active)))
+
+        current = np.full(n, int(amount), dtype=object if amount > np.iinfo(np.int64).max else np.int64)
+        steps = [current]  # amount of every route before / after each hop
+        if backward:
+            for r_in, r_out, active in reversed(columns):
+                res = amounts_in(current, r_in, r_out, fee_bps)
+                current = np.where(active, np.where(current < 0, INSUFFICIENT_LIQUIDITY, res), current)
+                steps.insert(0, current)
+            valid = current != INSUFFICIENT_LIQUIDITY
+            if not valid.any():
+                return None, []
+            best = int(np.argmin(np.where(valid, current, current.max() + 1)))
+            amounts = [int(steps[h][best]) for h in range(depth) if columns[h][2][best]] + [int(amount)]
+        else:
+            for r_in, r_out, active in columns:
+                current = np.where(active, amounts_out(current, r_in, r_out, fee_bps), current)
+                steps.append(current)
+            best = int(np.argmax(current))
+            amounts = [int(amount)] + [int(steps[h + 1][best]) for h in range(depth) if columns[h][2][best]]
+        return candidates[best][0], amounts
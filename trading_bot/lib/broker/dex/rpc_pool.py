@@ -0,0 +1,218 @@
+import asyncio, time
+from collections import deque
+from functools import partial
+
+from aptos_sdk.async_client import AccountNotFound, ApiError, ClientConfig, ResourceNotFound, RestClient
+
+# idempotent reads, a slow one is duplicated on the next endpoint
+HEDGED_METHODS = {
+    'info', 'account', 'account_balance', 'account_sequence_number', 'account_resource', 'account_resources',
+    'transaction_by_hash', 'transaction_by_version', 'transaction_pending', 'transactions_by_account',
+    'transactions', 'events_by_event_handle', 'get_table_item', 'view',
+}
+
+
+def is_answer(e: Exception) -> bool:
+    """Errors that are a valid answer of a healthy node (not found, bad request, failed transaction...)"""
+    if isinstance(e, (ResourceNotFound, AccountNotFound, AssertionError)):
+        return True
+    return isinstance(e, ApiError) and getattr(e, 'status_code', 500) < 500 and e.status_code != 429
+
+
+class Endpoint():
+    def __init__(self, url: str, client_config: ClientConfig = None, window: int = 200) -> None:
+        self.url = url
+        self.client = RestClient(url, client_config or ClientConfig())
+        self.samples = deque(maxlen=window)  # latency of successful requests (seconds)
+        self.ewma_latency = None
+        self.error_rate = 0.0                # ewma of failures
+        self.consecutive_errors = 0
+        self.last_error_at = None
+        self.ledger_version = None           # highest ledger version the node reported (info)
+        self.requests = 0
+        self.errors = 0
+
+    def __repr__(self):
+        return f"Endpoint({self.url}, latency={self.ewma_latency}, error_rate={self.error_rate:.2f})"
+
+    def record(self, latency: float, ok: bool, alpha: float = 0.2) -> None:
+        self.requests += 1
+        self.error_rate = (1 - alpha) * self.error_rate + alpha * (0.0 if ok else 1.0)
+        if ok:
+            self.consecutive_errors = 0
+            self.samples.append(latency)
+            self.ewma_latency = latency if self.ewma_latency is None else (1 - alpha) * self.ewma_latency + alpha * latency
+        else:
+            self.errors += 1
+            self.consecutive_errors += 1
+            self.last_error_at = time.time()
+
+    def reached(self, version: int) -> bool:
+        """The node is known to have the state of the ledger version"""
+        return self.ledger_version is not None and self.ledger_version >= version
+
+    def healthy(self, max_errors: int = 3, cooldown: float = 30.0) -> bool:
+        if self.consecutive_errors < max_errors:
+            return True
+        # retry a failing node once its cooldown is over
+        return time.time() - self.last_error_at > cooldown
+
+    def percentile(self, q: float):
+        if len(self.samples) == 0:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def stats(self) -> dict:
+        return {
+            'url': self.url,
+            'requests': self.requests,
+            'errors': self.errors,
+            'error_rate': round(self.error_rate, 4),
+            'ledger_version': self.ledger_version,
+            'latency_ewma': self.ewma_latency,
+            'latency_p50': self.percentile(0.5),
+            'latency_p95': self.percentile(0.95),
+        }
+
+
+class RpcPool():
+    def __init__(self, rpcs: list, client_config: ClientConfig = None, hedge_quantile: float = 0.95,
+                 min_hedge_delay: float = 0.05, max_hedge_delay: float = 2.0, default_hedge_delay: float = 0.5,
+                 min_samples: int = 20, max_errors: int = 3, error_cooldown: float = 30.0) -> None:
+        """
+        Pool of RestClient over all configured rpcs, used as a drop-in for one RestClient.
+        - reads go to the fastest healthy node, a read slower than the node latency at hedge_quantile
+          is sent again to the next node and the first answer wins
+        - other calls (transaction build / submit / wait) go to the fastest healthy node and
+          fail over to the next node on network or server errors
+        """
+        if not rpcs:
+            raise ValueError("At least one rpc is required")
+        self.endpoints = [Endpoint(url, client_config) for url in rpcs]
+        self.hedge_quantile = hedge_quantile
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedge_delay = max_hedge_delay
+        self.default_hedge_delay = default_hedge_delay
+        self.min_samples = min_samples
+        self.max_errors = max_errors
+        self.error_cooldown = error_cooldown
+        self.hedges = 0      # hedged duplicates sent
+        self.hedge_wins = 0  # answers won by the hedged duplicate
+
+    def __repr__(self):
+        return f"RpcPool({[e.url for e in self.endpoints]}, hedges={self.hedges}, hedge_wins={self.hedge_wins})"
+
+    def __getattr__(self, name):
+        # proxy RestClient methods
+        if name.startswith('_') or not hasattr(RestClient, name):
+            raise AttributeError(name)
+        if name in HEDGED_METHODS:
+            return partial(self.call, name)
+        return partial(self.call_primary, name)
+
+    @property
+    def base_url(self):
+        return self.ranked()[0].url
+
+    def ranked(self) -> list:
+        """Healthy endpoints first, then by latency, unknown latency first so every node gets measured"""
+        return sorted(
+            self.endpoints,
+            key=lambda e: (not e.healthy(self.max_errors, self.error_cooldown), e.ewma_latency or 0.0, e.error_rate)
+        )
+
+    def candidates(self, kwargs: dict) -> list:
+        """
+        Ranked endpoints for a call, a read pinned at a ledger_version only goes to the nodes that reported it:
+        a lagging node answers it with a 4xx, a valid answer that would fail the read
+        """
+        endpoints = self.ranked()
+        version = kwargs.get('ledger_version')
+        if version is None:
+            return endpoints
+        return [e for e in endpoints if e.reached(int(version))] or endpoints
+
+    def hedge_delay(self, endpoint: Endpoint) -> float:
+        if len(endpoint.samples) < self.min_samples:
+            return self.default_hedge_delay
+        delay = endpoint.percentile(self.hedge_quantile)
+        return min(self.max_hedge_delay, max(self.min_hedge_delay, delay))
+
+    async def _timed(self, endpoint: Endpoint, method: str, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = await getattr(endpoint.client, method)(*args, **kwargs)
+        except asyncio.CancelledError:
+            # lost against a hedged request, it took at least this long
+            endpoint.record(time.perf_counter() - start, True)
+            raise
+        except Exception as e:
+            endpoint.record(time.perf_counter() - start, is_answer(e))
+            raise
+        endpoint.record(time.perf_counter() - start, True)
+        if method == 'info':
+            endpoint.ledger_version = max(endpoint.ledger_version or 0, int(result['ledger_version']))
+        return result
+
+    async def call(self, method: str, *args, **kwargs):
+        """Hedged read"""
+        endpoints = self.candidates(kwargs)
+        tasks = {}
+        last_error = None
+
+        def start(i):
+            task = asyncio.ensure_future(self._timed(endpoints[i], method, *args, **kwargs))
+            tasks[task] = i
+
+        start(0)
+        next_i = 1
+        try:
+            while tasks:
+                timeout = self.hedge_delay(endpoints[0]) if next_i < len(endpoints) else None
+                done, _ = await asyncio.wait(tasks.keys(), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # slower than usual, hedge on the next node
+                    self.hedges += 1
+                    start(next_i)
+                    next_i += 1
+                    continue
+                for task in done:
+                    i = tasks.pop(task)
+                    e = task.exception()
+                    if e is None or is_answer(e):
+                        if i > 0:
+                            self.hedge_wins += 1
+                        return task.result()
+                    last_error = e
+                # failed, try the next node right away
+                if not tasks and next_i < len(endpoints):
+                    start(next_i)
+                    next_i += 1
+        finally:
+            for task in tasks:
+                task.cancel()
+        raise last_error
+
+    async def call_primary(self, method: str, *args, **kwargs):
+        """Call on the best node, fail over to the next on network or server errors"""
+        last_error = None
+        for endpoint in self.candidates(kwargs):
+            try:
+                return await self._timed(endpoint, method, *args, **kwargs)
+            except Exception as e:
+                if is_answer(e):
+                    raise
+                last_error = e
+                print(f"RPC {endpoint.url} failed on {method}: {e}")
+        raise last_error
+
+    def stats(self) -> dict:
+        return {
+            'endpoints': [e.stats() for e in self.ranked()],
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+        }
+
+    async def close(self):
+        await asyncio.gather(*[e.client.close() for e in self.endpoints], return_exceptions=True)
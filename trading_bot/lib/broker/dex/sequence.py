@@ -0,0 +1,54 @@
+import asyncio
+
+
+def is_sequence_error(e: Exception) -> bool:
+    """Submit rejected because of the sequence number (too old / too new / already used)"""
+    return 'SEQUENCE_NUMBER' in str(e).upper()
+
+
+class SequenceManager():
+    def __init__(self, gateway) -> None:
+        """
+        Per-account sequence numbers reserved locally, so transactions of one account
+        can be pipelined without asking the node for the sequence number of each one
+        - gateway: RestClient like client, used to (re)sync from chain
+        """
+        self.gateway = gateway
+        self._next = {}   # address -> next sequence number to use
+        self._locks = {}  # address -> asyncio.Lock
+        self.resyncs = 0
+
+    def __repr__(self):
+        return f"SequenceManager({self._next}, resyncs={self.resyncs})"
+
+    def _lock(self, address: str) -> asyncio.Lock:
+        if address not in self._locks:
+            self._locks[address] = asyncio.Lock()
+        return self._locks[address]
+
+    async def reserve(self, address) -> int:
+        """Reserve the next sequence number of the account, synced from chain on first use"""
+        address = str(address)
+        async with self._lock(address):
+            if address not in self._next:
+                self._next[address] = await self.gateway.account_sequence_number(address)
+            seq = self._next[address]
+            self._next[address] = seq + 1
+            return seq
+
+    async def resync(self, address) -> int:
+        """Reload the sequence number from chain, after a rejected submit"""
+        address = str(address)
+        async with self._lock(address):
+            self._next[address] = await self.gateway.account_sequence_number(address)
+            self.resyncs += 1
+            return self._next[address]
+
+    def observe(self, address, sequence_number: int) -> None:
+        """A transaction of the account was committed with sequence_number (maybe sent outside the bot)"""
+        address = str(address)
+        if address in self._next and self._next[address] <= sequence_number:
+            self._next[address] = sequence_number + 1
+
+    def peek(self, address):
+        return self._next.get(str(address))
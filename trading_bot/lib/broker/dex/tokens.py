@@ -0,0 +1,74 @@
+import json
+from decimal import Decimal
+from numbers import Integral
+from typing import NamedTuple
+
+
+class TokenInfo(NamedTuple):
+    symbol: str
+    type_tag: str   # move type, like '0x1::aptos_coin::AptosCoin'
+    decimals: int
+    scale: int      # 10**decimals
+    name: str = ''
+
+
+class TokenRegistry():
+    def __init__(self, tokens: dict) -> None:
+        """
+        Token metadata parsed once from the contract config
+        - tokens: {symbol: [type_tag, coin_info_json]} like contracts.tokens in aptos_chain.yaml,
+          entries that are not coins (router / factory addresses) are skipped
+        raise ValueError if a coin has no decimals in its CoinInfo
+        """
+        self._by_symbol = {}
+        self._by_type = {}
+        for symbol, info in tokens.items():
+            if not info or '::' not in str(info[0]):
+                continue
+            coin_info = json.loads(info[1]) if len(info) > 1 and info[1] else {}
+            data = coin_info.get('data') if isinstance(coin_info, dict) else None
+            if not isinstance(data, dict) or data.get('decimals') is None:
+                raise ValueError(f"No decimals in the CoinInfo of {symbol} ({info[0]})")
+            decimals = int(data['decimals'])
+            token = TokenInfo(
+                symbol=symbol,
+                type_tag=info[0],
+                decimals=decimals,
+                scale=10 ** decimals,
+                name=data.get('name', ''),
+            )
+            self._by_symbol[symbol] = token
+            self._by_type[token.type_tag] = token
+
+    def __getitem__(self, symbol: str) -> TokenInfo:
+        return self._by_symbol[symbol]
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._by_symbol
+
+    def __len__(self):
+        return len(self._by_symbol)
+
+    def __repr__(self):
+        return f"TokenRegistry({list(self._by_symbol.keys())})"
+
+    def symbols(self) -> list:
+        return list(self._by_symbol.keys())
+
+    def get(self, symbol: str, default=None) -> TokenInfo:
+        return self._by_symbol.get(symbol, default)
+
+    def by_type(self, type_tag: str, default=None) -> TokenInfo:
+        return self._by_type.get(type_tag, default)
+
+    def to_wei(self, symbol: str, amount) -> int:
+        """Exact conversion to the smallest unit, truncated like int()"""
+        scale = self._by_symbol[symbol].scale
+        if isinstance(amount, Integral):
+            return int(amount) * scale
+        # shortest repr of the float, so 1.005 is 1.005 and not 1.00499999...
+        return int(Decimal(repr(float(amount))) * scale)
+
+    def from_wei(self, symbol: str, amount: int) -> float:
+        # int / int is correctly rounded, float amounts are not truncated
+        return amount / self._by_symbol[symbol].scale
@@ -0,0 +1,151 @@
+import asyncio, hashlib, time
+from collections import OrderedDict, deque
+
+from aptos_sdk.async_client import ApiError
+
+# hash of a user transaction: sha3(sha3("APTOS::Transaction") | Transaction::UserTransaction variant | signed tx bcs)
+TRANSACTION_PREFIX = hashlib.sha3_256(b"APTOS::Transaction").digest() + b"\x00"
+
+
+def transaction_hash(signed_tx) -> str:
+    """Hash of a signed transaction as the node reports it, known before the submit"""
+    return "0x" + hashlib.sha3_256(TRANSACTION_PREFIX + signed_tx.bytes()).hexdigest()
+
+
+def swap_events(tx: dict) -> list:
+    """Data of the swap::SwapEvent of a transaction, one per hop"""
+    return [e['data'] for e in tx.get('events', []) if "swap::SwapEvent" in e.get('type', "")]
+
+
+class AccountWatcher():
+    def __init__(self, gateway, page_size: int = 100, max_seen: int = 1000, initial_delay: float = 0.25,
+                 max_delay: float = 2.0, backoff: float = 1.5) -> None:
+        """
+        Tail the committed transactions sent by accounts, remembering the next sequence number and
+        the last ledger version seen, so one poll only downloads the transactions since the previous one.
+        - max_seen: number of recent transactions kept by hash, answers receipt lookups without a request
+        Swaps that were not announced with expect() are collected as external fills (sent outside the bot)
+        """
+        self.gateway = gateway
+        self.page_size = page_size
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self._cursors = {}         # address -> next sequence number to read
+        self.last_version = {}     # address -> ledger version of the last transaction seen
+        self._seen = OrderedDict() # tx hash -> committed transaction
+        self.max_seen = max_seen
+        self._expected = set()     # hashes submitted by the bot
+        self._locks = {}
+        self.external = deque(maxlen=max_seen)  # (address, transaction)
+        self.polls = 0
+        self.requests = 0
+
+    def __repr__(self):
+        return f"AccountWatcher(accounts={len(self._cursors)}, polls={self.polls}, requests={self.requests})"
+
+    def watching(self, address) -> bool:
+        return str(address) in self._cursors
+
+    def _lock(self, address: str) -> asyncio.Lock:
+        if address not in self._locks:
+            self._locks[address] = asyncio.Lock()
+        return self._locks[address]
+
+    def expect(self, address, tx_hash: str, sequence_number: int) -> None:
+        """A transaction submitted by the bot, watch the account from its sequence number if not yet"""
+        address = str(address)
+        self._expected.add(tx_hash)
+        if address not in self._cursors or self._cursors[address] > sequence_number:
+            self._cursors[address] = sequence_number
+
+    def forget(self, tx_hash: str) -> None:
+        """A submit the node rejected, the transaction will never commit"""
+        self._expected.discard(tx_hash)
+
+    async def start(self, address) -> int:
+        """Watch the account from its current sequence number, history before it is ignored"""
+        address = str(address)
+        if address not in self._cursors:
+            self.requests += 1
+            self._cursors[address] = await self.gateway.account_sequence_number(address)
+        return self._cursors[address]
+
+    def seen(self, tx_hash: str):
+        """Committed transaction already downloaded by a poll, None if not seen"""
+        return self._seen.get(tx_hash)
+
+    async def poll(self, address) -> list:
+        """Download the new committed transactions of the account"""
+        address = str(address)
+        await self.start(address)
+        async with self._lock(address):
+            self.polls += 1
+            new = []
+            while True:
+                self.requests += 1
+                try:
+                    page = await self.gateway.transactions_by_account(address, limit=self.page_size, start=self._cursors[address])
+                except ApiError as e:
+                    # nothing committed at the cursor yet
+                    if getattr(e, 'status_code', None) == 404:
+                        break
+                    raise
+                if not page:
+                    break
+                for tx in page:
+                    self._remember(address, tx)
+                new.extend(page)
+                self._cursors[address] = int(page[-1]['sequence_number']) + 1
+                self.last_version[address] = int(page[-1]['version'])
+                if len(page) < self.page_size:
+                    break
+            return new
+
+    def _remember(self, address: str, tx: dict) -> None:
+        tx_hash = tx.get('hash')
+        if tx_hash in self._seen:
+            # downloaded again (cursor moved back by expect), already booked
+            return
+        self._seen[tx_hash] = tx
+        while len(self._seen) > self.max_seen:
+            self._seen.popitem(last=False)
+        if tx_hash in self._expected:
+            self._expected.discard(tx_hash)
+        elif tx.get('success') and swap_events(tx):
+            self.external.append((address, tx))
+
+    def take_external(self, address) -> list:
+        """Swaps of the account sent outside the bot since the last call"""
+        address = str(address)
+        txs = [tx for a, tx in self.external if a == address]
+        others = [(a, tx) for a, tx in self.external if a != address]
+        self.external.clear()
+        self.external.extend(others)
+        return txs
+
+    async def resolve(self, address, tx_hashes: list, timeout: float = 0) -> dict:
+        """
+        Return {tx_hash: transaction} of the committed transactions of the account,
+        polling with adaptive backoff up to timeout seconds for the others
+        """
+        pending = set(h for h in tx_hashes if h)
+        found = {}
+        deadline = time.time() + timeout
+        delay = self.initial_delay
+        polled = False
+        while True:
+            for h in list(pending):
+                tx = self.seen(h)
+                if tx is not None:
+                    found[h] = tx
+                    pending.discard(h)
+            remaining = deadline - time.time()
+            if not pending or (polled and remaining <= 0):
+                break
+            if polled:
+                await asyncio.sleep(min(delay, remaining))
+            progress = bool(await self.poll(address))
+            delay = self.initial_delay if progress else min(delay * self.backoff, self.max_delay)
+            polled = True
+        return found
@@ -0,0 +1,184 @@
+"""
+Simulated broker for backtests: orders are filled at once against constant product pools anchored to the
+market price of the bar (set_market), with the PancakeSwap swap fee and an optional fixed fee per order.
+Orders of the same bar move the pool like on-chain, the pool is back at the market price on the next bar
+(arbitrage).
+"""
+import json, time
+from typing import Tuple
+
+import ulid
+
+from lib.trading import BaseBroker, Order, OrderPlan, PortfolioSnapshot, TradingBot
+from lib.broker.dex.amm import BPS, FEE_BPS, get_amount_out
+from lib.broker.dex.tokens import TokenRegistry
+
+
+class SimAccount():
+    def __init__(self, address: str = '0xsim') -> None:
+        self._address = address
+
+    def __repr__(self):
+        return f"SimAccount({self._address})"
+
+    def address(self) -> str:
+        return self._address
+
+
+class SimBroker(BaseBroker):
+    def __init__(self, tokens: list, balances: dict, currency: str = 'USDT', liquidity=1_000_000.0, fee_bps: int = FEE_BPS,
+                 order_fee: float = 0.0, decimals: dict = None, default_decimals: int = 8) -> None:
+        """
+        - tokens: symbols traded against currency
+        - balances: {symbol: amount} held at start, like {'USDT': 1000}
+        - liquidity: depth of each pool, value of its currency side (float for all tokens or {symbol: float})
+        - fee_bps: swap fee of the pools
+        - order_fee: fixed fee of every order in currency (gas)
+        - decimals: {symbol: decimals}, amounts are integers in the smallest unit like on-chain
+        """
+        super().__init__()
+        self.currency = currency
+        self.symbols = list(dict.fromkeys([currency, *tokens]))
+        decimals = decimals or {}
+        self.registry = TokenRegistry({
+            s: [f"sim::{s}", json.dumps({'data': {'decimals': decimals.get(s, default_decimals)}})] for s in self.symbols
+        })
+        self.liquidity = liquidity
+        self.fee_bps = fee_bps
+        self.order_fee = order_fee
+        self.balances = {s: self.to_wei(s, balances.get(s, 0)) for s in self.symbols}
+        self.time = None     # close time of the current bar
+        self.prices = {}     # {symbol: price in currency} of the current bar
+        self.pools = {}      # {symbol: [reserve_token, reserve_currency]}
+        self.orders = []     # every placed order
+        self.fees = 0.0      # swap fees and order fees paid, in currency
+
+    def __repr__(self):
+        return f"SimBroker(time={self.time}, orders={len(self.orders)}, fees={self.fees:.4f})"
+
+    def to_wei(self, symbol: str, amount: float) -> int:
+        # rounded, not truncated: float amounts read back from from_wei give the same integer
+        return int(round(amount * self.registry[symbol].scale))
+
+    def from_wei(self, symbol: str, amount: int) -> float:
+        return self.registry.from_wei(symbol, amount)
+
+    def set_market(self, timestamp: float, prices: dict) -> None:
+        """
+        Move to a new bar, pools of the tokens in prices are reset to the price (in currency)
+        """
+        self.time = timestamp
+        for symbol, price in prices.items():
+            if not price > 0:
+                continue
+            depth = self.liquidity.get(symbol, 0.0) if isinstance(self.liquidity, dict) else self.liquidity
+            self.prices[symbol] = price
+            self.pools[symbol] = [self.to_wei(symbol, depth / price), self.to_wei(self.currency, depth)]
+
+    def quote(self, symbol_in: str, symbol_out: str, amount_in: int) -> int:
+        """Output of a swap in the current pools, 0 if the token has no price yet"""
+        token = symbol_out if symbol_in == self.currency else symbol_in
+        if token not in self.pools:
+            return 0
+        reserve_token, reserve_currency = self.pools[token]
+        if symbol_in == self.currency:
+            return get_amount_out(amount_in, reserve_currency, reserve_token, self.fee_bps)
+        return get_amount_out(amount_in, reserve_token, reserve_currency, self.fee_bps)
+
+    def swap(self, symbol_in: str, symbol_out: str, amount_in: int) -> int:
+        """Fill a swap in the pool of the token, return amount out"""
+        amount_out = self.quote(symbol_in, symbol_out, amount_in)
+        if amount_out <= 0:
+            return 0
+        token = symbol_out if symbol_in == self.currency else symbol_in
+        pool = self.pools[token]
+        if symbol_in == self.currency:
+            pool[0], pool[1] = pool[0] - amount_out, pool[1] + amount_in
+        else:
+            pool[0], pool[1] = pool[0] + amount_in, pool[1] - amount_out
+        self.balances[symbol_in] -= amount_in
+        self.balances[symbol_out] += amount_out
+        fee = self.from_wei(symbol_in, amount_in) * self.fee_bps / BPS
+        self.fees += fee if symbol_in == self.currency else fee * self.prices[token]
+        return amount_out
+
+    def get_current_price(self, pair: list) -> float:
+        """Price of pair[1] in pair[0] (the currency)"""
+        return self.prices.get(pair[1])
+
+    def load_account(self, wallet_key: str = None) -> SimAccount:
+        return SimAccount(wallet_key if isinstance(wallet_key, str) and wallet_key else '0xsim')
+
+    def portfolio(self, bot: TradingBot) -> PortfolioSnapshot:
+        """Balances of the bot tokens valued by selling them in the current pools, like PancakeBroker"""
+        holdings = {}
+        for symbol in [bot.currency, *bot.tokens]:
+            qty = self.balances.get(symbol, 0)
+            if symbol == bot.currency:
+                value = self.from_wei(symbol, qty)
+            else:
+                value = self.from_wei(bot.currency, self.quote(symbol, bot.currency, qty)) if qty > 0 else 0.0
+            holdings[symbol] = {'qty': qty, 'value': value}
+        return PortfolioSnapshot(bot.currency, holdings)
+
+    def check_balance(self, bot: TradingBot, re_check=True) -> Tuple[float, float]:
+        portfolio = self.portfolio(bot)
+        bot.portfolio = portfolio
+        bot._token_balance = portfolio.token_balance()
+        return portfolio.cash, portfolio.invested
+
+    def place_order(self, order_plan: OrderPlan, bot: TradingBot) -> Order:
+        """
+        Fill a market order at once, same amounts as PancakeBroker.send_order:
+        buy spends qty of the currency (pair[0]), sell spends qty of the token (pair[-1])
+        Rejected if the balance is too low (order fee included) or the token has no price
+        """
+        if order_plan.side == 'buy':
+            token_in, token_out = order_plan.pair[0], order_plan.pair[-1]
+        else:
+            token_in, token_out = order_plan.pair[-1], order_plan.pair[0]
+        amount_in = self.to_wei(token_in, order_plan.qty or 0)
+        fee = self.to_wei(self.currency, self.order_fee)
+        fields = {'status': 'Rejected'}
+        # the order fee is paid in currency, a sell needs it on top of the tokens sold
+        if token_in == self.currency:
+            enough = amount_in <= self.balances[token_in] - fee
+        else:
+            enough = amount_in <= self.balances[token_in] and fee <= self.balances[self.currency]
+        if 0 < amount_in and enough:
+            amount_out = self.swap(token_in, token_out, amount_in)
+            if amount_out > 0:
+                self.balances[self.currency] -= fee
+                self.fees += self.order_fee
+                amount_in_readable = self.from_wei(token_in, amount_in)
+                amount_out_readable = self.from_wei(token_out, amount_out)
+                fields = {
+                    'status': 'Filled',
+                    'type': 'market',
+                    'price': amount_in_readable / amount_out_readable if order_plan.side == 'buy' else amount_out_readable / amount_in_readable,
+                    'amount_in': amount_in_readable,
+                    'amount_out': amount_out_readable,
+                    'qty': amount_out_readable if order_plan.side == 'buy' else amount_in_readable,
+                    'value': amount_in_readable if order_plan.side == 'buy' else amount_out_readable,
+                    'fee': self.order_fee,
+                }
+        ts = self.time if self.time is not None else time.time()
+        order = Order(
+            id=str(ulid.new()),
+            category=bot.category,
+            pair=order_plan.pair,
+            side=order_plan.side,
+            broker=self,
+            tx=f"sim-{len(self.orders)}",
+            sender=str(bot.account.address()),
+            estimated_amount=getattr(order_plan, 'estimated_amount', None),
+            create_time=ts,
+            filled_time=ts if fields['status'] == 'Filled' else None,
+            **fields,
+        )
+        self.orders.append(order)
+        return order
+
+    def update_order(self, order: Order, wait_update: bool = False):
+        # filled (or rejected) when placed
+        return order
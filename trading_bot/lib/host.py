@@ -0,0 +1,177 @@
+"""
+Many bots in one process: they share the broker (RPC pool, reserve cache, background loop), one reserve snapshot
+per cycle and one database writer thread, each bot keeps its own trades and fund state.
+"""
+import asyncio, queue, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from lib.trading import AsyncTradingBot, BaseBroker, TradingBot
+
+
+class DbWriter():
+    def __init__(self, max_queue: int = 10_000) -> None:
+        """
+        One thread doing every database write of the bots (the ORM session is shared, not thread safe),
+        bots only queue the writes and go on with the cycle
+        """
+        self._queue = queue.Queue(maxsize=max_queue)
+        self.written = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._work, name='db-writer', daemon=True)
+        self._thread.start()
+
+    def __repr__(self):
+        return f"DbWriter({self.stats()})"
+
+    def submit(self, fn: Callable, *args) -> None:
+        """Queue fn(*args), run by the writer thread in submit order"""
+        self._queue.put((fn, args))
+
+    def _work(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                fn, args = item
+                fn(*args)
+                self.written += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"Error writing to database: {e}")
+            finally:
+                self._queue.task_done()
+
+    def flush(self) -> None:
+        """Block until the queued writes are done"""
+        self._queue.join()
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+    def stats(self) -> dict:
+        return {'queued': self._queue.qsize(), 'written': self.written, 'errors': self.errors}
+
+
+class BotHost():
+    def __init__(self, broker: BaseBroker, db_writer: DbWriter = None, max_workers: int = None,
+                 order_timeout: float = 20, timeout: float = 240, loop: asyncio.AbstractEventLoop = None) -> None:
+        """
+        Run the cycle of many bots of one broker together
+        - db_writer: set on the bots added, their orders and trades are written by one thread
+        - max_workers: threads running the sync bots, one per bot by default
+        - order_timeout: wait for the receipts of the cycle orders (checking_orders)
+        - loop: event loop of the async bots (the broker background loop)
+        """
+        self.broker = broker
+        self.db_writer = db_writer
+        self.max_workers = max_workers
+        self.order_timeout = order_timeout
+        self.timeout = timeout
+        self.loop = loop
+        self.bots = []
+        self._pool = None
+        self.cycles = 0
+        self.errors = 0
+        self.elapsed = 0.0  # seconds of the last cycle
+
+    def __repr__(self):
+        return f"BotHost({[bot.id for bot in self.bots]}, {self.stats()})"
+
+    def add(self, bot: TradingBot) -> TradingBot:
+        if bot._broker is not self.broker:
+            raise ValueError(f"Bot {bot.id} does not use the host broker")
+        if any(b.id == bot.id for b in self.bots):
+            raise ValueError(f"Bot {bot.id} already added")
+        if self.db_writer is not None:
+            bot.db_writer = self.db_writer
+        self.bots.append(bot)
+        if self._pool is not None:
+            # sized again for the new bot count on the next cycle
+            self._pool.shutdown(wait=False)
+            self._pool = None
+        return bot
+
+    def pairs(self) -> list:
+        """Pairs of all bots, one snapshot for the cycle"""
+        pairs = {}
+        for bot in self.bots:
+            for token in bot.tokens:
+                pairs[(bot.currency, token)] = [bot.currency, token]
+        return list(pairs.values())
+
+    def run_bot(self, bot: TradingBot):
+        """Cycle of a sync bot, errors are returned (one bot does not stop the others)"""
+        try:
+            trades = bot.run()
+            bot.checking_orders(timeout=self.order_timeout)
+            return trades
+        except Exception as e:
+            print(f"Error running bot {bot.id}: {e}")
+            return e
+
+    async def run_async_bot(self, bot: AsyncTradingBot):
+        try:
+            trades = await bot.run()
+            await bot.checking_orders(timeout=self.order_timeout)
+            return trades
+        except Exception as e:
+            print(f"Error running bot {bot.id}: {e}")
+            return e
+
+    async def _gather(self, bots: list) -> list:
+        return await asyncio.gather(*[self.run_async_bot(bot) for bot in bots])
+
+    def _run_async_bots(self, bots: list) -> list:
+        loop = self.loop
+        if loop is None:
+            from lib.broker.dex.aptos_pancake import bg_loop as loop
+        return asyncio.run_coroutine_threadsafe(self._gather(bots), loop).result(timeout=self.timeout)
+
+    def run(self) -> dict:
+        """
+        One cycle of every bot, sync bots in threads and async bots on the loop at the same time
+        return {bot id: processed trades or the error}
+        """
+        start = time.perf_counter()
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers or max(len(self.bots), 1), thread_name_prefix='bot')
+        sync_bots = [bot for bot in self.bots if not isinstance(bot, AsyncTradingBot)]
+        async_bots = [bot for bot in self.bots if isinstance(bot, AsyncTradingBot)]
+        # one reserve snapshot for all bots, their begin_cycle / end_cycle keep it
+        try:
+            self.broker.hold_cycle(pairs=self.pairs())
+        except Exception as e:
+            print(f"Error pinning market snapshot: {e}")
+        results = {}
+        try:
+            futures = {bot.id: self._pool.submit(self.run_bot, bot) for bot in sync_bots}
+            if async_bots:
+                try:
+                    results.update(zip([bot.id for bot in async_bots], self._run_async_bots(async_bots)))
+                except Exception as e:
+                    print(f"Error running async bots: {e}")
+                    results.update({bot.id: e for bot in async_bots})
+            for id, future in futures.items():
+                results[id] = future.result()
+        finally:
+            self.broker.release_cycle()
+        self.cycles += 1
+        self.errors += sum(isinstance(r, Exception) for r in results.values())
+        self.elapsed = time.perf_counter() - start
+        return results
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        if self.db_writer is not None:
+            self.db_writer.flush()
+
+    def stats(self) -> dict:
+        stats = {'bots': len(self.bots), 'cycles': self.cycles, 'errors': self.errors, 'last_cycle': round(self.elapsed, 3)}
+        if self.db_writer is not None:
+            stats['db_writer'] = self.db_writer.stats()
+        return stats
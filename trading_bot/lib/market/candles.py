@@ -0,0 +1,179 @@
+import asyncio, time
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+TIMESTAMP, OPEN, HIGH, LOW, CLOSE, VOLUME = range(len(COLUMNS))
+
+TIMEFRAMES = {'1m': 60, '5m': 300, '15m': 900, '30m': 1800, '1h': 3600, '4h': 14400, '1d': 86400, '1D': 86400}
+
+
+def timeframe_seconds(timeframe: str) -> int:
+    """Candle duration of a timeframe like '5m' or '4h' in seconds"""
+    if timeframe not in TIMEFRAMES:
+        raise ValueError(f"Unsupported timeframe: {timeframe}")
+    return TIMEFRAMES[timeframe]
+
+
+def to_rows(candles: list) -> np.ndarray:
+    """(n, 6) float64 array of [timestamp, open, high, low, close, volume] rows, sorted by timestamp"""
+    rows = np.asarray(candles, dtype=np.float64).reshape(-1, len(COLUMNS))
+    return rows[np.argsort(rows[:, TIMESTAMP], kind='stable')]
+
+
+class CandleBuffer():
+    def __init__(self, capacity: int = 500, step: int = 300) -> None:
+        """
+        Last capacity candles of one market in a fixed size ring buffer.
+        Every row is written twice (at i and i + capacity), so the last n rows are always
+        one contiguous slice and view() never copies.
+        - step: candle duration in seconds
+        """
+        self.capacity = capacity
+        self.step = step
+        self._data = np.zeros((2 * capacity, len(COLUMNS)), dtype=np.float64)
+        self._count = 0  # rows written since creation / reset
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def __repr__(self):
+        return f"CandleBuffer(size={len(self)}/{self.capacity}, step={self.step}, last={self.last_timestamp})"
+
+    @property
+    def last_timestamp(self) -> Optional[int]:
+        """Open time of the newest candle, None if empty"""
+        if self._count == 0:
+            return None
+        return int(self._data[self._end() - 1, TIMESTAMP])
+
+    def _end(self) -> int:
+        return (self._count - 1) % self.capacity + self.capacity + 1
+
+    def _write(self, row: np.ndarray, index: int) -> None:
+        i = index % self.capacity
+        self._data[i] = row
+        self._data[i + self.capacity] = row
+
+    def reset(self) -> None:
+        self._count = 0
+
+    def update(self, rows: np.ndarray) -> int:
+        """
+        Merge candles sorted by timestamp, the newest candle is overwritten (it may have been still forming),
+        older ones are ignored
+        return number of new candles appended
+        """
+        if len(rows) > 1:
+            # same candle twice in a batch, keep the latest
+            rows = rows[np.append(rows[1:, TIMESTAMP] != rows[:-1, TIMESTAMP], True)]
+        last = self.last_timestamp
+        if last is not None:
+            same = rows[rows[:, TIMESTAMP] == last]
+            if len(same):
+                self._write(same[-1], self._count - 1)
+            rows = rows[rows[:, TIMESTAMP] > last]
+        added = len(rows)
+        if added:
+            # only the last capacity rows can be kept
+            index = (self._count + np.arange(added - min(added, self.capacity), added)) % self.capacity
+            self._data[index] = rows[-self.capacity:]
+            self._data[index + self.capacity] = rows[-self.capacity:]
+            self._count += added
+        return added
+
+    def view(self, n: int = None) -> np.ndarray:
+        """Read only (n, 6) view of the last n candles, oldest first, valid until the next update"""
+        n = len(self) if n is None else min(n, len(self))
+        end = self._end() if self._count else 0
+        view = self._data[end - n:end]
+        view.flags.writeable = False
+        return view
+
+    def column(self, name: str, n: int = None) -> np.ndarray:
+        return self.view(n)[:, COLUMNS.index(name)]
+
+    def frame(self, n: int = None) -> pd.DataFrame:
+        """DataFrame of the last n candles in the layout of the GeckoTerminal ohlcv, timestamp as datetime"""
+        view = self.view(n)
+        df = pd.DataFrame(view[:, OPEN:], columns=COLUMNS[OPEN:], copy=False)
+        df.insert(0, 'timestamp', pd.to_datetime(view[:, TIMESTAMP].astype(np.int64), unit='s'))
+        return df
+
+
+class CandleCache():
+    def __init__(self, fetch: Callable, capacity: int = 500, step: int = 300, max_limit: int = 1000) -> None:
+        """
+        Candles of many markets kept between cycles, only candles newer than the cached ones are requested
+        - fetch: fetch(key, limit, before_timestamp) -> list of [timestamp, open, high, low, close, volume],
+          a coroutine function for refresh_many
+        - capacity: candles kept per market, also the backfill size of an empty (or too old) buffer
+        - max_limit: max candles of one request, a gap larger than it is backfilled from scratch
+        """
+        self.fetch = fetch
+        self.capacity = capacity
+        self.step = step
+        self.max_limit = max_limit
+        self._buffers = {}
+        self.requests = 0
+        self.candles = 0  # candles downloaded
+
+    def __repr__(self):
+        return f"CandleCache(markets={len(self._buffers)}, requests={self.requests}, candles={self.candles})"
+
+    def __contains__(self, key) -> bool:
+        return key in self._buffers
+
+    def buffer(self, key) -> CandleBuffer:
+        if key not in self._buffers:
+            self._buffers[key] = CandleBuffer(self.capacity, self.step)
+        return self._buffers[key]
+
+    def missing(self, key, now: float = None) -> int:
+        """Number of candles to request to bring the market up to now, the last cached candle included"""
+        now = time.time() if now is None else now
+        buffer = self.buffer(key)
+        last = buffer.last_timestamp
+        if last is None:
+            return min(self.capacity, self.max_limit)
+        gap = int(now - last) // self.step + 1
+        if gap > self.max_limit:
+            # too old to be merged, start over
+            buffer.reset()
+            return min(self.capacity, self.max_limit)
+        return max(gap, 1)
+
+    def merge(self, key, candles: list) -> CandleBuffer:
+        buffer = self.buffer(key)
+        if len(candles):
+            self.candles += len(candles)
+            buffer.update(to_rows(candles))
+        return buffer
+
+    def refresh(self, key, now: float = None) -> CandleBuffer:
+        """Request the missing candles of a market and merge them"""
+        now = time.time() if now is None else now
+        limit = self.missing(key, now)
+        self.requests += 1
+        return self.merge(key, self.fetch(key, limit, int(now) + 5))
+
+    async def refresh_many(self, keys: list, now: float = None) -> tuple:
+        """
+        Refresh many markets concurrently with an async fetch
+        return ({key: CandleBuffer}, {key: exception}), a failed market does not fail the others
+        """
+        now = time.time() if now is None else now
+        keys = list(keys)
+        limits = [self.missing(key, now) for key in keys]
+        self.requests += len(keys)
+        results = await asyncio.gather(*[self.fetch(key, limit, int(now) + 5) for key, limit in zip(keys, limits)],
+                                       return_exceptions=True)
+        buffers, errors = {}, {}
+        for key, res in zip(keys, results):
+            if isinstance(res, Exception):
+                errors[key] = res
+            else:
+                buffers[key] = self.merge(key, res)
+        return buffers, errors
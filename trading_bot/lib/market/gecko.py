@@ -0,0 +1,158 @@
+import asyncio, random, time
+
+import httpx
+
+API_URL = "https://api.geckoterminal.com/api/v2"
+
+# worth retrying: rate limited or the api / network is having a bad moment
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket():
+    def __init__(self, rate: float, capacity: float = None) -> None:
+        """
+        Rate limiter shared by concurrent requests
+        - rate: tokens refilled per second
+        - capacity: max burst, default one second of rate (at least 1)
+        """
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.waited = 0.0  # total seconds spent waiting for tokens
+
+    def __repr__(self):
+        return f"TokenBucket(rate={self.rate}/s, tokens={self._tokens:.2f}/{self.capacity})"
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0) -> float:
+        """Wait until tokens are available and take them, return seconds waited"""
+        start = time.monotonic()
+        async with self._lock:
+            self._refill()
+            while self._tokens < tokens:
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= tokens
+        waited = time.monotonic() - start
+        self.waited += waited
+        return waited
+
+    def pause(self, seconds: float) -> None:
+        """Provider asked to slow down (429), no token before seconds"""
+        self._refill()
+        self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+
+class GeckoTerminalClient():
+    def __init__(self, network: str = 'aptos', calls_per_minute: float = 30, burst: float = 5, max_connections: int = 10,
+                 timeout: float = 10.0, retries: int = 3, backoff: float = 0.5, max_backoff: float = 8.0) -> None:
+        """
+        Async GeckoTerminal api client, one connection pool for all requests.
+        - calls_per_minute, burst: token bucket of the provider rate limit (public api: 30 calls / minute)
+        - retries: extra attempts on 429 / 5xx / network errors, sleeping a full jitter exponential
+          backoff (or the Retry-After of a 429)
+        """
+        self.network = network
+        self.bucket = TokenBucket(calls_per_minute / 60, burst)
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._client = None
+        self.requests = 0
+        self.errors = 0
+        self.retried = 0
+
+    def __repr__(self):
+        return f"GeckoTerminalClient({self.network}, requests={self.requests}, errors={self.errors}, retried={self.retried})"
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # created on first use, it belongs to the running event loop
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=API_URL,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+                headers={'Accept': 'application/json'},
+            )
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def retry_delay(self, attempt: int, response: httpx.Response = None) -> float:
+        if response is not None and response.status_code == 429:
+            try:
+                return float(response.headers.get('Retry-After'))
+            except (TypeError, ValueError):
+                pass
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    async def get(self, path: str, params: dict = None) -> dict:
+        """GET path of the api, json answer"""
+        for attempt in range(self.retries + 1):
+            await self.bucket.acquire()
+            self.requests += 1
+            response = None
+            try:
+                response = await self.client.get(path, params=params)
+                if response.status_code not in RETRY_STATUS:
+                    response.raise_for_status()
+                    return response.json()
+                error = httpx.HTTPStatusError(f"Error {response.status_code}: {response.text[:200]}",
+                                              request=response.request, response=response)
+            except httpx.TransportError as e:
+                # timeouts, connection errors, a connection dropped mid response (RemoteProtocolError)
+                error = e
+            self.errors += 1
+            if attempt == self.retries:
+                raise error
+            delay = self.retry_delay(attempt, response)
+            if response is not None and response.status_code == 429:
+                self.bucket.pause(delay)
+            self.retried += 1
+            await asyncio.sleep(delay)
+
+    async def ohlcv(self, pool: str, timeframe: str = 'minute', aggregate: int = 5, limit: int = 100,
+                    before_timestamp: int = None, token: str = 'base', currency: str = 'usd') -> list:
+        """
+        Candles of a pool, [timestamp, open, high, low, close, volume] rows, newest first
+        - token: base or quote, the token of the pool the prices are for
+        """
+        params = {
+            "aggregate": aggregate,
+            "limit": limit,  # max 1000
+            "currency": currency,
+            "include_empty_intervals": "true",
+            "token": token,
+        }
+        if before_timestamp is not None:
+            params["before_timestamp"] = before_timestamp
+        data = await self.get(f"/networks/{self.network}/pools/{pool}/ohlcv/{timeframe}", params)
+        return data.get("data", {}).get("attributes", {}).get("ohlcv_list", [])
+
+    async def ohlcv_many(self, queries: dict) -> tuple:
+        """
+        Candles of many pools at once
+        - queries: {key: ohlcv() kwargs}
+        return ({key: candles}, {key: exception}), a failed pool does not fail the others
+        """
+        keys = list(queries)
+        results = await asyncio.gather(*[self.ohlcv(**queries[k]) for k in keys], return_exceptions=True)
+        candles, errors = {}, {}
+        for key, res in zip(keys, results):
+            if isinstance(res, Exception):
+                errors[key] = res
+            else:
+                candles[key] = res
+        return candles, errors
@@ -0,0 +1,332 @@
+"""
+Streaming indicators updated from one closed candle at a time, same values as talib on the same series
+(talib seeds: RSI / ATR with the mean of the first period values then Wilder smoothing, EMA with the SMA of the
+first period closes, Bollinger bands with the population standard deviation).
+The state of every indicator is a small json-able dict, saved between runs so a restart needs no warm up download.
+"""
+import json, math, os
+from abc import ABC, abstractmethod
+from collections import deque
+
+import numpy as np
+
+from lib.market.candles import CLOSE, HIGH, LOW, TIMESTAMP
+
+
+class Indicator(ABC):
+    name = 'indicator'
+
+    def __init__(self, period: int, *args) -> None:
+        self.args = [period, *args]  # constructor arguments, for reset
+        self.period = period
+        self.count = 0  # candles seen
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.period}, value={self.value})"
+
+    @property
+    def value(self) -> float:
+        """Value at the last candle, nan during warm up"""
+        return math.nan
+
+    @abstractmethod
+    def update(self, candle: np.ndarray) -> float:
+        """Add a closed candle [timestamp, open, high, low, close, volume], return the new value"""
+        pass
+
+    def reset(self) -> None:
+        self.__init__(*self.args)
+
+    def peek(self, candle: np.ndarray) -> float:
+        """Value if candle was added, the state is unchanged (for a candle still forming)"""
+        saved = self.state()
+        try:
+            return self.update(candle)
+        finally:
+            self.load(saved)
+
+    def state(self) -> dict:
+        return {k: (list(v) if isinstance(v, deque) else v) for k, v in self.__dict__.items()}
+
+    def load(self, state: dict) -> 'Indicator':
+        for key, value in state.items():
+            current = getattr(self, key, None)
+            setattr(self, key, deque(value, maxlen=current.maxlen) if isinstance(current, deque) else value)
+        return self
+
+
+class SMA(Indicator):
+    name = 'sma'
+
+    def __init__(self, period: int) -> None:
+        super().__init__(period)
+        self.window = deque(maxlen=period)
+        self.total = 0.0
+
+    @property
+    def value(self) -> float:
+        return self.total / self.period if len(self.window) == self.period else math.nan
+
+    def update(self, candle: np.ndarray) -> float:
+        x = float(candle[CLOSE])
+        if len(self.window) == self.period:
+            self.total -= self.window[0]
+        self.window.append(x)
+        self.total += x
+        self.count += 1
+        if self.count % (self.period * 100) == 0:
+            # running sum drifts with float rounding, recompute it now and then
+            self.total = math.fsum(self.window)
+        return self.value
+
+
+class EMA(Indicator):
+    name = 'ema'
+
+    def __init__(self, period: int) -> None:
+        super().__init__(period)
+        self.k = 2.0 / (period + 1)
+        self.ema = math.nan
+        self.seed = 0.0  # sum of the first period closes
+
+    @property
+    def value(self) -> float:
+        return self.ema
+
+    def update(self, candle: np.ndarray) -> float:
+        x = float(candle[CLOSE])
+        self.count += 1
+        if self.count < self.period:
+            self.seed += x
+        elif self.count == self.period:
+            self.ema = (self.seed + x) / self.period
+        else:
+            self.ema += self.k * (x - self.ema)
+        return self.ema
+
+
+class RSI(Indicator):
+    name = 'rsi'
+
+    def __init__(self, period: int = 14) -> None:
+        super().__init__(period)
+        self.prev_close = None
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+
+    @property
+    def value(self) -> float:
+        if self.count <= self.period:
+            return math.nan
+        total = self.avg_gain + self.avg_loss
+        return 100.0 * self.avg_gain / total if total != 0 else 0.0
+
+    def update(self, candle: np.ndarray) -> float:
+        x = float(candle[CLOSE])
+        self.count += 1
+        if self.prev_close is not None:
+            change = x - self.prev_close
+            gain, loss = max(change, 0.0), max(-change, 0.0)
+            if self.count <= self.period + 1:
+                # first average is the mean of the first period changes
+                self.avg_gain += gain / self.period
+                self.avg_loss += loss / self.period
+            else:
+                self.avg_gain = (self.avg_gain * (self.period - 1) + gain) / self.period
+                self.avg_loss = (self.avg_loss * (self.period - 1) + loss) / self.period
+        self.prev_close = x
+        return self.value
+
+
+class ATR(Indicator):
+    name = 'atr'
+
+    def __init__(self, period: int = 14) -> None:
+        super().__init__(period)
+        self.prev_close = None
+        self.atr = 0.0
+
+    @property
+    def value(self) -> float:
+        return self.atr if self.count > self.period else math.nan
+
+    def update(self, candle: np.ndarray) -> float:
+        high, low, close = float(candle[HIGH]), float(candle[LOW]), float(candle[CLOSE])
+        self.count += 1
+        if self.prev_close is not None:
+            true_range = max(high, self.prev_close) - min(low, self.prev_close)
+            if self.count <= self.period + 1:
+                self.atr += true_range / self.period
+            else:
+                self.atr = (self.atr * (self.period - 1) + true_range) / self.period
+        self.prev_close = close
+        return self.value
+
+
+class BollingerBands(Indicator):
+    name = 'bbands'
+
+    def __init__(self, period: int = 20, nbdev: float = 2.0) -> None:
+        super().__init__(period, nbdev)
+        self.nbdev = nbdev
+        self.sma = SMA(period)
+        self.squares = 0.0  # running sum of the squared closes of the sma window
+
+    def __repr__(self):
+        return f"BollingerBands({self.period}, {self.nbdev}, value={self.bands()})"
+
+    @property
+    def value(self) -> float:
+        return self.sma.value
+
+    def bands(self) -> tuple:
+        """(upper, middle, lower), nan during warm up"""
+        middle = self.sma.value
+        if math.isnan(middle):
+            return math.nan, math.nan, math.nan
+        variance = max(0.0, self.squares / self.period - middle * middle)
+        width = self.nbdev * math.sqrt(variance)
+        return middle + width, middle, middle - width
+
+    def update(self, candle: np.ndarray) -> float:
+        x = float(candle[CLOSE])
+        if len(self.sma.window) == self.period:
+            self.squares -= self.sma.window[0] ** 2
+        self.squares += x * x
+        self.count += 1
+        value = self.sma.update(candle)
+        if self.sma.count % (self.period * 100) == 0:
+            # recomputed with the sma running sum
+            self.squares = math.fsum(v * v for v in self.sma.window)
+        return value
+
+    def state(self) -> dict:
+        return {'args': self.args, 'count': self.count, 'sma': self.sma.state(), 'squares': self.squares}
+
+    def load(self, state: dict) -> 'BollingerBands':
+        self.args, self.count = state['args'], state['count']
+        self.period, self.nbdev = self.args
+        self.sma.load(state['sma'])
+        # states saved before the running sum of squares
+        self.squares = state['squares'] if 'squares' in state else math.fsum(v * v for v in self.sma.window)
+        return self
+
+
+class IndicatorSet():
+    def __init__(self, indicators: dict, step: int = 300, history: int = 500) -> None:
+        """
+        Indicators of one market, fed with the closed candles of a CandleBuffer
+        - indicators: {column name: Indicator}, like {'rsi14': RSI(14)}
+        - history: values kept per indicator to build columns, the update itself only needs the state
+        """
+        self.indicators = indicators
+        self.step = step
+        self.history = history
+        self.last_timestamp = None  # last closed candle added
+        self._values = {name: deque(maxlen=history) for name in indicators}
+        self._timestamps = deque(maxlen=history)
+        self._forming = (None, {})  # (timestamp, values) of the candle still forming
+
+    def __repr__(self):
+        return f"IndicatorSet({list(self.indicators)}, last={self.last_timestamp})"
+
+    def reset(self) -> None:
+        for name, ind in self.indicators.items():
+            ind.reset()
+            self._values[name].clear()
+        self._timestamps.clear()
+        self.last_timestamp = None
+
+    def add(self, candle: np.ndarray) -> dict:
+        """Add one closed candle, return {name: value}"""
+        values = {name: ind.update(candle) for name, ind in self.indicators.items()}
+        for name, value in values.items():
+            self._values[name].append(value)
+        self._timestamps.append(int(candle[TIMESTAMP]))
+        self.last_timestamp = int(candle[TIMESTAMP])
+        return values
+
+    def sync(self, candles: np.ndarray, closed: bool = False) -> dict:
+        """
+        Bring the indicators up to the candles (a CandleBuffer view, oldest first)
+        - closed: if False the last candle may still be forming, it is only peeked
+        Candles after a gap (missing candles, ex: stale saved state) restart the indicators from the candles
+        return {name: value} at the last candle
+        """
+        if len(candles) == 0:
+            return {name: ind.value for name, ind in self.indicators.items()}
+        done = candles if closed else candles[:-1]
+        if self.last_timestamp is not None:
+            new = done[done[:, TIMESTAMP] > self.last_timestamp]
+            if len(new) and new[0, TIMESTAMP] > self.last_timestamp + self.step:
+                self.reset()
+                new = done
+        else:
+            new = done
+        for candle in new:
+            self.add(candle)
+        if closed:
+            self._forming = (None, {})
+            return {name: ind.value for name, ind in self.indicators.items()}
+        last = candles[-1]
+        if self.last_timestamp is not None and last[TIMESTAMP] <= self.last_timestamp:
+            # already added as closed
+            self._forming = (None, {})
+            return {name: ind.value for name, ind in self.indicators.items()}
+        values = {name: ind.peek(last) for name, ind in self.indicators.items()}
+        self._forming = (int(last[TIMESTAMP]), values)
+        return values
+
+    def column(self, name: str, timestamps) -> np.ndarray:
+        """Values of an indicator aligned to candle open timestamps (seconds), nan where unknown"""
+        known = dict(zip(self._timestamps, self._values[name]))
+        ts, values = self._forming
+        if ts is not None:
+            known[ts] = values[name]
+        return np.array([known.get(int(t), math.nan) for t in timestamps], dtype=np.float64)
+
+    def state(self) -> dict:
+        return {
+            'last_timestamp': self.last_timestamp,
+            'indicators': {name: [ind.name, ind.state()] for name, ind in self.indicators.items()},
+        }
+
+    def load(self, state: dict) -> 'IndicatorSet':
+        """Restore saved indicators, ignored if they are not the configured ones"""
+        saved = state.get('indicators', {})
+        if set(saved) != set(self.indicators) or any(saved[n][0] != ind.name for n, ind in self.indicators.items()):
+            return self
+        self.reset()
+        for name, ind in self.indicators.items():
+            ind.load(saved[name][1])
+        self.last_timestamp = state.get('last_timestamp')
+        if self.last_timestamp is not None:
+            # values before are not saved, the last one is known from the state
+            self._timestamps.append(self.last_timestamp)
+            for name, ind in self.indicators.items():
+                self._values[name].append(ind.value)
+        return self
+
+
+class IndicatorStore():
+    def __init__(self, path: str) -> None:
+        """Indicator states of many markets in one json file"""
+        self.path = path
+
+    def load(self) -> dict:
+        """{key: IndicatorSet state}, empty if there is no file or it can not be read"""
+        try:
+            with open(self.path, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError) as e:
+            if os.path.exists(self.path):
+                print(f"Error loading indicator state {self.path}: {e}")
+            return {}
+
+    def save(self, sets: dict) -> None:
+        """Write {key: IndicatorSet}, atomically (a crash never leaves a half written file)"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w') as file:
+            json.dump({str(key): s.state() for key, s in sets.items()}, file)
+        os.replace(tmp, self.path)
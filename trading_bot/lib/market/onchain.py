@@ -0,0 +1,240 @@
+"""
+Candles built from the PancakeSwap swap::SwapEvent of the router pairs, read straight from the fullnode.
+
+Every poll reads the ledger info (version + chain time) then the new swap events of every pair. Events carry a
+ledger version but no time, their time is interpolated between the two ledger infos around them (sub second error
+when polling every few seconds). A candle closes as soon as the chain time passes its end, all the events before
+are known by then. Candles are in the quote token of the pair, the first partial candle after start is dropped.
+"""
+import asyncio, time
+from collections import deque
+from typing import NamedTuple
+
+from lib.broker.dex.amm import BPS, FEE_BPS
+
+
+class Market(NamedTuple):
+    symbol: str
+    type_x: str
+    type_y: str
+    base_is_x: bool
+    base_scale: int
+    quote_scale: int
+
+
+class CandleAggregator():
+    def __init__(self, step: int, since: float, last_close: float = None, fill_empty: bool = True) -> None:
+        """
+        Trades of one market into candles of step seconds
+        - since: time trades are known from, the candle it falls in is incomplete and dropped
+        - last_close: price before the first trade, for the empty candles
+        - fill_empty: a candle without trade is open = high = low = close = last close, volume 0
+        """
+        self.step = step
+        self.fill_empty = fill_empty
+        self.last_close = last_close
+        self.next_open = (int(since) // step + (0 if since % step == 0 else 1)) * step  # first complete candle
+        self.current = None  # [timestamp, open, high, low, close, volume]
+
+    def __repr__(self):
+        return f"CandleAggregator(step={self.step}, next={self.next_open}, current={self.current})"
+
+    def close_until(self, now: float) -> list:
+        """Candles that ended before now, oldest first"""
+        closed = []
+        while self.next_open + self.step <= now:
+            if self.current is not None and self.current[0] == self.next_open:
+                closed.append(self.current)
+                self.last_close = self.current[4]
+                self.current = None
+            elif self.fill_empty and self.last_close is not None:
+                closed.append([self.next_open, self.last_close, self.last_close, self.last_close, self.last_close, 0.0])
+            self.next_open += self.step
+        return closed
+
+    def add(self, timestamp: float, price: float, volume: float) -> list:
+        """Add a trade, return the candles it closed"""
+        closed = self.close_until(timestamp)
+        if timestamp < self.next_open:
+            # trade of the incomplete first candle
+            self.last_close = price
+            return closed
+        if self.current is None:
+            self.current = [self.next_open, price, price, price, price, volume]
+        else:
+            self.current[2] = max(self.current[2], price)
+            self.current[3] = min(self.current[3], price)
+            self.current[4] = price
+            self.current[5] += volume
+        return closed
+
+
+class OnchainCandleBuilder():
+    def __init__(self, gateway, router_address: str, markets: list, steps: tuple = (60, 300), page_size: int = 100,
+                 fee_bps: int = FEE_BPS, max_closed: int = 1000) -> None:
+        """
+        - gateway: RestClient like (RpcPool of the broker)
+        - markets: [Market] pairs to build candles of
+        - steps: candle durations in seconds
+        """
+        self.gateway = gateway
+        self.router_address = router_address
+        self.markets = {m.symbol: m for m in markets}
+        self.steps = steps
+        self.page_size = page_size
+        self.fee_bps = fee_bps
+        self._cursors = {}      # symbol -> next swap event sequence number
+        self._aggregators = {}  # (symbol, step) -> CandleAggregator
+        self.closed = {}        # (symbol, step) -> deque of closed candles not taken yet
+        self.max_closed = max_closed
+        self.anchor = None      # (ledger version, chain time in seconds) of the last poll
+        self._anchors = {}      # symbol -> anchor its events were read up to, behind self.anchor after a failed read
+        self.polls = 0
+        self.swaps = 0
+        self.lag = None         # seconds between a candle end and its close by the last poll
+
+    def __repr__(self):
+        return f"OnchainCandleBuilder(markets={list(self.markets)}, steps={self.steps}, polls={self.polls}, swaps={self.swaps})"
+
+    @classmethod
+    def for_broker(cls, broker, tokens: list, currency: str, **kwargs) -> 'OnchainCandleBuilder':
+        """Markets token/currency of the broker pairs, tokens without a direct pair are skipped"""
+        from lib.broker.dex.aptos_pancake import run_async
+        # the broker loads its pair index on first use
+        run_async(broker.ensure_pair_index())
+        markets = []
+        for token in tokens:
+            base, quote = broker.registry.get(token), broker.registry.get(currency)
+            orientation = broker.pair_index.lookup(base.type_tag, quote.type_tag) if base and quote else None
+            if orientation is None:
+                print(f"No {token}/{currency} pair in router, no onchain candles for {token}")
+                continue
+            markets.append(Market(token, orientation[0], orientation[1], orientation[0] == base.type_tag,
+                                  base.scale, quote.scale))
+        return cls(broker.gateway, broker.router_address, markets, **kwargs)
+
+    def _resource(self, market: Market, name: str) -> str:
+        return f"{self.router_address}::swap::{name}<{market.type_x}, {market.type_y}>"
+
+    async def ledger_anchor(self) -> tuple:
+        info = await self.gateway.info()
+        return int(info['ledger_version']), int(info['ledger_timestamp']) / 1e6
+
+    async def start(self) -> None:
+        """Start from the current ledger version, spot prices of the reserves seed the empty candles"""
+        self.anchor = await self.ledger_anchor()
+        version, now = self.anchor
+
+        async def init(market: Market):
+            holder, reserves = await asyncio.gather(
+                self.gateway.account_resource(self.router_address, self._resource(market, 'PairEventHolder'), version),
+                self.gateway.account_resource(self.router_address, self._resource(market, 'TokenPairReserve'), version),
+            )
+            self._cursors[market.symbol] = int(holder['data']['swap']['counter'])
+            reserve_x, reserve_y = int(reserves['data']['reserve_x']), int(reserves['data']['reserve_y'])
+            spot = self.price(market, reserve_x, reserve_y) if reserve_x and reserve_y else None
+            for step in self.steps:
+                self._aggregators[(market.symbol, step)] = CandleAggregator(step, now, last_close=spot)
+                self.closed[(market.symbol, step)] = deque(maxlen=self.max_closed)
+
+        await asyncio.gather(*[init(m) for m in self.markets.values()])
+        self._anchors = {symbol: self.anchor for symbol in self.markets}
+
+    def price(self, market: Market, amount_x: float, amount_y: float) -> float:
+        """Price of the base token in quote token of amounts of x and y"""
+        base, quote = (amount_x, amount_y) if market.base_is_x else (amount_y, amount_x)
+        return (quote / market.quote_scale) / (base / market.base_scale)
+
+    def trade(self, market: Market, data: dict) -> tuple:
+        """(price, volume in quote) of a swap event, the fee is taken out of the input amount"""
+        x_in, y_in = int(data['amount_x_in']), int(data['amount_y_in'])
+        x_out, y_out = int(data['amount_x_out']), int(data['amount_y_out'])
+        fee = (BPS - self.fee_bps) / BPS
+        amount_x = x_in * fee if x_in else x_out
+        amount_y = y_in * fee if y_in else y_out
+        volume = (y_in + y_out if market.base_is_x else x_in + x_out) / market.quote_scale
+        return self.price(market, amount_x, amount_y), volume
+
+    async def events(self, market: Market, max_version: int) -> list:
+        """New swap events of the market up to max_version, the cursor moves only when all pages are read"""
+        found, cursor = [], self._cursors[market.symbol]
+        while True:
+            page = await self.gateway.events_by_event_handle(
+                self.router_address, self._resource(market, 'PairEventHolder'), 'swap',
+                limit=self.page_size, start=cursor,
+            )
+            page = [e for e in page if int(e['version']) <= max_version]
+            found.extend(page)
+            if page:
+                cursor = int(page[-1]['sequence_number']) + 1
+            if len(page) < self.page_size:
+                self._cursors[market.symbol] = cursor
+                return found
+
+    def _time(self, version: int, previous: tuple, current: tuple) -> float:
+        (v0, t0), (v1, t1) = previous, current
+        if v1 <= v0:
+            return t1
+        return t0 + (t1 - t0) * min(max(version - v0, 0), v1 - v0) / (v1 - v0)
+
+    async def poll(self) -> dict:
+        """
+        Read the new swaps and close the candles that ended
+        return {(symbol, step): [closed candles]}
+        """
+        if self.anchor is None:
+            await self.start()
+        current = await self.ledger_anchor()
+        markets = list(self.markets.values())
+        results = await asyncio.gather(*[self.events(m, current[0]) for m in markets], return_exceptions=True)
+        self.polls += 1
+
+        closed = {}
+        for market, events in zip(markets, results):
+            if isinstance(events, Exception):
+                # candles of the market stay open until its events are read, they are not closed without them
+                print(f"Error reading swap events of {market.symbol}: {events}")
+                continue
+            previous = self._anchors[market.symbol]
+            self.swaps += len(events)
+            for event in events:
+                timestamp = self._time(int(event['version']), previous, current)
+                price, volume = self.trade(market, event['data'])
+                for step in self.steps:
+                    closed.setdefault((market.symbol, step), []).extend(
+                        self._aggregators[(market.symbol, step)].add(timestamp, price, volume))
+            for step in self.steps:
+                closed.setdefault((market.symbol, step), []).extend(
+                    self._aggregators[(market.symbol, step)].close_until(current[1]))
+            self._anchors[market.symbol] = current
+        self.anchor = current
+
+        for key, candles in closed.items():
+            if candles:
+                self.closed[key].extend(candles)
+                self.lag = time.time() - (candles[-1][0] + key[1])
+        return {k: v for k, v in closed.items() if v}
+
+    def closed_until(self, symbol: str, step: int):
+        """Time every candle of the market before is closed, None if not started"""
+        aggregator = self._aggregators.get((symbol, step))
+        return None if aggregator is None else aggregator.next_open
+
+    def take(self, symbol: str, step: int) -> list:
+        """Closed candles of a market not taken yet, oldest first (thread safe)"""
+        queue = self.closed.get((symbol, step))
+        taken = []
+        while queue:
+            taken.append(queue.popleft())
+        return taken
+
+    async def run(self, interval: float = 2.0, on_close=None) -> None:
+        """Poll forever, on_close(closed) is called with the result of every poll that closed candles"""
+        while True:
+            try:
+                closed = await self.poll()
+                if closed and on_close is not None:
+                    on_close(closed)
+            except Exception as e:
+                print(f"Error polling onchain candles: {e}")
+            await asyncio.sleep(interval)
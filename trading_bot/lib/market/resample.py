@@ -0,0 +1,109 @@
+"""
+Higher timeframe candles derived from one base candle stream (5m -> 15m, 1h, 4h, 1d), buckets aligned on UTC
+epoch multiples of the timeframe like exchanges do.
+"""
+from typing import Callable
+
+import numpy as np
+
+from lib.market.candles import CLOSE, COLUMNS, HIGH, LOW, OPEN, TIMESTAMP, VOLUME, CandleBuffer, timeframe_seconds
+
+
+def resample(rows: np.ndarray, step: int) -> np.ndarray:
+    """
+    Vectorized resampling of base candle rows (sorted by timestamp) into candles of step seconds,
+    the last candle may be incomplete (for history, backtests)
+    """
+    rows = np.asarray(rows, dtype=np.float64).reshape(-1, len(COLUMNS))
+    if len(rows) == 0:
+        return rows.copy()
+    buckets = (rows[:, TIMESTAMP] // step) * step
+    starts = np.flatnonzero(np.append(True, buckets[1:] != buckets[:-1]))
+    ends = np.append(starts[1:], len(rows)) - 1
+    out = np.empty((len(starts), len(COLUMNS)), dtype=np.float64)
+    out[:, TIMESTAMP] = buckets[starts]
+    out[:, OPEN] = rows[starts, OPEN]
+    out[:, HIGH] = np.maximum.reduceat(rows[:, HIGH], starts)
+    out[:, LOW] = np.minimum.reduceat(rows[:, LOW], starts)
+    out[:, CLOSE] = rows[ends, CLOSE]
+    out[:, VOLUME] = np.add.reduceat(rows[:, VOLUME], starts)
+    return out
+
+
+class Resampler():
+    def __init__(self, base_step: int, timeframes: list = ('15m', '1h', '4h', '1d'), capacity: int = 500) -> None:
+        """
+        Incremental resampling of the closed base candles of one market
+        - timeframes: multiples of base_step
+        - capacity: closed candles kept per timeframe (CandleBuffer)
+        A candle closes with the base candle that ends its bucket (no need to wait for the next one),
+        a candle whose first base candles are missing (started mid bucket) is dropped.
+        """
+        self.base_step = base_step
+        self.steps = {}
+        for timeframe in timeframes:
+            step = timeframe_seconds(timeframe)
+            if step % base_step or step <= base_step:
+                raise ValueError(f"{timeframe} is not a multiple of the {base_step}s base candles")
+            self.steps[timeframe] = step
+        self.buffers = {tf: CandleBuffer(capacity, step) for tf, step in self.steps.items()}
+        self._current = {tf: None for tf in self.steps}  # [timestamp, open, high, low, close, volume, complete]
+        self.last_timestamp = None  # last base candle added
+        self._listeners = []
+
+    def __repr__(self):
+        return f"Resampler({self.base_step}s -> {list(self.steps)}, last={self.last_timestamp})"
+
+    def subscribe(self, callback: Callable) -> None:
+        """callback(timeframe, candle row) for every closed candle"""
+        self._listeners.append(callback)
+
+    def _emit(self, timeframe: str, bar: list, closed: dict) -> None:
+        if not bar[6]:
+            return
+        row = np.array(bar[:6], dtype=np.float64)
+        self.buffers[timeframe].update(row.reshape(1, -1))
+        closed.setdefault(timeframe, []).append(row)
+        for callback in self._listeners:
+            callback(timeframe, row)
+
+    def update(self, candles: np.ndarray) -> dict:
+        """
+        Add closed base candles (rows sorted by timestamp), the ones already added are skipped
+        return {timeframe: [closed candle rows]}
+        """
+        candles = np.asarray(candles, dtype=np.float64).reshape(-1, len(COLUMNS))
+        if self.last_timestamp is not None:
+            candles = candles[candles[:, TIMESTAMP] > self.last_timestamp]
+        closed = {}
+        for candle in candles:
+            ts = int(candle[TIMESTAMP])
+            for timeframe, step in self.steps.items():
+                bucket = ts // step * step
+                bar = self._current[timeframe]
+                if bar is not None and bar[0] != bucket:
+                    # the base candle ending the bucket is missing, closed by the next bucket
+                    self._emit(timeframe, bar, closed)
+                    bar = None
+                if bar is None:
+                    bar = [bucket, candle[OPEN], candle[HIGH], candle[LOW], candle[CLOSE], candle[VOLUME], ts == bucket]
+                else:
+                    bar[2] = max(bar[2], candle[HIGH])
+                    bar[3] = min(bar[3], candle[LOW])
+                    bar[4] = candle[CLOSE]
+                    bar[5] += candle[VOLUME]
+                if ts + self.base_step >= bucket + step:
+                    self._emit(timeframe, bar, closed)
+                    bar = None
+                self._current[timeframe] = bar
+            self.last_timestamp = ts
+        return closed
+
+    def forming(self, timeframe: str):
+        """Row of the candle still forming, None if none"""
+        bar = self._current[timeframe]
+        return None if bar is None else np.array(bar[:6], dtype=np.float64)
+
+    def frame(self, timeframe: str, n: int = None):
+        """DataFrame of the last n closed candles of a timeframe"""
+        return self.buffers[timeframe].frame(n)
@@ -0,0 +1,192 @@
+"""
+Append only candle history on disk, one directory per symbol and timeframe, one fixed width file per column:
+
+    {root}/{symbol}/{timeframe}/timestamp.i8   int64 open time in seconds, increasing
+    {root}/{symbol}/{timeframe}/open.f8 ...    float64
+    {root}/{symbol}/{timeframe}/meta.json      number of candles, written after the data
+
+Columns are read through memory mapped numpy arrays, a range read is a slice of the map (no copy, nothing
+loaded before it is touched) so years of 1m candles of many tokens do not need to fit in RAM.
+Files grow by chunks, one writer per series (the live bot), any number of readers (backtests).
+"""
+import json, os
+
+import numpy as np
+
+from lib.market.candles import COLUMNS, TIMESTAMP, timeframe_seconds
+
+TIMESTAMP_NAME = COLUMNS[TIMESTAMP]
+DTYPES = {name: np.int64 if name == TIMESTAMP_NAME else np.float64 for name in COLUMNS}
+
+
+class CandleSeries():
+    def __init__(self, path: str, step: int, readonly: bool = False, chunk: int = 1 << 16) -> None:
+        """
+        Candles of one symbol and timeframe
+        - readonly: open the maps read only, new appends of the writer are seen after refresh()
+        - chunk: rows the files grow by
+        """
+        self.path = path
+        self.step = step
+        self.readonly = readonly
+        self.chunk = chunk
+        self._maps = {}
+        self._count = 0
+        if not readonly:
+            os.makedirs(path, exist_ok=True)
+        self.refresh()
+
+    def __len__(self):
+        return self._count
+
+    def __repr__(self):
+        return f"CandleSeries({self.path}, size={self._count}, last={self.last_timestamp})"
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, f"{name}.{'i8' if DTYPES[name] == np.int64 else 'f8'}")
+
+    def _meta(self) -> str:
+        return os.path.join(self.path, 'meta.json')
+
+    def _capacity(self) -> int:
+        return len(self._maps[TIMESTAMP_NAME]) if self._maps else 0
+
+    def _map(self, rows: int) -> None:
+        self._maps = {}
+        if rows == 0:
+            return
+        for name, dtype in DTYPES.items():
+            self._maps[name] = np.memmap(self._file(name), dtype=dtype, mode='r' if self.readonly else 'r+', shape=(rows,))
+
+    def refresh(self) -> None:
+        """Reload the number of candles (and remap the files if they grew)"""
+        try:
+            with open(self._meta(), 'r') as file:
+                meta = json.load(file)
+        except (OSError, ValueError):
+            meta = {'count': 0, 'step': self.step}
+        if meta.get('step', self.step) != self.step:
+            raise ValueError(f"{self.path} holds candles of {meta['step']}s, not {self.step}s")
+        self._count = int(meta['count'])
+        size = os.path.getsize(self._file(TIMESTAMP_NAME)) // 8 if os.path.exists(self._file(TIMESTAMP_NAME)) else 0
+        if size != self._capacity():
+            self._map(size)
+
+    def _grow(self, rows: int) -> None:
+        capacity = -(-rows // self.chunk) * self.chunk
+        for name in DTYPES:
+            with open(self._file(name), 'ab') as file:
+                file.truncate(capacity * 8)
+        self._map(capacity)
+
+    @property
+    def first_timestamp(self):
+        return int(self._maps[TIMESTAMP_NAME][0]) if self._count else None
+
+    @property
+    def last_timestamp(self):
+        return int(self._maps[TIMESTAMP_NAME][self._count - 1]) if self._count else None
+
+    def append(self, rows: np.ndarray) -> int:
+        """
+        Append candle rows [timestamp, open, high, low, close, volume] sorted by timestamp, the last stored candle
+        is overwritten by a row of the same timestamp, older rows are ignored
+        return number of new candles
+        """
+        if self.readonly:
+            raise PermissionError(f"{self.path} is opened read only")
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, len(COLUMNS))
+        if len(rows) > 1:
+            rows = rows[np.append(rows[1:, TIMESTAMP] != rows[:-1, TIMESTAMP], True)]
+        start = self._count
+        last = self.last_timestamp
+        if last is not None:
+            rows = rows[rows[:, TIMESTAMP] >= last]
+            if len(rows) and rows[0, TIMESTAMP] == last:
+                start -= 1
+        if len(rows) == 0:
+            return 0
+        end = start + len(rows)
+        if end > self._capacity():
+            self._grow(end)
+        for i, name in enumerate(COLUMNS):
+            self._maps[name][start:end] = rows[:, i]
+        added = end - self._count
+        self._count = end
+        self.flush()
+        return added
+
+    def flush(self) -> None:
+        """Data first, then the count, a crash never exposes rows that were not written"""
+        for m in self._maps.values():
+            m.flush()
+        tmp = f"{self._meta()}.tmp"
+        with open(tmp, 'w') as file:
+            json.dump({'count': self._count, 'step': self.step, 'columns': COLUMNS}, file)
+        os.replace(tmp, self._meta())
+
+    def index(self, start: int = None, end: int = None) -> slice:
+        """Rows of the candles opened in [start, end) (timestamps in seconds, None for unbounded)"""
+        timestamps = self._maps[TIMESTAMP_NAME][:self._count] if self._count else np.zeros(0, dtype=np.int64)
+        i = 0 if start is None else int(np.searchsorted(timestamps, start, side='left'))
+        j = self._count if end is None else int(np.searchsorted(timestamps, end, side='left'))
+        return slice(i, max(i, j))
+
+    def columns(self, start: int = None, end: int = None) -> dict:
+        """{column: memory mapped view} of the candles opened in [start, end), no copy"""
+        rows = self.index(start, end)
+        if not self._count:
+            return {name: np.zeros(0, dtype=dtype) for name, dtype in DTYPES.items()}
+        return {name: self._maps[name][rows] for name in COLUMNS}
+
+    def column(self, name: str, start: int = None, end: int = None) -> np.ndarray:
+        return self.columns(start, end)[name]
+
+    def tail(self, n: int) -> np.ndarray:
+        """(n, 6) float64 rows of the last n candles (a copy, like CandleBuffer rows)"""
+        n = min(n, self._count)
+        if n == 0:
+            return np.zeros((0, len(COLUMNS)), dtype=np.float64)
+        return np.column_stack([self._maps[name][self._count - n:self._count] for name in COLUMNS]).astype(np.float64)
+
+
+class CandleStore():
+    def __init__(self, root: str, readonly: bool = False, chunk: int = 1 << 16) -> None:
+        """Candle series of many symbols and timeframes under root"""
+        self.root = root
+        self.readonly = readonly
+        self.chunk = chunk
+        self._series = {}
+
+    def __repr__(self):
+        return f"CandleStore({self.root}, open={len(self._series)})"
+
+    def series(self, symbol: str, timeframe: str) -> CandleSeries:
+        key = (symbol, timeframe)
+        if key not in self._series:
+            path = os.path.join(self.root, symbol, timeframe)
+            self._series[key] = CandleSeries(path, timeframe_seconds(timeframe), self.readonly, self.chunk)
+        return self._series[key]
+
+    def __contains__(self, key) -> bool:
+        symbol, timeframe = key
+        return os.path.exists(os.path.join(self.root, symbol, timeframe, 'meta.json'))
+
+    def symbols(self) -> list:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(d for d in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, d)))
+
+    def timeframes(self, symbol: str) -> list:
+        path = os.path.join(self.root, symbol)
+        return sorted(d for d in os.listdir(path) if (symbol, d) in self) if os.path.isdir(path) else []
+
+    def append(self, symbol: str, timeframe: str, rows: np.ndarray) -> int:
+        return self.series(symbol, timeframe).append(rows)
+
+    def read(self, symbol: str, timeframe: str, start: int = None, end: int = None) -> dict:
+        """{column: memory mapped view} of the candles opened in [start, end)"""
+        series = self.series(symbol, timeframe)
+        if self.readonly:
+            series.refresh()
+        return series.columns(start, end)
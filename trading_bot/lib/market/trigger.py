@@ -0,0 +1,118 @@
+import os, threading, time
+from collections import deque
+from typing import Callable
+
+import numpy as np
+
+
+class CandleCloseTrigger():
+    def __init__(self, step: int, ready: Callable, min_delay: float = 0.5, max_wait: float = 60.0, interval: float = 1.0,
+                 max_interval: float = 5.0, backoff: float = 1.5, history: int = 500, log_path: str = None) -> None:
+        """
+        Run a job as soon as the candle that just closed is available, instead of a fixed offset after the close
+        - ready: ready(close_ts) -> True when the candle ending at close_ts can be read (may download it)
+        - min_delay: first check after the close, then the earliest delay seen recently (less useless polls)
+        - interval, max_interval, backoff: poll interval growing while not ready
+        - max_wait: the job runs anyway max_wait seconds after the close (with the data available then)
+        - log_path: csv of every cycle close, delay and polls
+        notify() wakes the wait early when candles are pushed (onchain candles)
+        """
+        self.step = step
+        self.ready = ready
+        self.min_delay = min_delay
+        self.max_wait = max_wait
+        self.interval = interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.log_path = log_path
+        self.delays = deque(maxlen=history)  # seconds between a candle close and its job start
+        self.timeouts = 0
+        self.polls = 0
+        self._event = threading.Event()
+        self._stopped = False
+
+    def __repr__(self):
+        return f"CandleCloseTrigger(step={self.step}, {self.stats()})"
+
+    def next_close(self, now: float = None) -> int:
+        now = time.time() if now is None else now
+        return (int(now) // self.step + 1) * self.step
+
+    def lead(self) -> float:
+        """Delay of the first check after a close, a bit before the fastest recent cycles"""
+        if len(self.delays) < 5:
+            return self.min_delay
+        return max(self.min_delay, float(np.percentile(self.delays, 10)) - self.interval)
+
+    def notify(self, close_ts: int = None) -> None:
+        """New candles were pushed, check readiness now (thread safe)"""
+        self._event.set()
+
+    def _sleep(self, seconds: float) -> None:
+        # a notify wakes the sleep up
+        if seconds > 0:
+            self._event.wait(seconds)
+        self._event.clear()
+
+    def wait(self, close_ts: int) -> float:
+        """Block until the candle ending at close_ts is ready (or max_wait), return the delay after the close"""
+        self._sleep(close_ts + self.lead() - time.time())
+        interval, polls = self.interval, 0
+        while not self._stopped:
+            polls += 1
+            try:
+                if self.ready(close_ts):
+                    break
+            except Exception as e:
+                print(f"Error checking candle {close_ts}: {e}")
+            remaining = close_ts + self.max_wait - time.time()
+            if remaining <= 0:
+                self.timeouts += 1
+                print(f"Candle {close_ts} not ready after {self.max_wait}s, running anyway")
+                break
+            self._sleep(min(interval, remaining))
+            interval = min(interval * self.backoff, self.max_interval)
+        delay = time.time() - close_ts
+        self.polls += polls
+        self.delays.append(delay)
+        self.record(close_ts, delay, polls)
+        return delay
+
+    def record(self, close_ts: int, delay: float, polls: int) -> None:
+        print(f"Candle {time.strftime('%H:%M:%S', time.gmtime(close_ts))} ready +{delay:.2f}s after close ({polls} checks)")
+        if self.log_path is None:
+            return
+        try:
+            new = not os.path.exists(self.log_path)
+            os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+            with open(self.log_path, 'a') as file:
+                if new:
+                    file.write("close_ts,delay,polls\n")
+                file.write(f"{close_ts},{delay:.3f},{polls}\n")
+        except OSError as e:
+            print(f"Error writing trigger log: {e}")
+
+    def stats(self) -> dict:
+        if not self.delays:
+            return {'cycles': 0, 'timeouts': self.timeouts}
+        p50, p90 = np.percentile(self.delays, [50, 90])
+        return {'cycles': len(self.delays), 'delay_p50': round(float(p50), 3), 'delay_p90': round(float(p90), 3),
+                'polls': self.polls, 'timeouts': self.timeouts}
+
+    def run(self, job: Callable, **kwargs) -> None:
+        """Run job(**kwargs) after every candle close, forever (until stop)"""
+        while not self._stopped:
+            close_ts = self.next_close()
+            while not self._stopped and time.time() < close_ts:
+                self._sleep(close_ts - time.time())
+            if self._stopped:
+                break
+            self.wait(close_ts)
+            try:
+                job(**kwargs)
+            except Exception as e:
+                print(f"Error running job: {e}")
+
+    def stop(self) -> None:
+        self._stopped = True
+        self._event.set()
@@ -0,0 +1,196 @@
+"""
+Parameter sweeps of a strategy: many backtests (grid or random search) spread over a process pool.
+The candles are copied once into one shared memory block, workers read them in place (numpy views), a task
+only sends its parameters, so the cost per backtest does not grow with the history size or the number of workers.
+"""
+import itertools, math, multiprocessing, os, random, time, traceback
+from multiprocessing import shared_memory
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from lib.backtest import Backtest
+from lib.market.candles import COLUMNS
+from lib.market.store import DTYPES, TIMESTAMP_NAME, CandleStore
+
+
+def grid(params: dict) -> list:
+    """Every combination of {name: [values]}"""
+    names = list(params)
+    return [dict(zip(names, values)) for values in itertools.product(*[params[n] for n in names])]
+
+
+def random_search(space: dict, n: int, seed: int = None) -> list:
+    """
+    n random parameter sets of space: {name: [choices] | (low, high)}, (low, high) of ints is an int range
+    (high included), of floats a uniform range
+    """
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(n):
+        sample = {}
+        for name, values in space.items():
+            if isinstance(values, tuple):
+                low, high = values
+                sample[name] = rng.randint(low, high) if isinstance(low, int) and isinstance(high, int) else rng.uniform(low, high)
+            else:
+                sample[name] = rng.choice(list(values))
+        samples.append(sample)
+    return samples
+
+
+class SharedCandles():
+    def __init__(self, series: dict = None, spec: dict = None) -> None:
+        """
+        Candle series in one shared memory block, readable like a CandleStore (read, in)
+        - series: {(symbol, timeframe): (n, 6) rows} to copy in a new block (owner, unlink it when done)
+        - spec: spec() of an existing block to attach to (workers)
+        """
+        if spec is None:
+            layout, size = {}, 0
+            for key, rows in (series or {}).items():
+                layout[key] = (size, len(rows))
+                size += len(rows) * len(COLUMNS) * 8
+            self._shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+            self.owner = True
+            self.layout = layout
+            for key, rows in (series or {}).items():
+                for name, column in self._columns(key).items():
+                    column[:] = rows[:, COLUMNS.index(name)]
+        else:
+            self._shm = shared_memory.SharedMemory(name=spec['name'])
+            self.owner = False
+            self.layout = {tuple(k): tuple(v) for k, v in spec['layout']}
+        self.root = f"shm://{self._shm.name}"
+
+    def __repr__(self):
+        return f"SharedCandles({self.root}, series={len(self.layout)}, size={self._shm.size})"
+
+    @classmethod
+    def from_store(cls, store: CandleStore, symbols: list, timeframes: list, start: int = None, end: int = None) -> 'SharedCandles':
+        """Copy the series of the store that exist, candles opened in [start, end)"""
+        series = {}
+        for symbol in symbols:
+            for timeframe in timeframes:
+                if (symbol, timeframe) in store:
+                    cols = store.read(symbol, timeframe, start, end)
+                    series[(symbol, timeframe)] = np.column_stack([cols[name] for name in COLUMNS]).astype(np.float64)
+        return cls(series)
+
+    def spec(self) -> dict:
+        """Picklable description of the block for attach"""
+        return {'name': self._shm.name, 'layout': [[list(k), list(v)] for k, v in self.layout.items()]}
+
+    def _columns(self, key: tuple) -> dict:
+        offset, rows = self.layout[key]
+        return {
+            name: np.ndarray((rows,), dtype=DTYPES[name], buffer=self._shm.buf, offset=offset + i * rows * 8)
+            for i, name in enumerate(COLUMNS)
+        }
+
+    def __contains__(self, key) -> bool:
+        return tuple(key) in self.layout
+
+    def read(self, symbol: str, timeframe: str, start: int = None, end: int = None) -> dict:
+        """{column: view} of the candles opened in [start, end), no copy"""
+        columns = self._columns((symbol, timeframe))
+        timestamps = columns[TIMESTAMP_NAME]
+        i = 0 if start is None else int(np.searchsorted(timestamps, start, side='left'))
+        j = len(timestamps) if end is None else int(np.searchsorted(timestamps, end, side='left'))
+        return {name: column[i:max(i, j)] for name, column in columns.items()}
+
+    def close(self) -> None:
+        self._shm.close()
+        if self.owner:
+            self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# worker state, set once per process by _init_worker
+_worker = {}
+
+
+def _init_worker(spec: dict, strategy: Callable, indicators: Callable, tokens: list, backtest_kwargs: dict) -> None:
+    _worker.update(
+        candles=SharedCandles(spec=spec),
+        strategy=strategy,
+        indicators=indicators,
+        tokens=tokens,
+        backtest_kwargs=backtest_kwargs,
+    )
+
+
+def _run_one(task: tuple) -> dict:
+    i, params = task
+    start, cpu = time.perf_counter(), time.process_time()
+    try:
+        bt = Backtest(
+            _worker['strategy'](params),
+            _worker['candles'],
+            _worker['tokens'],
+            indicators=_worker['indicators'](params) if _worker['indicators'] else None,
+            **_worker['backtest_kwargs'],
+        )
+        result = bt.run()
+    except Exception as e:
+        result = {'error': f"{e.__class__.__name__}: {e}"}
+        traceback.print_exc()
+    result.update(task=i, pid=os.getpid(), wall=round(time.perf_counter() - start, 3), cpu=round(time.process_time() - cpu, 3))
+    return result
+
+
+class Sweep():
+    def __init__(self, strategy: Callable, candles: SharedCandles, tokens: list, indicators: Callable = None,
+                 processes: int = None, **backtest_kwargs) -> None:
+        """
+        Backtests of one strategy with many parameter sets over a process pool
+        - strategy: strategy(params) -> Strategy, a module level function (sent to the workers)
+        - indicators: indicators(params) -> {column: Indicator} added to the candles, module level function
+        - candles: SharedCandles of the tokens, attached once by every worker
+        - processes: pool size, default all cores
+        - backtest_kwargs: Backtest options, like timeframe, cash, start, end, liquidity
+        """
+        self.strategy = strategy
+        self.indicators = indicators
+        self.candles = candles
+        self.tokens = list(tokens)
+        self.processes = processes or os.cpu_count() or 1
+        self.backtest_kwargs = backtest_kwargs
+        self.elapsed = 0.0
+
+    def __repr__(self):
+        return f"Sweep({getattr(self.strategy, '__name__', self.strategy)}, {self.tokens}, processes={self.processes})"
+
+    def run(self, params: list, rank_by: str = 'return_pct', ascending: bool = False) -> pd.DataFrame:
+        """
+        Backtest every parameter set, return one table of parameters and stats ranked by rank_by
+        (failed runs last, with their error)
+        """
+        start = time.perf_counter()
+        tasks = list(enumerate(params))
+        initargs = (self.candles.spec(), self.strategy, self.indicators, self.tokens, self.backtest_kwargs)
+        with multiprocessing.Pool(min(self.processes, max(len(tasks), 1)), initializer=_init_worker, initargs=initargs) as pool:
+            # one task at a time per worker, backtests of different lengths keep every core busy
+            results = list(pool.imap_unordered(_run_one, tasks, chunksize=1))
+        self.elapsed = time.perf_counter() - start
+
+        rows = []
+        for result in sorted(results, key=lambda r: r['task']):
+            rows.append({**params[result['task']], **result})
+        table = pd.DataFrame(rows)
+        if rank_by in table:
+            table = table.sort_values(rank_by, ascending=ascending, na_position='last', kind='stable')
+            table.insert(0, 'rank', np.arange(1, len(table) + 1))
+        return table.reset_index(drop=True)
+
+    def speedup(self, table: pd.DataFrame) -> float:
+        """CPU time of the backtests over the sweep time, close to processes when it scales"""
+        if not self.elapsed or 'cpu' not in table:
+            return math.nan
+        return float(table['cpu'].sum()) / self.elapsed
@@ -1,4 +1,6 @@
 from abc import ABC, abstractmethod
+import asyncio
+import copy
 import time
 from typing import Optional, Tuple, Union
 import numpy as np
@@ -33,6 +35,105 @@ class OrderPlan():
     def __repr__(self):
         return f"OrderPlan({self.action}, {self.side}, {self.pair})"
 
+class PortfolioSnapshot():
+    def __init__(self, currency:str, holdings:dict, ledger_version:int=None) -> None:
+        """
+        Token balances of the bot valued in currency at one point in time,
+        loaded once by check_balance then shared by update_balance and update_fund
+        - holdings: {symbol: {'qty': qty in the token smallest unit, 'value': value in currency}}
+        """
+        self.currency = currency
+        self.holdings = holdings
+        self.ledger_version = ledger_version
+        self.created_at = time.time()
+
+    def __repr__(self):
+        return f"PortfolioSnapshot(cash={self.cash}, invested={self.invested}, version={self.ledger_version})"
+
+    def age(self) -> float:
+        return time.time() - self.created_at
+
+    def qty(self, symbol:str) -> int:
+        return self.holdings.get(symbol, {}).get('qty', 0)
+
+    def value(self, symbol:str) -> float:
+        return self.holdings.get(symbol, {}).get('value', 0.0)
+
+    @property
+    def cash(self) -> float:
+        return self.value(self.currency)
+
+    @property
+    def invested(self) -> float:
+        """Value of the non currency tokens"""
+        return sum(h['value'] for symbol, h in self.holdings.items() if symbol != self.currency)
+
+    @property
+    def total(self) -> float:
+        return self.cash + self.invested
+
+    def token_balance(self) -> dict:
+        """Copy in the bot._token_balance format"""
+        return {symbol: dict(h) for symbol, h in self.holdings.items()}
+
+class MarketBatch():
+    def __init__(self, symbols:list, timestamps:np.ndarray, fields:dict, last:np.ndarray) -> None:
+        """
+        Market data of many symbols aligned on one time axis, for strategies evaluated on all symbols at once
+        - symbols: row labels, like ['BTCUSDT', 'ETHUSDT']
+        - timestamps: (T,) int64 open time in seconds of every column, increasing
+        - fields: {column: (symbols, T) float64 array}, nan where a symbol has no candle
+        - last: (symbols,) index of the last candle of every symbol, -1 if it has none
+        """
+        self.symbols = list(symbols)
+        self.timestamps = timestamps
+        self.fields = fields
+        self.last_index = last
+
+    def __repr__(self):
+        return f"MarketBatch({len(self.symbols)} symbols x {len(self.timestamps)} times, {list(self.fields)})"
+
+    def __len__(self):
+        return len(self.symbols)
+
+    @classmethod
+    def from_frame(cls, data:pd.DataFrame, symbols:list, columns:list=None) -> 'MarketBatch':
+        """
+        Pivot a get_data frame (rows of timestamp, symbol and numeric columns) in one pass, rows of other symbols are ignored
+        - columns: columns to keep, default every numeric column
+        """
+        if columns is None:
+            columns = [c for c in data.columns if c not in ('timestamp', 'symbol') and pd.api.types.is_numeric_dtype(data[c])]
+        codes = pd.Index(symbols).get_indexer(data['symbol']) if len(data) else np.zeros(0, dtype=np.int64)
+        keep = codes >= 0
+        codes = codes[keep]
+        ts = data['timestamp'].values[keep]
+        if np.issubdtype(ts.dtype, np.datetime64):
+            ts = ts.astype('datetime64[s]').astype(np.int64)
+        timestamps, times = np.unique(ts.astype(np.int64), return_inverse=True)
+        fields = {}
+        for c in columns:
+            field = np.full((len(symbols), len(timestamps)), np.nan)
+            field[codes, times] = data[c].values[keep]
+            fields[c] = field
+        last = np.full(len(symbols), -1, dtype=np.int64)
+        np.maximum.at(last, codes, times)
+        return cls(symbols, timestamps, fields, last)
+
+    def field(self, name:str) -> np.ndarray:
+        """(symbols, T) values of a column"""
+        return self.fields[name]
+
+    def last(self, name:str) -> np.ndarray:
+        """(symbols,) value of a column at the last candle of every symbol"""
+        has = self.last_index >= 0
+        out = np.full(len(self.symbols), np.nan)
+        out[has] = self.fields[name][np.flatnonzero(has), self.last_index[has]]
+        return out
+
+    def has_data(self) -> np.ndarray:
+        return self.last_index >= 0
+
 class BaseBroker(ABC):
     def __init__(self, 
                 spread: float = .0,
@@ -100,6 +201,43 @@ class BaseBroker(ABC):
     def load_account(self, wallet_key:str):
         pass
 
+    def update_orders(self, orders: list, timeout: float = 0) -> list:
+        """
+        Update many orders, brokers can fetch them together. Default one by one
+        """
+        for order in orders:
+            self.update_order(order)
+        return orders
+
+    def external_fills(self, bot: 'TradingBot') -> list:
+        """
+        Orders filled on the bot account outside the bot since the last call, if the broker can see them
+        """
+        return []
+
+    def begin_cycle(self, pairs: list = None):
+        """
+        Called by the bot at the start of a run cycle, brokers can pin a market snapshot here
+        :param pairs: pairs the bot trades in this cycle, like [['USDT', 'BTC'], ...]
+        """
+        pass
+
+    def end_cycle(self):
+        """
+        Called by the bot at the end of a run cycle
+        """
+        pass
+
+    def hold_cycle(self, pairs: list = None):
+        """
+        Start one cycle for many bots (BotHost), brokers keep its snapshot through the bots begin_cycle / end_cycle
+        until release_cycle
+        """
+        pass
+
+    def release_cycle(self):
+        pass
+
 class Order():
     def __init__(self, id:str, category:str, pair:list, side:str, broker:BaseBroker, **kwargs) -> None:
         """
@@ -135,19 +273,29 @@ class Order():
             # print(f"Setting {key} to {value} in Order")
             setattr(self, key, value)
 
-        self.update_info()
+        # async brokers are updated by awaiting order.update_info()
+        if not self.is_async:
+            self.update_info()
     
     def __repr__(self):
         return f"Order({self.id}, {self.category}, {self.symbol}, {self.side}, {self.status}, tx: {getattr(self, 'tx', '')})"
 
+    @property
+    def is_async(self) -> bool:
+        return asyncio.iscoroutinefunction(self._broker.update_order)
+
     def update_info(self, wait_update:bool=False):
-        self._broker.update_order(
+        # return a coroutine with async brokers
+        return self._broker.update_order(
             self,
             wait_update
         )
 
-    def is_filled(self):
-        if self.status not in ['Rejected', 'PartiallyFilledCanceled', 'Filled', 'Cancelled', 'Triggered', 'Deactivated', 'Failed']:
+    def is_final(self) -> bool:
+        return self.status in ['Rejected', 'PartiallyFilledCanceled', 'Filled', 'Cancelled', 'Triggered', 'Deactivated', 'Failed']
+
+    def is_filled(self, refresh:bool=True):
+        if refresh and not self.is_final() and not self.is_async:
             self.update_info()
         if self.status in ['Filled', 'PartiallyFilled', 'PartiallyFilledCanceled']:
             return True
@@ -181,8 +329,8 @@ class Trade():
         self.direction = 'long' if self.open_order.side == 'buy' else 'short'
         self.is_open()
 
-    def is_open(self):
-        if self.open_order.is_filled():
+    def is_open(self, refresh:bool=True):
+        if self.open_order.is_filled(refresh):
             self.invested_amount = self.open_order.amount_in if self.open_order.side == 'buy' else  self.open_order.amount_out
             self.position_size = self.open_order.amount_out if self.open_order.side == 'buy' else  self.open_order.amount_in
             self.entry_price = self.open_order.price
@@ -193,8 +341,8 @@ class Trade():
             self.status = 'open_failed'
         return False
         
-    def is_close(self):
-        if self.close_order.is_filled():
+    def is_close(self, refresh:bool=True):
+        if self.close_order.is_filled(refresh):
             self.net_return = self.close_order.amount_out if self.close_order.side =='sell' else self.close_order.amount_in
             self.profit = self.close_order.amount_out - self.open_order.amount_in if self.direction == 'long' else self.open_order.amount_out - self.close_order.amount_in
             self.exit_price = self.close_order.price
@@ -209,6 +357,8 @@ class Trade():
         return f"Trade({self.id}, {getattr(self.open_order, 'symbol', None)}, {self.direction}, {self.status}, {getattr(self.open_order, 'price', None)}, {getattr(self.close_order, 'price', None)})"
 
 class Strategy(ABC): # base template for strategy
+    batch = False  # True in strategies implementing run_batch, the bot calls it instead of run() per pair
+
     def __init__(self, *args, **kwargs):
         for key, value in kwargs.items():
             setattr(self, key, value)
@@ -233,6 +383,20 @@ class Strategy(ABC): # base template for strategy
         """
         pass
 
+    def run_batch(self, batch: MarketBatch, budgets: np.ndarray, bot: 'TradingBot') -> dict:
+        """
+        Optional: signals of all symbols at once, the bot uses it instead of run() when a strategy implements it
+        :param batch: data of the bot symbols aligned on time (batch.symbols like 'BTCUSDT')
+        :param budgets: (symbols,) budget of every symbol, like the budget of run()
+        :return: {'signal': (symbols,) 1 buy (open), -1 sell (close), 0 nothing,
+                  optional 'qty': currency to spend on buys (default budget), 'price': (default last close)}
+                 or None for no signal
+        """
+        return None
+
+    def has_batch(self) -> bool:
+        return self.batch
+
 class TradingBot():
     def __init__(self, id:str, wallet_key:str, tokens=[], currency:str='USDT', call_budget:float=5, invest_amount:float=10_000,
             balance:float=None, broker: BaseBroker = None, category:str='spot', strategy:Strategy=None, 
@@ -259,6 +423,9 @@ class TradingBot():
         self.account = self._broker.load_account(wallet_key)
         self.db = db # todo: use db to save/load state, write orders and trades and logs
         self._token_balance = {} # todo: use token balance for crypto trading
+        self.portfolio = None  # last PortfolioSnapshot loaded by the broker, if it supports it
+        self.external_orders = []  # swaps of the bot account made outside the bot
+        self.db_writer = None  # DbWriter, if set orders and trades are written by its thread
         for key, value in kwargs.items():
             setattr(self, key, value)
         
@@ -271,53 +438,36 @@ class TradingBot():
 
     def write_order(self, order: Order) -> None:
         """
-        Write order to database or update existing order
+        Write order to database or update existing order, by the db_writer thread if set
         Parameters:
         order : Order
             Order object to write to database
         """
         try:
-            # Check if order already exists in DB
-            existing_order = OrderModel.get_by_id(order.id)
-            if existing_order:
-                # Update existing order
-                existing_order.update(
-                    symbol=order.symbol,
-                    side=order.side,
-                    price=order.price,
-                    token_in=order.token_in,
-                    token_out=order.token_out,
-                    amount_in=order.amount_in,
-                    amount_out=order.amount_out,
-                    type=order.type,
-                    create_time=order.create_time,
-                    filled_time=order.filled_time,
-                    tx=getattr(order, 'tx', None),
-                    tx_link=getattr(order, 'tx_link', None)
-                )
-            else:
-                # Create new order in DB
-                OrderModel.create(
-                    id=order.id,
-                    symbol=order.symbol,
-                    side=order.side,
-                    price=order.price,
-                    token_in=order.token_in,
-                    token_out=order.token_out,
-                    amount_in=order.amount_in,
-                    amount_out=order.amount_out,
-                    type=order.type,
-                    create_time=order.create_time,
-                    filled_time=order.filled_time,
-                    tx=getattr(order, 'tx', None),
-                    tx_link=getattr(order, 'tx_link', None)
-                )
+            # fields read now, the order may change before the writer gets to it
+            fields = {
+                'id': order.id,
+                'symbol': order.symbol,
+                'side': order.side,
+                'price': order.price,
+                'token_in': order.token_in,
+                'token_out': order.token_out,
+                'amount_in': order.amount_in,
+                'amount_out': order.amount_out,
+                'type': order.type,
+                'create_time': order.create_time,
+                'filled_time': order.filled_time,
+                'tx': getattr(order, 'tx', None),
+                'tx_link': getattr(order, 'tx_link', None),
+            }
         except Exception as e:
             print(f"Error writing order to database: {e}")
+            return
+        self.save(self.save_order, fields)
 
     def write_trade(self, trade) -> None:
         """
-        Write trade to database or update existing trade
+        Write trade to database or update existing trade, by the db_writer thread if set
         
         Parameters:
         trade : Trade
@@ -353,19 +503,41 @@ class TradingBot():
                 trade.id = f"{trade.open_order.symbol}{trade.entry_time}"
             
             trade_data['id'] = trade.id
-            
-            # Check if trade already exists in DB
-            existing_trade = TradeModel.get_by_id(trade.id)
-            
+        except Exception as e:
+            print(f"Error writing trade to database: {e}")
+            return
+        self.save(self.save_trade, trade_data)
+
+    def save(self, write, fields: dict) -> None:
+        if self.db_writer is not None:
+            self.db_writer.submit(write, fields)
+        else:
+            write(fields)
+
+    @staticmethod
+    def save_order(fields: dict) -> None:
+        """Insert or update an order row"""
+        try:
+            # Check if order already exists in DB
+            existing_order = OrderModel.get_by_id(fields['id'])
+            if existing_order:
+                existing_order.update(**{k: v for k, v in fields.items() if k != 'id'})
+            else:
+                OrderModel.create(**fields)
+        except Exception as e:
+            print(f"Error writing order to database: {e}")
+
+    @staticmethod
+    def save_trade(fields: dict) -> None:
+        """Insert or update a trade row"""
+        try:
+            existing_trade = TradeModel.get_by_id(fields['id'])
             if existing_trade:
-                # Update existing trade
-                existing_trade.update(**trade_data)
+                existing_trade.update(**fields)
             else:
-                # Create new trade in DB
-                TradeModel.create(**trade_data)
-                
+                TradeModel.create(**fields)
         except Exception as e:
-            print(f"Error writing trade to database: {e}")        
+            print(f"Error writing trade to database: {e}")
 
     def save_state(self) -> None:
         # todo: [unnecessary - do if have free time]
@@ -378,13 +550,16 @@ class TradingBot():
         # load state from DB
         pass
 
-    def update_balance(self):
+    def update_balance(self, max_age:float=0):
         """ Check the balance of the bot
         calcualte the _token_balance then adjust the value of:
         - balance: total amount of money in the bot
         - pending_money: money in open orders
+        :param max_age: reuse the last portfolio snapshot if younger than max_age seconds
         """
-        # check balance, pending_money, _token_balance
+        if self.portfolio is not None and max_age > 0 and self.portfolio.age() <= max_age:
+            return self.balance, self.pending_money
+        # check balance, pending_money, _token_balance (and portfolio if the broker supports it)
         self.balance,self.pending_money = self._broker.check_balance(self)
         
         return self.balance, self.pending_money
@@ -403,11 +578,13 @@ class TradingBot():
                 self.fund[token]['weight'] = weight
         return self.update_fund()
 
-    def update_fund(self):
+    def update_fund(self, portfolio:PortfolioSnapshot=None):
         """
         Update the fund allocation for each token based on weights
         and current token balances
+        :param portfolio: token values to use, default to the snapshot loaded by update_balance
         """
+        portfolio = portfolio or self.portfolio
         t_weight = 0
         for token, info in self.fund.items():
             t_weight += info['weight']
@@ -417,7 +594,10 @@ class TradingBot():
             total = info['weight']*self.invest_amount / t_weight
             
             # Set the invested amount as current token value
-            invested = self._token_balance.get(token, {}).get('value', 0)
+            if portfolio is not None:
+                invested = portfolio.value(token)
+            else:
+                invested = self._token_balance.get(token, {}).get('value', 0)
             
             # Calculate remaining cash allocation
             cash = total - invested
@@ -432,10 +612,16 @@ class TradingBot():
         
         return self.fund
     
-    def checking_orders(self):
+    def pending_orders(self) -> list:
+        """Orders of the opening / closing trades that are not done yet"""
+        orders = [t.open_order for t in self.process_trades['opening']] + [t.close_order for t in self.process_trades['closing']]
+        return [o for o in orders if o is not None and not o.is_final()]
+
+    def checking_orders(self, timeout:float=0):
         """
         Check and process trades in opening, closing, and waiting queues
         Updates trade status, fund allocations, and balances
+        :param timeout: wait up to timeout seconds for the pending orders to be confirmed
         """
         current_time = time.time()
         # Check waiting orders (limit orders with time constraints)
@@ -499,9 +685,33 @@ class TradingBot():
                         self.process_trades['waiting'].remove(trade)
                         self.open_trades[symbol].remove(trade)
 
+        # all pending orders are updated together
+        self._broker.update_orders(self.pending_orders(), timeout=timeout)
+        self.check_external_fills()
+        return self.settle_trades(refresh=False)
+
+    def check_external_fills(self) -> list:
+        """Swaps of the bot account made outside the bot, the balance is reloaded when there are some"""
+        try:
+            orders = self._broker.external_fills(self)
+        except Exception as e:
+            print(f"Error checking external fills: {e}")
+            return []
+        if orders:
+            print(f"External fills: {orders}")
+            self.external_orders.extend(orders)
+            self.update_balance()
+        return orders
+
+    def settle_trades(self, refresh:bool=True):
+        """
+        Move opening / closing trades whose orders are done to open_trades / history_trades
+        and update fund allocations and balances
+        :param refresh: update each order from the broker, False when orders are already updated
+        """
         # Check opening trades (standard logic)
         for trade in self.process_trades['opening'][:]:
-            if trade.is_open():
+            if trade.is_open(refresh):
                 # Get token from pair
                 token = trade.open_order.token_out if trade.open_order.side == 'buy' else trade.open_order.token_in
                 symbol = trade.open_order.symbol
@@ -555,7 +765,7 @@ class TradingBot():
 
         # Check closing trades (standard logic)
         for trade in self.process_trades['closing'][:]:
-            if trade.is_close():
+            if trade.is_close(refresh):
                 # Get token from trade
                 token = trade.open_order.token_out if trade.open_order.side == 'buy' else trade.open_order.token_in
                 
@@ -606,6 +816,25 @@ class TradingBot():
         order_plan : OrderPlan
             Complete order plan with all necessary details
         """
+        trade = self.reserve_fund(order_plan)
+
+        # Check if this is a market order or limit order with time constraint
+        order_type = getattr(order_plan, 'order_type', 'market')
+        
+        if order_type == 'market':
+            # Market order - process immediately
+            order = self._broker.place_order(order_plan, self)
+            trade.set_open_order(order)
+            self.process_trades['opening'].append(trade)
+        else:
+            self.wait_trade(trade, order_plan)
+        return trade
+
+    def reserve_fund(self, order_plan) -> Trade:
+        """
+        Move the estimated amount of an open order plan from cash to pending
+        and create the trade for it
+        """
         if not isinstance(order_plan, OrderPlan):
             raise TypeError("order_plan must be an instance of OrderPlan")
         
@@ -628,17 +857,12 @@ class TradingBot():
         self.fund[token]['pending'] += estimated_amount
 
         # Create a trade object
-        trade = Trade(id=str(ulid.new()), broker=self._broker)
+        return Trade(id=str(ulid.new()), broker=self._broker)
 
-        # Check if this is a market order or limit order with time constraint
+    def wait_trade(self, trade:Trade, order_plan) -> Trade:
+        """Queue a limit open order until its price or timeout"""
         order_type = getattr(order_plan, 'order_type', 'market')
-        
-        if order_type == 'market':
-            # Market order - process immediately
-            order = self._broker.place_order(order_plan, self)
-            trade.set_open_order(order)
-            self.process_trades['opening'].append(trade)
-        elif order_type == 'limit':
+        if order_type == 'limit':
             time_limit = getattr(order_plan, 'time_limit', self.default_order_timeout)
             order_plan.exp_time = time.time() + time_limit
             # Limit order with time constraint
@@ -662,26 +886,7 @@ class TradingBot():
         Trade or list of Trades
             The closed trade(s)
         """
-        trades_to_close = []
-        if trade is not None:
-            trades_to_close = [trade]
-            symbol = trade.open_order.symbol
-        elif order_plan is not None:
-            symbol = ''.join(order_plan.pair[::-1])
-            trade_id = getattr(order_plan, 'trade_id', None)
-            
-            # If trade_id is specified in order_plan, close that specific trade
-            if trade_id is not None:
-                for trades in self.open_trades.get(symbol, []):
-                    for trade in trades:
-                        if trade.id == trade_id:
-                            trades_to_close = [trade]
-                            break
-            # Otherwise close trades for the symbol
-            else:
-                trades_to_close = self.open_trades.get(symbol, []).copy()
-        else:
-            raise ValueError("Either trade or order_plan must be provided to close trades")
+        symbol, trades_to_close = self.select_close_trades(trade, order_plan)
         
         print("To_close: ", trades_to_close)
         # if no trades to close, return empty list
@@ -691,27 +896,7 @@ class TradingBot():
         # Close the trades
         closed_trades = []
         for trade in trades_to_close:
-            # Get the token for updating fund allocation
-            token = trade.open_order.token_out if trade.open_order.side == 'buy' else trade.open_order.token_in
-
-            close_op = None
-
-            print("open_order: ", trades_to_close[0].open_order.amount_out)
-
-            # create a close order plan if not provided
-            if order_plan is None:
-                o_side = trades_to_close[0].open_order.side
-                c_side = 'sell' if o_side == 'buy' else 'buy'
-                close_op = OrderPlan(
-                    action='close',
-                    side=c_side,
-                    pair=trades_to_close[0].open_order.pair,
-                    order_type='market',  # Default to market order
-                    qty=trade.open_order.amount_out # amount base token
-                )
-            else:
-                close_op = order_plan # .copy()  # Create a copy of the order_plan to avoid modifying the original
-                close_op.qty = trade.open_order.amount_out
+            close_op = self.close_order_plan(trade, trades_to_close, order_plan)
 
             # Check if this is a market order or limit order with time constraint
             order_type = getattr(close_op, 'order_type', 'market')
@@ -730,16 +915,68 @@ class TradingBot():
                 # Add the trade to waiting queue for closing
                 self.process_trades['waiting'].append(trade)
             
-            # Remove from open_trades
-            if symbol in self.open_trades and trade in self.open_trades[symbol]:
-                try:
-                    self.open_trades[symbol].remove(trade)
-                except Exception as e:
-                    print(f"Error removing trade {trade.id} from open_trades: {e}")
-                
+            self.remove_open_trade(symbol, trade)
             closed_trades.append(trade)
         
         return closed_trades if len(closed_trades) > 1 else closed_trades[0] if closed_trades else None
+
+    def select_close_trades(self, trade:Trade=None, order_plan:OrderPlan=None) -> Tuple[str, list]:
+        """
+        Return the symbol and the open trades to close for a trade or an order plan
+        """
+        trades_to_close = []
+        if trade is not None:
+            trades_to_close = [trade]
+            symbol = trade.open_order.symbol
+        elif order_plan is not None:
+            symbol = ''.join(order_plan.pair[::-1])
+            trade_id = getattr(order_plan, 'trade_id', None)
+            
+            # If trade_id is specified in order_plan, close that specific trade
+            if trade_id is not None:
+                for trades in self.open_trades.get(symbol, []):
+                    for trade in trades:
+                        if trade.id == trade_id:
+                            trades_to_close = [trade]
+                            break
+            # Otherwise close trades for the symbol
+            else:
+                trades_to_close = self.open_trades.get(symbol, []).copy()
+        else:
+            raise ValueError("Either trade or order_plan must be provided to close trades")
+        return symbol, trades_to_close
+
+    def close_order_plan(self, trade:Trade, trades_to_close:list, order_plan:OrderPlan=None) -> OrderPlan:
+        """
+        Order plan to close a trade, built from its open order if order_plan is not provided
+        """
+        close_op = None
+
+        print("open_order: ", trades_to_close[0].open_order.amount_out)
+
+        # create a close order plan if not provided
+        if order_plan is None:
+            o_side = trades_to_close[0].open_order.side
+            c_side = 'sell' if o_side == 'buy' else 'buy'
+            close_op = OrderPlan(
+                action='close',
+                side=c_side,
+                pair=trades_to_close[0].open_order.pair,
+                order_type='market',  # Default to market order
+                qty=trade.open_order.amount_out # amount base token
+            )
+        else:
+            close_op = order_plan # .copy()  # Create a copy of the order_plan to avoid modifying the original
+            close_op.qty = trade.open_order.amount_out
+        return close_op
+
+    def remove_open_trade(self, symbol:str, trade:Trade) -> None:
+        # Remove from open_trades
+        if symbol in self.open_trades and trade in self.open_trades[symbol]:
+            try:
+                self.open_trades[symbol].remove(trade)
+            except Exception as e:
+                print(f"Error removing trade {trade.id} from open_trades: {e}")
     
     def buy(self, pair:list, price:float, qty:float, estimated_amount, **kwargs) -> Trade:
         order_plan = OrderPlan(
@@ -844,20 +1081,43 @@ class TradingBot():
             print(f"Error getting market data: {e}")
             return []
 
+        # quotes of this cycle read one market snapshot
+        try:
+            self._broker.begin_cycle(pairs=[[self.currency, t] for t in self.tokens])
+        except Exception as e:
+            print(f"Error pinning market snapshot: {e}")
+        try:
+            self.run_strategy(data)
+            # process order_queue
+            return self.process_orders()
+        finally:
+            self._broker.end_cycle()
+
+    def budget(self, token:str) -> float:
+        """Budget of one strategy call for a token"""
+        if self.call_budget < 1:
+            return self.fund[token]['cash'] * self.call_budget
+        return min(self.fund[token]['cash'], self.call_budget)
+
+    def run_strategy(self, data: pd.DataFrame):
+        """
+        Run the strategy on every token pair, or on all of them at once if it implements run_batch
+        """
+        if self.strategy.has_batch():
+            return self.run_batch(data)
+        # rows of every symbol found in one pass, not one scan of the data per token
+        groups = data.groupby('symbol', sort=False).indices if len(data) and 'symbol' in data else {}
+        print(self.call_budget, self.fund)
         # check run trade strategy for each token pairs
         for t in self.tokens:
             # symbol base + quote, like 'BTCUSDT'
             symbol = t + self.currency
-            df = data[data['symbol'] == symbol]  # todo: should be processed in better way, symbols should not be create here
-            if df.empty:
+            if symbol not in groups:
                 print(f"No data for symbol {symbol}: please check your strategy.get_data() implementation")
                 continue
+            df = data.take(groups[symbol])
             pair = [self.currency, t]
-            print(self.call_budget, self.fund)
-            if self.call_budget < 1:
-                budget = self.fund[t]['cash'] * self.call_budget
-            else:
-                budget = min(self.fund[t]['cash'], self.call_budget)
+            budget = self.budget(t)
                 
             # run strategy to get order_queue
             print(f"Running strategy for pair {pair} with budget {budget}")
@@ -872,7 +1132,223 @@ class TradingBot():
             #         self.order_queue.append(order_plan)
             #     else:
             #         raise TypeError("Order plan must be an instance of OrderPlan class")
-        # process order_queue
-        return self.process_orders()
 
- 
\ No newline at end of file
+    def run_batch(self, data: pd.DataFrame) -> list:
+        """
+        Evaluate the strategy on all tokens in one run_batch call then send the order plans of its signals
+        Returns:
+        list
+            tokens with a signal
+        """
+        symbols = [t + self.currency for t in self.tokens]
+        batch = MarketBatch.from_frame(data, symbols)
+        budgets = np.array([self.budget(t) for t in self.tokens], dtype=np.float64)
+        result = self.strategy.run_batch(batch, budgets, self)
+        if result is None:
+            return []
+        signal = np.asarray(result['signal'])
+        qty = np.asarray(result['qty'], dtype=np.float64) if result.get('qty') is not None else budgets
+        price = np.asarray(result['price'], dtype=np.float64) if result.get('price') is not None else batch.last('close')
+        signaled = []
+        for i in np.flatnonzero((signal != 0) & batch.has_data()):
+            token = self.tokens[i]
+            pair = [self.currency, token]
+            try:
+                if signal[i] > 0:
+                    if not qty[i] > 0:
+                        continue
+                    print(f"Buy signal for {pair} at price {price[i]}, qty {qty[i]}")
+                    self.buy(pair=pair, price=float(price[i]), qty=float(qty[i]), estimated_amount=float(qty[i]))
+                else:
+                    print(f"Sell signal for {pair} at price {price[i]}")
+                    self.sell(pair=pair, price=float(price[i]))
+                signaled.append(token)
+            except Exception as e:
+                print(f"Error sending {pair} signal: {e}")
+        return signaled
+
+
+class AsyncTradingBot(TradingBot):
+    """
+    TradingBot with an async cycle for async brokers (like AsyncPancakeBroker).
+    Strategy signals of all tokens are queued then placed and confirmed concurrently.
+    Waiting (limit) orders are not processed by the async cycle yet.
+    Await `bot.start()` once before the first cycle to load the balance.
+    """
+    def update_balance(self, max_age:float=0):
+        # the broker is async, balance is loaded by refresh_balance
+        return self.balance, self.pending_money
+
+    async def refresh_balance(self, max_age:float=0):
+        if self.portfolio is not None and max_age > 0 and self.portfolio.age() <= max_age:
+            return self.balance, self.pending_money
+        self.balance, self.pending_money = await self._broker.check_balance(self)
+        return self.balance, self.pending_money
+
+    async def start(self):
+        await self.refresh_balance()
+        return self.update_fund()
+
+    def buy(self, pair:list, price:float, qty:float, estimated_amount, **kwargs) -> OrderPlan:
+        order_plan = OrderPlan(
+                pair=pair,
+                side='buy',
+                action='open',
+                qty=qty,
+                price=price,
+                estimated_amount=estimated_amount
+        )
+        self.order_queue.append(order_plan)
+        return order_plan
+
+    def sell(self, pair:list, price:float, qty:float=None, estimated_amount=None, **kwargs) -> OrderPlan:
+        order_plan = OrderPlan(
+            pair=pair,
+            side='sell',
+            action='close',
+            qty=qty,
+            price=price,
+            estimated_amount=estimated_amount
+        )
+        self.order_queue.append(order_plan)
+        return order_plan
+
+    async def open_trade(self, order_plan) -> Trade:
+        trade = self.reserve_fund(order_plan)
+
+        order_type = getattr(order_plan, 'order_type', 'market')
+        if order_type == 'market':
+            order = await self._broker.place_order(order_plan, self)
+            if order is None:
+                # order failed, the reserved amount goes back to cash and the trade is dropped
+                print(f"Open order failed for {order_plan}")
+                token = order_plan.pair[1] if order_plan.side == 'buy' else order_plan.pair[0]
+                estimated_amount = getattr(order_plan, 'estimated_amount', 0)
+                if token in self.fund and estimated_amount:
+                    self.fund[token]['pending'] -= estimated_amount
+                    self.fund[token]['cash'] += estimated_amount
+                return None
+            trade.set_open_order(order)
+            self.process_trades['opening'].append(trade)
+        else:
+            self.wait_trade(trade, order_plan)
+        return trade
+
+    async def close_trade(self, trade:Trade=None, order_plan:OrderPlan=None) -> Union[Trade, list]:
+        symbol, trades_to_close = self.select_close_trades(trade, order_plan)
+        print("To_close: ", trades_to_close)
+        if len(trades_to_close) == 0:
+            return []
+
+        market, closed_trades = [], []
+        for trade in trades_to_close:
+            # orders are placed together, each trade needs its own plan
+            close_op = self.close_order_plan(trade, trades_to_close, copy.copy(order_plan) if order_plan is not None else None)
+
+            order_type = getattr(close_op, 'order_type', 'market')
+            time_limit = getattr(close_op, 'time_limit', None)
+            if order_type == 'market' or time_limit is None:
+                market.append((trade, close_op))
+            else:
+                trade.order_plan = close_op
+                trade.order_plan.status = 'waiting'
+                self.process_trades['waiting'].append(trade)
+
+            self.remove_open_trade(symbol, trade)
+            closed_trades.append(trade)
+
+        orders = await asyncio.gather(*[self._broker.place_order(close_op, self) for trade, close_op in market])
+        for (trade, close_op), order in zip(market, orders):
+            if order is None:
+                # order failed, keep the trade open
+                print(f"Close order failed for trade {trade.id}")
+                self.open_trades.setdefault(symbol, []).append(trade)
+                closed_trades.remove(trade)
+                continue
+            trade.set_close_order(order)
+            self.process_trades['closing'].append(trade)
+
+        return closed_trades if len(closed_trades) > 1 else closed_trades[0] if closed_trades else None
+
+    async def process_order_plan(self, order_plan: OrderPlan):
+        if not isinstance(order_plan, OrderPlan):
+            raise TypeError("Items in order queue must be OrderPlan instances")
+        if order_plan.action == 'open':
+            return await self.open_trade(order_plan=order_plan)
+        elif order_plan.action == 'close':
+            return await self.close_trade(order_plan=order_plan)
+        raise ValueError(f"Unknown action {order_plan.action} in order plan")
+
+    async def process_orders(self):
+        """
+        Place all order plans of the order queue concurrently
+        Returns:
+        list
+            Processed trades
+        """
+        order_queue = list(self.order_queue)
+        self.order_queue.clear()
+        if len(order_queue) > 0:
+            print("Processing order queue:", order_queue)
+
+        processed_trades = []
+        results = await asyncio.gather(*[self.process_order_plan(p) for p in order_queue], return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"Error processing order plan: {result}")
+            elif isinstance(result, list):
+                processed_trades.extend(result)
+            elif result is not None:
+                processed_trades.append(result)
+        return processed_trades
+
+    async def checking_orders(self, timeout:float=0):
+        """
+        Update every opening / closing order concurrently then settle the trades
+        """
+        pending = self.pending_orders()
+        if asyncio.iscoroutinefunction(self._broker.update_orders):
+            await self._broker.update_orders(pending, timeout=timeout)
+        else:
+            await asyncio.gather(*[o.update_info() for o in pending], return_exceptions=True)
+        await self.check_external_fills()
+        return self.settle_trades(refresh=False)
+
+    async def check_external_fills(self) -> list:
+        try:
+            orders = self._broker.external_fills(self)
+            if asyncio.iscoroutine(orders):
+                orders = await orders
+        except Exception as e:
+            print(f"Error checking external fills: {e}")
+            return []
+        if orders:
+            print(f"External fills: {orders}")
+            self.external_orders.extend(orders)
+            await self.refresh_balance()
+        return orders
+
+    async def run(self):
+        """
+        Run the strategy, place and return the processed trades
+        """
+        if self.strategy is None:
+            raise ValueError("Strategy is not set")
+        if not isinstance(self.strategy, Strategy):
+            raise TypeError("Strategy must be an instance of Strategy class")
+
+        try:
+            data = await asyncio.to_thread(self.strategy.get_data, tokens=self.tokens, currency=self.currency)
+        except Exception as e:
+            print(f"Error getting market data: {e}")
+            return []
+
+        try:
+            await self._broker.begin_cycle(pairs=[[self.currency, t] for t in self.tokens])
+        except Exception as e:
+            print(f"Error pinning market snapshot: {e}")
+        try:
+            self.run_strategy(data)
+            return await self.process_orders()
+        finally:
+            await self._broker.end_cycle()
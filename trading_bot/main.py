@@ -1,36 +1,197 @@
+import asyncio
 from datetime import datetime
 import json
 from shlex import quote
 import sys
+import threading
 import time
 from apscheduler.schedulers.blocking import BlockingScheduler
 
+import numpy as np
 import pandas as pd
-import requests
-import talib
 import yaml
 from db import init_db
-from lib.trading import Order, Trade, TradingBot, Strategy,OrderPlan
-from lib.broker.dex.aptos_pancake import PancakeBroker
+from lib.trading import AsyncTradingBot, MarketBatch, Order, Trade, TradingBot, Strategy,OrderPlan
+from lib.broker.dex.aptos_pancake import AsyncPancakeBroker, PancakeBroker, bg_loop, run_async
+from lib.host import BotHost, DbWriter
+from lib.market.candles import COLUMNS, TIMEFRAMES, TIMESTAMP, CandleCache
+from lib.market.indicators import RSI, IndicatorSet, IndicatorStore
+from lib.market.onchain import OnchainCandleBuilder
+from lib.market.resample import Resampler
+from lib.market.store import CandleStore
+from lib.market.trigger import CandleCloseTrigger
+from lib.market.gecko import GeckoTerminalClient
 from db.connection import get_engine, get_session
 from db.models.order import Order as OrderModel
 from db.models.trade import Trade as TradeModel
 
 current = time.time()
 
+class MarketData():
+    def __init__(self, interval: str = '5m', store_path: str = 'data/candles', fresh: float = 30.0) -> None:
+        """
+        Candles of the pools, kept in memory and on disk, shared by every strategy of the process (see BotHost)
+        - fresh: candles of a token downloaded less than fresh seconds ago are reused (the other bots of a cycle)
+        """
+        ts = TIMEFRAMES.get(interval)
+        if ts is None:
+            raise ValueError(f"Unsupported interval: {interval}")
+        self.interval = interval
+        self.ts = ts
+        self.pools = {
+            "APT":["0x925660b8618394809f89f8002e2926600c775221f43bf1919782b297a79400d8", 'quote'],
+            "CAKE":["0xc7efb4076dbe143cbcd98cfaaa929ecfc8f299203dfff63b95ccb6bfe19850fa::swap::TokenPairReserve<0x159df6b7689437016108a019fd5bef736bac692b6d4a1f10c941f6fbb9a74ca6::oft::CakeOFT, 0xf22bede237a07e121b56d91a491eb7bcdfd1f5907926a9e58338f964a01b17fa::asset::USDC>", 'base'],
+            "WETH":["0x31a6675cbe84365bf2b0cbce617ece6c47023ef70826533bde5203d32171dc3c::swap::TokenPairReserve<0xf22bede237a07e121b56d91a491eb7bcdfd1f5907926a9e58338f964a01b17fa::asset::USDC, 0xf22bede237a07e121b56d91a491eb7bcdfd1f5907926a9e58338f964a01b17fa::asset::WETH>", 'base'],
+        }
+        # one connection pool and rate limit for all GeckoTerminal requests
+        self.gecko = GeckoTerminalClient(network='aptos')
+        # candles are kept between cycles, a cycle only downloads the candles since the last one
+        self.candles = CandleCache(self.fetch_ohlcv, capacity=300, step=300)
+        # OnchainCandleBuilder, if set the candles of its markets are built from the router swaps, kept apart (see series)
+        self.onchain = None
+        # candles are also kept on disk, a restart only downloads the candles since the last run
+        self.store = CandleStore(store_path)
+        for token in self.pools:
+            self._load(token)
+        # higher timeframes are resampled from the closed candles of interval, no extra download
+        self.timeframes = [t for t in ['15m', '1h', '4h', '1d'] if TIMEFRAMES[t] > ts]
+        self.resamplers = {}
+        self.fresh = fresh
+        self._fetched = {}  # token -> time of its last download
+        # strategies of many bots update and read the candles from their own thread
+        self.lock = threading.RLock()
+
+    def __repr__(self):
+        return f"MarketData({self.interval}, pools={list(self.pools)}, onchain={self.onchain is not None})"
+
+    def series(self, token: str) -> str:
+        """
+        Key of the token candles in the buffers, the store and the indicators
+        onchain candles are priced in the router pair currency, GeckoTerminal candles come from another pool in USD,
+        the two series are never mixed
+        """
+        if self.onchain is not None and token in self.onchain.markets:
+            return f"{token}@onchain"
+        return token
+
+    def _load(self, key: str) -> None:
+        """Candles of the series saved by the last run, once"""
+        if key not in self.candles and (key, self.interval) in self.store:
+            self.candles.merge(key, self.store.series(key, self.interval).tail(self.candles.capacity))
+
+    def resampler(self, key: str) -> Resampler:
+        if key not in self.resamplers:
+            self.resamplers[key] = Resampler(self.ts, self.timeframes)
+            for timeframe in self.timeframes:
+                if (key, timeframe) in self.store:
+                    self.resamplers[key].buffers[timeframe].update(self.store.series(key, timeframe).tail(500))
+        return self.resamplers[key]
+
+    def timeframe(self, token: str, timeframe: str, n: int = None) -> pd.DataFrame:
+        """Closed candles of a higher timeframe of the token, updated by update()"""
+        return self.resampler(self.series(token)).frame(timeframe, n)
+
+    async def fetch_ohlcv(self, token: str, limit: int, before_timestamp: int) -> list:
+        """
+        Last limit 5m candles of the token pool from GeckoTerminal, [timestamp, open, high, low, close, volume] rows
+        """
+        return await self.gecko.ohlcv(
+            self.pools[token][0],
+            timeframe='minute',
+            aggregate=5, # time period to aggregate for each ohlcv 
+            limit=limit, # number of intervals to return, max 1000
+            before_timestamp=before_timestamp, # end time in seconds, should be current time
+            token=self.pools[token][1], # return ohlcv for quote or base default is base
+        )
+
+    def save_candles(self, token: str, timeframe: str, candles) -> None:
+        if len(candles) == 0:
+            return
+        try:
+            self.store.append(token, timeframe, candles)
+        except OSError as e:
+            print(f"Error saving {token} {timeframe} candles: {e}")
+
+    def candle_ready(self, tokens: list, close_ts: int) -> bool:
+        """
+        True when the candle ending at close_ts can be read for the tokens (CandleCloseTrigger.ready)
+        onchain candles are closed by the builder, GeckoTerminal candles are final once the next one exists
+        """
+        if self.onchain is not None:
+            onchain = [t for t in tokens if t in self.onchain.markets]
+            if any((self.onchain.closed_until(t, self.ts) or 0) < close_ts for t in onchain):
+                return False
+            tokens = [t for t in tokens if t not in onchain]
+        # one pool is enough to know GeckoTerminal has the new candles, less calls under the rate limit
+        probe = [t for t in tokens if t in self.pools][:1]
+        if not probe:
+            return True
+        with self.lock:
+            buffers, errors = run_async(self.candles.refresh_many(probe), timeout=30)
+            # the update() that follows reuses the probe candles
+            for token in buffers:
+                self._fetched[token] = time.time()
+        if errors:
+            return False
+        return all((b.last_timestamp or 0) >= close_ts for b in buffers.values())
+
+    def update(self, tokens: list) -> tuple:
+        """
+        Bring the candles of the tokens up to date, a token whose candles can not be fetched is left out
+        return ({token: CandleBuffer}, tokens whose last candle is closed)
+        """
+        with self.lock:
+            now = time.time()
+            fetch, buffers, closed = [t for t in tokens if t in self.pools], {}, set()
+            if self.onchain is not None:
+                # closed candles built from the swap events, no need to wait for GeckoTerminal
+                for token in tokens:
+                    if token not in self.onchain.markets:
+                        continue
+                    key = self.series(token)
+                    self._load(key)
+                    candles = self.onchain.take(token, self.ts)
+                    if candles:
+                        self.candles.merge(key, candles)
+                        self.save_resampled(key, self.candles.buffer(key), True)
+                    self.save_candles(key, '1m', self.onchain.take(token, 60))
+                    # left out until the builder closed a first candle
+                    if len(self.candles.buffer(key)):
+                        buffers[token] = self.candles.buffer(key)
+                        closed.add(token)
+                fetch = [t for t in fetch if t not in self.onchain.markets]
+            # downloaded by another bot of this cycle
+            reuse = [t for t in fetch if now - self._fetched.get(t, 0) < self.fresh]
+            fetch = [t for t in fetch if t not in reuse]
+            # all pools are fetched together, only the candles since the last cycle are downloaded
+            fetched, errors = run_async(self.candles.refresh_many(fetch), timeout=60) if fetch else ({}, {})
+            for token, e in errors.items():
+                print(f"Error getting candles of {token}: {e}")
+            for token, buffer in fetched.items():
+                self._fetched[token] = now
+                self.save_resampled(token, buffer, False)
+            buffers.update(fetched)
+            buffers.update({t: self.candles.buffer(t) for t in reuse})
+            return buffers, closed
+
+    def save_resampled(self, key: str, buffer, closed: bool) -> None:
+        """Save the candles of a series and the higher timeframe candles they close"""
+        self.save_candles(key, self.interval, buffer.view())
+        bars = self.resampler(key).update(buffer.view() if closed else buffer.view()[:-1])
+        for timeframe, rows in bars.items():
+            self.save_candles(key, timeframe, rows)
+
+
 class MyStrategy(Strategy):
-    def __init__(self, interval:str, db_engine):
+    batch = True  # signals of all tokens at once, see run_batch
+
+    def __init__(self, interval:str, db_engine, market: MarketData = None, name: str = None):
+        """
+        - market: candles shared with other strategies, a new MarketData by default
+        - name: strategies of one process need different names, their indicator states are saved apart
+        """
         # order -> add parent trade id | state new / open / closed
         self.order_queue = []
-        tf = {
-            '1m': 60,
-            '5m': 300,
-            '15m': 900,
-            '1h': 3600,
-            '4h': 14400,
-            '1d': 86400,
-            '1D': 86400,
-        }
         tables = {
             'p5m': 'proddb.coin_prices_5m',
             'p1h': 'proddb.coin_prices',
@@ -47,7 +208,7 @@ class MyStrategy(Strategy):
             'predict': 'proddb.coin_predictions',
             'predict_test': 'test.coin_predictions',
             }
-        ts = tf.get(interval)
+        ts = TIMEFRAMES.get(interval)
         table = tables.get(f'f{interval}')
         if ts is None or table is None:
             raise ValueError(f"Unsupported interval: {interval}")
@@ -58,59 +219,59 @@ class MyStrategy(Strategy):
             table=table,
             db_engine=db_engine)
 
+        self.market = market or MarketData(interval)
+        if self.market.ts != ts:
+            raise ValueError(f"{self.market} candles are not {interval} candles")
+        self.window = 30  # candles given to run()
+        # indicators are updated from the new candles only, their state survives restarts
+        self.rsi_period = 14
+        self.rsi_buy = 25   # open below
+        self.rsi_sell = 70  # close above
+        self.indicator_store = IndicatorStore(f'state/indicators_{interval}.json' if name is None else f'state/indicators_{name}_{interval}.json')
+        self.indicators = {}
+        self._saved_indicators = self.indicator_store.load()
+
+    def timeframe(self, token: str, timeframe: str, n: int = None) -> pd.DataFrame:
+        """Closed candles of a higher timeframe of the token, updated by get_data"""
+        return self.market.timeframe(token, timeframe, n)
+
+    def indicator_set(self, key: str) -> IndicatorSet:
+        """Indicators of a candle series (MarketData.series), onchain and GeckoTerminal prices have their own"""
+        if key not in self.indicators:
+            self.indicators[key] = IndicatorSet({f'rsi{self.rsi_period}': RSI(self.rsi_period)}, step=self.ts)
+            if key in self._saved_indicators:
+                self.indicators[key].load(self._saved_indicators[key])
+        return self.indicators[key]
+
+    def candle_ready(self, tokens: list, close_ts: int) -> bool:
+        return self.market.candle_ready(tokens, close_ts)
+
     def get_data(self, tokens: list, currency: str) -> pd.DataFrame:
         """
-        Get market data for the given tokens
+        Get market data for the given tokens, a token whose candles can not be fetched is left out of this cycle
         """
-        current = int(time.time()) + 5
-
-        networks = 'aptos'
-        timeframe = 'minute'
-        api_url = "https://api.geckoterminal.com/api/v2/networks/{networks}/pools/{pool}/ohlcv/{timeframe}"
-        params = {
-            "aggregate":5, # time period to aggregate for each ohlcv 
-            "before_timestamp":current, # end time in seconds, should be current time
-            "limit":30, # number of intervals to return, max 1000
-            "currency": "usd",
-            "include_empty_intervals": "true", # populate the OHLCV values for empty intervals (default: false)
-            "token": "base" # return ohlcv for quote or base default is base
-        }
-
-        pools = {
-            "APT":["0x925660b8618394809f89f8002e2926600c775221f43bf1919782b297a79400d8", 'quote'],
-            "CAKE":["0xc7efb4076dbe143cbcd98cfaaa929ecfc8f299203dfff63b95ccb6bfe19850fa::swap::TokenPairReserve<0x159df6b7689437016108a019fd5bef736bac692b6d4a1f10c941f6fbb9a74ca6::oft::CakeOFT, 0xf22bede237a07e121b56d91a491eb7bcdfd1f5907926a9e58338f964a01b17fa::asset::USDC>", 'base'],
-            "WETH":["0x31a6675cbe84365bf2b0cbce617ece6c47023ef70826533bde5203d32171dc3c::swap::TokenPairReserve<0xf22bede237a07e121b56d91a491eb7bcdfd1f5907926a9e58338f964a01b17fa::asset::USDC, 0xf22bede237a07e121b56d91a491eb7bcdfd1f5907926a9e58338f964a01b17fa::asset::WETH>", 'base'],
-        }
-        
-        rsi_period = 14
+        rsi_period = self.rsi_period
         data = []
-        for token in tokens:
-            params["token"] = pools[token][1]
-            
-            response = requests.get(
-                api_url.format(networks=networks, pool=pools[token][0], timeframe=timeframe),
-                params=params,
-                headers={
-                    'Accept': 'application/json',
-                    'Content-Type': 'application/json',
-                }
-            )
-            if response.status_code != 200:
-                raise Exception(f"Error {response.status_code}: {response.text}")
-
-            # Parse OHLCV
-            raw_data = response.json()
-            candles = raw_data.get("data", {}).get("attributes", {}).get("ohlcv_list", [])
-
-            # Create DataFrame
-            df = pd.DataFrame(candles, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-            df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
-            df[['open', 'high', 'low', 'close', 'volume']] = df[['open', 'high', 'low', 'close', 'volume']].astype(float)
-
-            # Calculate RSI
-            df[f'rsi{rsi_period}'] = talib.RSI(df['close'], timeperiod=rsi_period)
-            df['symbol'] = token+currency  # Assuming single token for simplicity
-            data.append(df)
+        # the shared buffers are not changed by another bot while they are read
+        with self.market.lock:
+            buffers, closed = self.market.update(tokens)
+            for token in tokens:
+                if token not in buffers:
+                    continue
+                df = buffers[token].frame(self.window)
+
+                # RSI from the candles since the last cycle, the last GeckoTerminal candle may still be forming
+                indicators = self.indicator_set(self.market.series(token))
+                indicators.sync(buffers[token].view(), closed=token in closed)
+                df[f'rsi{rsi_period}'] = indicators.column(f'rsi{rsi_period}', buffers[token].view(self.window)[:, TIMESTAMP])
+                df['symbol'] = token+currency  # Assuming single token for simplicity
+                data.append(df)
+        try:
+            self.indicator_store.save(self.indicators)
+        except OSError as e:
+            print(f"Error saving indicator state: {e}")
+        if not data:
+            return pd.DataFrame(columns=COLUMNS + [f'rsi{rsi_period}', 'symbol'])
         # Concatenate all dataframes
         result_df = pd.concat(data, ignore_index=True)
         return result_df
@@ -118,13 +279,13 @@ class MyStrategy(Strategy):
     def run(self, pair: list, data: pd.DataFrame, budget: float, bot: TradingBot) -> OrderPlan | None:
         """
         chu cycle: 5m
-        open: rsi14 < 25
-        close: rsi14 > 70
+        open: rsi14 < rsi_buy (25)
+        close: rsi14 > rsi_sell (70)
         """
         print(f'Running strategy: {self.__class__.__name__} with pair: {pair} and budget: {budget} and data: {data.shape[0]} rows')
         
         # get bot info
-        rsi = data['rsi14'].values
+        rsi = data[f'rsi{self.rsi_period}'].values
         print(f'RSI values: {rsi[-5:]}')
         
         amount=budget
@@ -133,13 +294,13 @@ class MyStrategy(Strategy):
         # if getattr(self, 'flag', None) is None:
         #     self.flag = 'buy' 
         # self.flag == 'buy': #
-        if (rsi[-1] < 25):
+        if (rsi[-1] < self.rsi_buy):
             print(f"Buy signal for {pair} at price {price}, qty {qty}")
             bot.buy(pair=pair, price=price, qty=qty, estimated_amount=amount, )
             self.flag = 'sell'  # switch flag to sell after buy signal
         # close trades on sell signal
         # self.flag == 'sell': # 
-        elif (rsi[-1] > 70):
+        elif (rsi[-1] > self.rsi_sell):
             print(f"Sell signal for {pair} at price {price}, qty {qty}")
             bot.sell(pair=pair, price=price)
             # self.flag = 'buy'  # switch flag to buy after sell signal
@@ -147,22 +308,82 @@ class MyStrategy(Strategy):
             print("No signal")
         return None
 
+    def run_batch(self, batch: MarketBatch, budgets: np.ndarray, bot: TradingBot) -> dict:
+        """
+        Same signals as run() for all pairs at once
+        """
+        rsi = batch.last(f'rsi{self.rsi_period}')
+        signal = np.where(rsi < self.rsi_buy, 1, np.where(rsi > self.rsi_sell, -1, 0))
+        print(f'Strategy {self.__class__.__name__}: {np.count_nonzero(signal == 1)} buy, {np.count_nonzero(signal == -1)} sell signals of {len(batch)} pairs')
+        return {'signal': signal}
+
 def bot_run(bot: TradingBot):
     bot.run()
-    bot.checking_orders()
+    # wait for all pending receipts together, returns as soon as they are committed
+    bot.checking_orders(timeout=20)
     num_process_trade = sum([len(v) for k, v in bot.process_trades.items()])
     if num_process_trade > 0:
         print(f"Processing {num_process_trade} trades: {bot.process_trades}")
-    i = 0
-    while i < 3 and num_process_trade > 0:
-        bot.checking_orders()
-        num_process_trade = sum([len(v) for k, v in bot.process_trades.items()])
-        i += 1
-        time.sleep(5)
     now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     print('Time', now, " - process trades: ",bot.checking_orders(), "open trades: ", bot.open_trades)
     print("============================================")
 
+async def bot_run_async(bot: AsyncTradingBot):
+    # orders of all tokens are placed and confirmed together
+    await bot.run()
+    await bot.checking_orders(timeout=20)
+    num_process_trade = sum([len(v) for k, v in bot.process_trades.items()])
+    if num_process_trade > 0:
+        print(f"Processing {num_process_trade} trades: {bot.process_trades}")
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    print('Time', now, " - process trades: ", bot.process_trades, "open trades: ", bot.open_trades)
+    print("============================================")
+
+def bot_run_async_job(bot: AsyncTradingBot):
+    run_async(bot_run_async(bot), timeout=240)
+
+def host_run(host: BotHost, market: MarketData, tokens: list):
+    # candles of all bots downloaded together once, the bots read them from the shared cache
+    market.update(tokens)
+    results = host.run()
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    for bot in host.bots:
+        print('Time', now, f" - bot {bot.id}: ", results.get(bot.id), "open trades: ", bot.open_trades)
+    print(f"Host: {host.stats()}")
+    print("============================================")
+
+def load_bots(path: str, host: BotHost, market: MarketData, bot_cls, engine, db, wallet_key: str, supported_tokens: list) -> list:
+    """
+    Bots of a yaml config added to the host, one strategy and fund per bot, the candles are shared
+    return the tokens of all bots
+    """
+    with open(path, 'r') as file:
+        configs = yaml.safe_load(file).get('bots', [])
+    tokens = []
+    for config in configs:
+        strat = MyStrategy(interval=market.interval, db_engine=engine, market=market, name=config['id'])
+        for key in ['rsi_period', 'rsi_buy', 'rsi_sell', 'window']:
+            if key in config:
+                setattr(strat, key, config[key])
+        bot_tokens = [t for t in config.get('tokens', ['APT']) if t in supported_tokens]
+        bot = host.add(bot_cls(
+            id=config['id'],
+            wallet_key=config.get('wallet_key', wallet_key),
+            tokens=bot_tokens,
+            currency=config.get('currency', 'USDT'),
+            call_budget=config.get('call_budget', 0.1),
+            invest_amount=config.get('invest_amount', 5),
+            balance=None,
+            broker=host.broker,
+            category='spot',
+            strategy=strat,
+            db=db,
+            notif_on=False,
+        ))
+        print(f"Bot {bot.id} trading {bot.tokens}, account {bot.account.address()}")
+        tokens += [t for t in bot_tokens if t not in tokens]
+    return tokens
+
 # todo: on working version try in testnet mode
 if __name__ == '__main__':
     init_db()
@@ -177,10 +398,16 @@ if __name__ == '__main__':
     supported_tokens=list(set(chain.get('contracts').get('tokens').keys())-set(['router','factory','USDT']))
     print(f"Supported tokens: {supported_tokens}")
 
+    # --async: place and confirm orders of all tokens concurrently
+    use_async = '--async' in sys.argv
+    # --onchain: 5m candles built from the swap events of the router, the strategy runs right after a candle close
+    use_onchain = '--onchain' in sys.argv
+    # --bots=configs/bots.yaml: many bots in this process sharing the broker, candles, snapshot and db writer
+    bots_path = next((a.split('=', 1)[1] for a in sys.argv if a.startswith('--bots=')), None)
     try:
         if len(sys.argv) < 2:
             raise Exception("No token provided")
-        trade_tokens = [str(t).strip() for t in sys.argv[1:]]
+        trade_tokens = [str(t).strip() for t in sys.argv[1:] if not t.startswith('--')]
         trade_tokens = list(set(trade_tokens) & set(supported_tokens))
 
     except Exception as e:
@@ -191,44 +418,82 @@ if __name__ == '__main__':
     print(f"Trading token: {trade_tokens}")
 
     # =========== Initialize objects ===========
-    broker = PancakeBroker(
+    broker_cls = AsyncPancakeBroker if use_async else PancakeBroker
+    bot_cls = AsyncTradingBot if use_async else TradingBot
+    broker = broker_cls(
         rpcs=chain.get('rpcs'),
         ecosystem_token=ecosystem_token,
         contract_info=chain.get('contracts'),
     )
     db = get_session()
     engine = get_engine()
-    strat = MyStrategy(
-        interval='5m',
-        db_engine=engine)
-    bot = TradingBot(
-        id='test_aptusdt',
-        wallet_key=chain.get('wallet', {}).get('private', ''),
-        tokens=trade_tokens,
-        currency='USDT',
-        call_budget=0.1,
-        invest_amount=5,
-        balance=None,
-        broker=broker,
-        category='spot',
-        strategy=strat,
-        db=db,
-        notif_on = False
+    # candles downloaded once for every strategy of the process
+    market = MarketData(interval='5m')
+    if bots_path:
+        host = BotHost(broker, db_writer=DbWriter(), order_timeout=20)
+        trade_tokens = load_bots(bots_path, host, market, bot_cls, engine, db, chain.get('wallet', {}).get('private', ''), supported_tokens)
+        if use_async:
+            for bot in host.bots:
+                run_async(bot.start())
+        job, job_kwargs = host_run, {'host': host, 'market': market, 'tokens': trade_tokens}
+    else:
+        strat = MyStrategy(
+            interval='5m',
+            db_engine=engine,
+            market=market)
+        bot = bot_cls(
+            id='test_aptusdt',
+            wallet_key=chain.get('wallet', {}).get('private', ''),
+            tokens=trade_tokens,
+            currency='USDT',
+            call_budget=0.1,
+            invest_amount=5,
+            balance=None,
+            broker=broker,
+            category='spot',
+            strategy=strat,
+            db=db,
+            notif_on = False
+        )
+        if use_async:
+            run_async(bot.start())
+        print("bot account address: ", bot.account.address())
+        job, job_kwargs = bot_run_async_job if use_async else bot_run, {'bot': bot}
+    # the strategy runs as soon as the closed candle is available, --cron: fixed time after the close
+    use_cron = '--cron' in sys.argv
+    trigger = CandleCloseTrigger(
+        market.ts,
+        ready=lambda close_ts: market.candle_ready(trade_tokens, close_ts),
+        log_path='state/trigger_latency.csv',
     )
-    print("bot account address: ", bot.account.address())
+    if use_onchain:
+        market.onchain = OnchainCandleBuilder.for_broker(broker, trade_tokens, currency, steps=(60, market.ts))
+        # closed candles are pushed to the trigger, no polling
+        asyncio.run_coroutine_threadsafe(market.onchain.run(interval=2, on_close=lambda closed: trigger.notify()), bg_loop)
     # print(broker.tokens, json.loads(broker.tokens["APT"][1])['data']['decimals'])
 
+    if not use_cron:
+        try:
+            trigger.run(job, **job_kwargs)
+        except KeyboardInterrupt:
+            print("Process interrupted by user.")
+        trigger.stop()
+        print(f"Trigger delays: {trigger.stats()}")
+        if bots_path:
+            host.close()
+        sys.exit(0)
+
     # === SCHEDULER ===
     scheduler = BlockingScheduler()
     try:
         # Run at 5 minute 
         # for minute in range(0, 60, 5):
-        1188(
-            bot_run,
+        scheduler.add_job(
+            job,
             trigger='cron',
             minute='0-55/5',
-            second=20, # thong thuong du lieu 5p co sau 9-10s 
-            kwargs={'bot': bot},
+            second=5 if use_onchain else 20, # thong thuong du lieu 5p co sau 9-10s, onchain candles close ~2s after
+            kwargs=job_kwargs,
         )
         scheduler.start()
     except Exception as e:
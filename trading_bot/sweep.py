@@ -0,0 +1,66 @@
+"""
+Tune MyStrategy (RSI period and thresholds) on the candles saved by the live bot, backtests over all cores
+python sweep.py APT CAKE [--timeframe 5m] [--start 2024-01-01] [--random 200] [--processes 8] [--out sweep.csv]
+"""
+import argparse
+
+from main import MyStrategy
+from backtest import timestamp
+from lib.market.indicators import RSI
+from lib.market.store import CandleStore
+from lib.sweep import SharedCandles, Sweep, grid, random_search
+
+TIMEFRAME = '5m'
+
+
+def make_strategy(params: dict) -> MyStrategy:
+    strat = MyStrategy(interval=TIMEFRAME, db_engine=None)
+    strat.rsi_period = params['rsi_period']
+    strat.rsi_buy = params['rsi_buy']
+    strat.rsi_sell = params['rsi_sell']
+    return strat
+
+
+def make_indicators(params: dict) -> dict:
+    return {f"rsi{params['rsi_period']}": RSI(params['rsi_period'])}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('tokens', nargs='+')
+    parser.add_argument('--currency', default='USDT')
+    parser.add_argument('--store', default='data/candles')
+    parser.add_argument('--start')
+    parser.add_argument('--end')
+    parser.add_argument('--cash', type=float, default=1000)
+    parser.add_argument('--random', type=int, default=0, help='random search of n parameter sets instead of the grid')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--rank-by', default='return_pct')
+    parser.add_argument('--out', help='csv of the ranked table')
+    args = parser.parse_args()
+
+    if args.random:
+        params = random_search({'rsi_period': (5, 30), 'rsi_buy': (10, 40), 'rsi_sell': (60, 90)}, args.random, args.seed)
+    else:
+        params = grid({'rsi_period': [7, 14, 21], 'rsi_buy': [20, 25, 30], 'rsi_sell': [65, 70, 75]})
+    # 1m candles too, timeframes missing in the store are resampled from them
+    store = CandleStore(args.store, readonly=True)
+    with SharedCandles.from_store(store, args.tokens, [TIMEFRAME, '1m'], end=timestamp(args.end)) as candles:
+        sweep = Sweep(
+            make_strategy,
+            candles,
+            args.tokens,
+            indicators=make_indicators,
+            processes=args.processes,
+            currency=args.currency,
+            timeframe=TIMEFRAME,
+            cash=args.cash,
+            start=timestamp(args.start),
+        )
+        print(f"{sweep}: {len(params)} backtests, {candles}")
+        table = sweep.run(params, rank_by=args.rank_by)
+    print(table.head(20).to_string())
+    print(f"{len(params)} backtests in {sweep.elapsed:.1f} s, speedup x{sweep.speedup(table):.1f} on {sweep.processes} processes")
+    if args.out:
+        table.to_csv(args.out, index=False)
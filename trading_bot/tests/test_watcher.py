@@ -0,0 +1,45 @@
+import asyncio, os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.broker.dex.watcher import AccountWatcher
+
+
+def swap_tx(sequence_number: int, tx_hash: str) -> dict:
+    return {
+        'hash': tx_hash,
+        'sequence_number': str(sequence_number),
+        'version': str(100 + sequence_number),
+        'success': True,
+        'events': [{'type': '0x1::swap::SwapEvent', 'data': {'amount_x_in': '1'}}],
+    }
+
+
+class Gateway():
+    def __init__(self, txs: list) -> None:
+        self.txs = txs
+
+    async def account_sequence_number(self, address) -> int:
+        return 0
+
+    async def transactions_by_account(self, address, limit: int, start: int) -> list:
+        return [tx for tx in self.txs if int(tx['sequence_number']) >= start][:limit]
+
+
+def test_page_polled_twice_books_external_swap_once():
+    watcher = AccountWatcher(Gateway([swap_tx(0, '0xa'), swap_tx(1, '0xb')]))
+
+    async def run():
+        await watcher.poll('0x1')
+        # a submit announced at an old sequence number moves the cursor back, the page is read again
+        watcher.expect('0x1', '0xc', 0)
+        await watcher.poll('0x1')
+
+    asyncio.run(run())
+    assert [tx['hash'] for tx in watcher.take_external('0x1')] == ['0xa', '0xb']
+
+
+def test_forget_drops_rejected_submit():
+    watcher = AccountWatcher(Gateway([]))
+    watcher.expect('0x1', '0xc', 0)
+    watcher.forget('0xc')
+    assert not watcher._expected